@@ -1,137 +1,98 @@
 import sqlite3
 import os
-import csv
+import queue
+import threading
+from functools import partial
 from kivy.app import App
+from kivy.clock import Clock
 from kivy.uix.screenmanager import ScreenManager, Screen
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.gridlayout import GridLayout
 from kivy.uix.label import Label
+from kivy.uix.progressbar import ProgressBar
+from kivy.properties import BooleanProperty, ListProperty, NumericProperty, ObjectProperty, StringProperty
 from kivy.uix.button import Button
 from kivy.uix.textinput import TextInput
-from kivy.uix.image import Image
-from kivy.uix.scrollview import ScrollView
-from datetime import datetime
+from kivy.uix.recycleview import RecycleView
+from kivy.uix.recycleview.views import RecycleDataViewBehavior
+from kivy.uix.recycleboxlayout import RecycleBoxLayout
+from datetime import date, datetime
 from kivy.graphics import Color, Rectangle
 from kivy.core.window import Window
 from kivy.uix.widget import Widget
+from medassist.alerts import EXPIRY_WARNING_DAYS, AlertWatcher
+from medassist.db import DB_PATH, checkpoint, connect, error_message, estimated_rows, get_pool
+from medassist.migrations import migrate, schema_version
+from medassist.reminders import ReminderQueue
+from medassist.repository import (
+    InventoryRepository, MedicineInUse, MedicineRepository, ScheduleRepository, StockRepository
+)
+from medassist.schema import TABLES
+from medassist.users import (
+    VerificationCache, authenticate, create_session, end_session, register_user, resolve_session
+)
+from medassist.search import (
+    PAGE_CACHE_BYTES, CountCache, PageCache, catalog_changed, ensure_fts_index, fts_enabled, result_order
+)
 
 # Set default window size
 Window.size = (1600, 900)
 
 # ---------- Database setup ----------
-def init_db():
+def init_db(progress=None):
+    """Create, migrate and sync the database; progress(fraction, message) is called before each step"""
+    # Deferred so the import runs on the setup thread instead of delaying the first frame
+    from medassist.csv_import import REJECTS_PATH, RejectFile, sync_medicine_csv
+
+    report = progress or (lambda fraction, message: None)
     try:
         # Create database file if it doesn't exist
-        conn = sqlite3.connect("medassist.db")
+        conn = connect()
         cursor = conn.cursor()
 
         # Enable foreign key support
         cursor.execute("PRAGMA foreign_keys = ON")
 
         print("Creating database tables if they don't exist...")
+        report(0.0, "Checking database tables...")
+
+        for label, sql in TABLES:
+            cursor.execute(sql)
+            print(f"{label} table checked/created")
+
+        # Indexes and later schema changes, tracked by PRAGMA user_version
+        conn.commit()
+        report(0.2, "Updating database schema...")
+        migrate(conn)
+        print(f"Schema at version {schema_version(cursor)}")
 
-        # User table
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS user (
-            username TEXT PRIMARY KEY,
-            password TEXT NOT NULL
-        )""")
-        print("User table checked/created")
-
-        # Medicine info table with additional fields
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS med_info (
-            med_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            med_name TEXT NOT NULL,
-            med_type TEXT,
-            dosage_form TEXT,
-            strength TEXT,
-            manufacturer TEXT,
-            indication TEXT,
-            classification TEXT
-        )""")
-        print("Medicine info table checked/created")
-
-        # Create a table to track CSV import status
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS csv_import_status (
-            filename TEXT PRIMARY KEY,
-            last_modified INTEGER
-        )""")
-        print("CSV import status table checked/created")
-
-        # Schedule table
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS schedule (
-            schedule_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            med_id INTEGER,
-            consumption_start TEXT,
-            consumption_end TEXT,
-            frequency TEXT,
-            FOREIGN KEY (med_id) REFERENCES med_info(med_id) ON DELETE CASCADE
-        )""")
-        print("Schedule table checked/created")
-
-        # Inventory table
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS inventory (
-            inventory_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            med_id INTEGER,
-            quantity INTEGER,
-            expiration TEXT,
-            FOREIGN KEY (med_id) REFERENCES med_info(med_id) ON DELETE CASCADE
-        )""")
-        print("Inventory table checked/created")
+        # Full-text search index over med_info, kept in sync by triggers
+        report(0.4, "Building medicine search index...")
+        if ensure_fts_index(conn):
+            print("Medicine search index checked/created")
 
         # Verify tables exist
         cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
         tables = cursor.fetchall()
         print("Existing tables:", [table[0] for table in tables])
 
-        # Import data from CSV if it exists and has been modified
+        # Sync data from CSV if it exists and its contents have changed
         csv_path = "medicine.csv"
         if os.path.exists(csv_path):
-            current_mtime = int(os.path.getmtime(csv_path))
-
-            # Check if CSV has been modified since last import
-            cursor.execute("SELECT last_modified FROM csv_import_status WHERE filename=?", (csv_path,))
-            last_import = cursor.fetchone()
-
-            if not last_import or last_import[0] < current_mtime:
-                print(f"Importing updated CSV file: {csv_path}")
-                try:
-                    # Clear existing medicine data before import
-                    cursor.execute("DELETE FROM med_info")
-
-                    with open(csv_path, newline="", encoding='utf-8-sig') as f:
-                        reader = csv.reader(f)
-                        headers = next(reader, None)  # Skip header row
-                        print(f"CSV Headers: {headers}")
-
-                        for row in reader:
-                            if row:
-                                # Pad row with None values if it's shorter than expected
-                                row += [None] * (7 - len(row))
-                                try:
-                                    cursor.execute("""
-                                    INSERT INTO med_info 
-                                    (med_name, med_type, dosage_form, strength, manufacturer, indication, classification)
-                                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                                    """, (row[0], row[1], row[2], row[3], row[4], row[5], row[6]))
-                                except sqlite3.Error as e:
-                                    print(f"Error importing medicine row {row}: {e}")
-
-                    # Update the import status
-                    cursor.execute("""
-                        INSERT OR REPLACE INTO csv_import_status (filename, last_modified)
-                        VALUES (?, ?)
-                    """, (csv_path, current_mtime))
-
+            report(0.6, f"Importing {csv_path}...")
+            try:
+                # Applies only inserted, updated and deleted rows; med_ids stay stable
+                with RejectFile(REJECTS_PATH) as rejects:
+                    synced = sync_medicine_csv(conn, csv_path, rejects=rejects)
+                if synced is None:
+                    print("CSV file unchanged since last import, skipping...")
+                else:
+                    catalog_changed()
                     print("CSV import completed successfully")
-                except Exception as e:
-                    print(f"Error during CSV import: {e}")
-            else:
-                print("CSV file unchanged since last import, skipping...")
+                if rejects.rows:
+                    print(f"Rejected rows written to {rejects.path}")
+            except Exception as e:
+                print(f"Error during CSV import: {e}")
         else:
             print(f"CSV file not found at: {csv_path}")
 
@@ -159,16 +120,14 @@ def init_db():
 # Function to check database integrity
 def check_database():
     try:
-        conn = sqlite3.connect("medassist.db")
-        cursor = conn.cursor()
+        conn = connect()
 
-        # Check all tables
+        # Check all tables; sizes come from metadata so this stays instant on large catalogs
         tables = ["user", "med_info", "schedule", "inventory", "csv_import_status"]
         for table in tables:
             try:
-                cursor.execute(f"SELECT COUNT(*) FROM {table}")
-                count = cursor.fetchone()[0]
-                print(f"Table {table} exists and contains {count} records")
+                count = estimated_rows(conn, table)
+                print(f"Table {table} exists and contains about {count} records")
             except sqlite3.Error as e:
                 print(f"Error checking table {table}: {e}")
 
@@ -176,6 +135,24 @@ def check_database():
     except Exception as e:
         print(f"Error checking database: {e}")
 
+class StartupProgress(BoxLayout):
+    """Status of the background database setup, hidden once it has finished"""
+
+    def __init__(self, **kwargs):
+        super().__init__(orientation="vertical", size_hint_y=None, height=50, **kwargs)
+        app = App.get_running_app()
+        self.status = Label(text=app.db_status, font_size=14, color=(0.6, 0.6, 0.6, 1))
+        self.bar = ProgressBar(max=1, value=app.db_progress)
+        self.add_widget(self.status)
+        self.add_widget(self.bar)
+        app.bind(db_status=self.status.setter("text"), db_progress=self.bar.setter("value"),
+                 db_ready=self.show_ready)
+        self.show_ready(app, app.db_ready)
+
+    def show_ready(self, app, ready):
+        self.opacity = 0 if ready else 1
+
+
 class LoginScreen(Screen):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -198,32 +175,76 @@ class LoginScreen(Screen):
         btn_layout.add_widget(register_btn)
 
         layout.add_widget(btn_layout)
+        layout.add_widget(StartupProgress())
         self.add_widget(layout)
+        self.busy = False  # A login or registration is running on a worker thread
 
     def login(self, instance):
-        conn = sqlite3.connect("medassist.db")
-        cursor = conn.cursor()
+        app = App.get_running_app()
         username = self.username.text.strip()
         password = self.password.text.strip()
-        cursor.execute("SELECT * FROM user WHERE username=? AND password=?", (username, password))
-        if cursor.fetchone():
-            self.manager.current = "dashboard"
-        else:
+        # Accounts need the hashed-password and session migrations
+        if not app.db_ready:
+            self.greeting.text = "Database is still starting, please try again"
+            return
+        if self.busy:
+            return
+        self.busy = True
+        self.greeting.text = "Logging in..."
+        # The password hash is deliberately slow, so it never runs on the UI thread
+        app.start_worker(self._login_worker, username, password)
+
+    def _login_worker(self, username, password):
+        app = App.get_running_app()
+        pool = get_pool()
+        try:
+            conn = pool.connection()
+            user_id = authenticate(conn, username, password, app.login_cache)
+            token = None if user_id is None else create_session(conn, user_id)
+        except sqlite3.Error as e:
+            Clock.schedule_once(partial(self._show_result, error_message(e)))
+            return
+        finally:
+            pool.release()
+        Clock.schedule_once(partial(self._login_finished, username, user_id, token))
+
+    def _login_finished(self, username, user_id, token, dt):
+        self.busy = False
+        if user_id is None:
             self.greeting.text = "Invalid credentials"
-        conn.close()
+            return
+        App.get_running_app().log_in(username, user_id, token)
+        self.manager.current = "dashboard"
 
     def register(self, instance):
-        conn = sqlite3.connect("medassist.db")
-        cursor = conn.cursor()
+        app = App.get_running_app()
         username = self.username.text.strip()
         password = self.password.text.strip()
+        if not app.db_ready:
+            self.greeting.text = "Database is still starting, please try again"
+            return
+        if self.busy:
+            return
+        self.busy = True
+        self.greeting.text = "Creating account..."
+        app.start_worker(self._register_worker, username, password)
+
+    def _register_worker(self, username, password):
+        pool = get_pool()
         try:
-            cursor.execute("INSERT INTO user (username, password) VALUES (?, ?)", (username, password))
-            conn.commit()
-            self.greeting.text = f"Account created! Welcome, {username}!"
+            register_user(pool.connection(), username, password)
+            message = f"Account created! Welcome, {username}!"
         except sqlite3.IntegrityError:
-            self.greeting.text = "Username already exists."
-        conn.close()
+            message = "Username already exists."
+        except sqlite3.Error as e:
+            message = error_message(e)
+        finally:
+            pool.release()
+        Clock.schedule_once(partial(self._show_result, message))
+
+    def _show_result(self, message, dt):
+        self.busy = False
+        self.greeting.text = message
 
 
 class DashboardScreen(Screen):
@@ -248,12 +269,44 @@ class DashboardScreen(Screen):
             size_hint_y=0.1
         )
         layout.add_widget(self.welcome_label)
+        layout.add_widget(StartupProgress())
+
+        # Inventory alerts, pushed by the app's AlertWatcher
+        self.alerts_label = Label(
+            text="",
+            font_size=16,
+            color=(0.9, 0.3, 0.1, 1),  # Orange-red
+            size_hint_y=0.2,
+            halign="center"
+        )
+        layout.add_widget(self.alerts_label)
+
+        # Dose reminders, fired by the app's ReminderQueue
+        self.reminder_label = Label(
+            text="",
+            font_size=16,
+            color=(0.2, 0.4, 0.9, 1),  # Blue
+            size_hint_y=0.1,
+            halign="center"
+        )
+        layout.add_widget(self.reminder_label)
+
+        # Takes one dose of each due reminder out of stock, soonest-expiring lots first
+        self.take_btn = Button(
+            text="Mark Due Doses Taken",
+            background_color=(0.2, 0.4, 0.9, 1),  # Blue
+            size_hint_y=None,
+            height=40,
+            disabled=True
+        )
+        self.take_btn.bind(on_press=self.take_doses)
+        layout.add_widget(self.take_btn)
 
         # Buttons grid
         buttons_layout = GridLayout(
             cols=2,
             spacing=20,
-            size_hint_y=0.6,
+            size_hint_y=0.5,
             padding=[20, 20]
         )
 
@@ -298,15 +351,91 @@ class DashboardScreen(Screen):
         for btn in [med_btn, schedule_btn, inventory_btn, logout_btn]:
             buttons_layout.add_widget(btn)
 
+        # The data screens open once the background database setup has finished
+        self.data_buttons = [med_btn, schedule_btn, inventory_btn]
+        app = App.get_running_app()
+        app.bind(db_ready=self.enable_data_buttons, alerts=self.show_alerts,
+                 due_reminders=self.show_reminders, next_reminder=self.show_reminders)
+        self.enable_data_buttons(app, app.db_ready)
+        self.show_alerts(app, app.alerts)
+        self.show_reminders(app, None)
+
         layout.add_widget(buttons_layout)
         self.add_widget(layout)
 
+    def enable_data_buttons(self, app, ready):
+        for btn in self.data_buttons:
+            btn.disabled = not ready
+
+    def on_enter(self):
+        # Inventory may have just been edited on another screen
+        App.get_running_app().check_alerts()
+
+    def show_alerts(self, app, alerts):
+        """Summarize expired and expiring lots and low-stock medicines"""
+        if alerts is None:
+            self.alerts_label.text = ""
+            return
+        if not (alerts.expired_count or alerts.expiring_count or alerts.low_stock_count):
+            self.alerts_label.text = "No inventory alerts"
+            return
+        lines = [f"Inventory alerts: {alerts.expired_count} expired, "
+                 f"{alerts.expiring_count} expiring within {EXPIRY_WARNING_DAYS} days, "
+                 f"{alerts.low_stock_count} low on stock"]
+        # The most urgent lot of each kind, and the medicine with the least stock
+        for label, items in (("Expired", alerts.expired), ("Expiring", alerts.expiring)):
+            if items:
+                item = items[0]
+                lines.append(f"{label}: {item.med_name} - {item.quantity} left, expires {item.expiration}")
+        if alerts.low_stock:
+            level = alerts.low_stock[0]
+            lines.append(f"Low stock: {level.med_name} - {level.on_hand} on hand in {level.lots} lot(s)")
+        self.alerts_label.text = "\n".join(lines)
+
+    def show_reminders(self, app, value):
+        """Doses that just came due, or else the next one"""
+        self.take_btn.disabled = not app.due_reminders
+        if app.due_reminders:
+            self.reminder_label.text = "\n".join(
+                f"Dose due: {reminder.med_name} ({reminder.frequency}) at {reminder.due:%H:%M}"
+                for reminder in app.due_reminders[:3]
+            )
+        elif app.next_reminder is not None:
+            reminder = app.next_reminder
+            self.reminder_label.text = f"Next dose: {reminder.med_name} at {reminder.due:%Y-%m-%d %H:%M}"
+        else:
+            self.reminder_label.text = ""
+
+    def take_doses(self, instance):
+        """Dispense the due doses from inventory and say how it went"""
+        app = App.get_running_app()
+        names = {reminder.med_id: reminder.med_name for reminder in app.due_reminders}
+        doses = len(app.due_reminders)
+        try:
+            result = app.take_due_doses()
+        except sqlite3.Error as e:
+            self.reminder_label.text = error_message(e)
+            return
+        self.show_reminders(app, None)
+        lines = []
+        if doses > len(app.due_reminders):
+            lines.append(f"Took {doses - len(app.due_reminders)} dose(s) from stock")
+        if result.shortages:
+            lines.append("Not enough stock, still due:")
+            lines.extend(
+                f"{names.get(shortage.med_id, shortage.med_id)}: {shortage.available} of {shortage.requested} available"
+                for shortage in result.shortages
+            )
+        else:
+            lines.append(self.reminder_label.text)  # The next dose
+        self.reminder_label.text = "\n".join(filter(None, lines))
+
     def update_welcome(self, username):
         self.welcome_label.text = f"Welcome, {username}!"
 
     def logout(self, instance):
         app = App.get_running_app()
-        app.username = None
+        app.log_out()
         app.screen_manager.current = "login"
         app.screen_manager.get_screen("login").username.text = ""
         app.screen_manager.get_screen("login").password.text = ""
@@ -334,11 +463,19 @@ class BaseCrudScreen(Screen):
 
         # Left side - List view
         self.list_layout = BoxLayout(orientation="vertical", size_hint_x=0.7)
-        self.scroll_view = ScrollView()
-        self.list_content = GridLayout(cols=1, spacing=5, size_hint_y=None)
-        self.list_content.bind(minimum_height=self.list_content.setter('height'))
-        self.scroll_view.add_widget(self.list_content)
-        self.list_layout.add_widget(self.scroll_view)
+        # Recycled list: only the visible rows get Label widgets
+        self.list_view = RecycleView()
+        list_content = RecycleBoxLayout(
+            orientation="vertical",
+            spacing=5,
+            size_hint_y=None,
+            default_size=(None, 40),
+            default_size_hint=(1, None)
+        )
+        list_content.bind(minimum_height=list_content.setter('height'))
+        self.list_view.add_widget(list_content)
+        self.list_view.viewclass = "Label"  # Must be set after the layout manager is added
+        self.list_layout.add_widget(self.list_view)
 
         # Right side - Controls
         self.controls_layout = BoxLayout(orientation="vertical", size_hint_x=0.3, spacing=10)
@@ -349,8 +486,12 @@ class BaseCrudScreen(Screen):
 
         self.add_widget(self.layout)
 
+    def show_rows(self, texts):
+        """Replace the list contents with one row per line of text"""
+        self.list_view.data = [{"text": text} for text in texts]
+
     def refresh_list(self):
-        self.list_content.clear_widgets()
+        self.show_rows([])
         # To be implemented by child classes
 
 
@@ -385,40 +526,20 @@ class MedicineInfoScreen(BaseCrudScreen):
         self.controls_layout.add_widget(delete_btn)
         self.controls_layout.add_widget(refresh_btn)
 
+    def on_enter(self):
         self.refresh_list()
 
     def refresh_list(self):
-        self.list_content.clear_widgets()
-        conn = sqlite3.connect("medassist.db")
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT med_id, med_name, med_type 
-            FROM med_info 
-            ORDER BY med_name
-        """)
-        medicines = cursor.fetchall()
-        conn.close()
+        medicines = App.get_running_app().medicines.list_summaries()
 
-        for med in medicines:
-            item = BoxLayout(orientation="horizontal", size_hint_y=None, height=40)
-            item.add_widget(Label(
-                text=f"ID: {med[0]} | {med[1]} ({med[2]})",
-                size_hint_x=1,
-                halign='left'
-            ))
-            self.list_content.add_widget(item)
+        self.show_rows([f"ID: {med.med_id} | {med.med_name} ({med.med_type})" for med in medicines])
 
     def add_medicine(self, instance):
         name = self.med_name.text.strip()
         med_type = self.med_type.text.strip()
 
         if name and med_type:
-            conn = sqlite3.connect("medassist.db")
-            cursor = conn.cursor()
-            cursor.execute("INSERT INTO med_info (med_name, med_type) VALUES (?, ?)",
-                           (name, med_type))
-            conn.commit()
-            conn.close()
+            App.get_running_app().medicines.add(name, med_type)
             self.med_id.text = ""
             self.med_name.text = ""
             self.med_type.text = ""
@@ -431,25 +552,13 @@ class MedicineInfoScreen(BaseCrudScreen):
             med_type = self.med_type.text.strip()
 
             if all([med_id, name, med_type]):
-                conn = sqlite3.connect("medassist.db")
-                cursor = conn.cursor()
-
-                # Check if medicine exists
-                cursor.execute("SELECT med_id FROM med_info WHERE med_id = ?", (med_id,))
-                if cursor.fetchone():
-                    cursor.execute("""
-                        UPDATE med_info 
-                        SET med_name = ?, med_type = ? 
-                        WHERE med_id = ?
-                    """, (name, med_type, med_id))
-                    conn.commit()
+                if App.get_running_app().medicines.update(med_id, med_name=name, med_type=med_type):
                     self.med_id.text = ""
                     self.med_name.text = ""
                     self.med_type.text = ""
                     self.refresh_list()
                 else:
                     print(f"Medicine with ID {med_id} not found")
-                conn.close()
         except (ValueError, sqlite3.Error) as e:
             print(f"Error updating medicine: {e}")
 
@@ -457,25 +566,15 @@ class MedicineInfoScreen(BaseCrudScreen):
         try:
             med_id = int(self.med_id.text.strip())
 
-            conn = sqlite3.connect("medassist.db")
-            cursor = conn.cursor()
-
-            # Check if medicine exists
-            cursor.execute("SELECT med_id FROM med_info WHERE med_id = ?", (med_id,))
-            if cursor.fetchone():
-                # Delete related records in schedule and inventory tables
-                cursor.execute("DELETE FROM schedule WHERE med_id = ?", (med_id,))
-                cursor.execute("DELETE FROM inventory WHERE med_id = ?", (med_id,))
-                # Delete the medicine
-                cursor.execute("DELETE FROM med_info WHERE med_id = ?", (med_id,))
-                conn.commit()
+            # Deletes this user's related schedule and inventory records too
+            app = App.get_running_app()
+            if app.medicines.delete(med_id, app.user_id):
                 self.med_id.text = ""
                 self.med_name.text = ""
                 self.med_type.text = ""
                 self.refresh_list()
             else:
                 print(f"Medicine with ID {med_id} not found")
-            conn.close()
         except (ValueError, sqlite3.Error) as e:
             print(f"Error deleting medicine: {e}")
 
@@ -633,27 +732,21 @@ class ScheduleScreen(BaseCrudScreen):
                 self.show_error("Schedule ID must be a number")
                 return
                 
-            app = App.get_running_app()
-            app.cursor.execute("""
-                SELECT med_id, consumption_start, consumption_end, frequency
-                FROM schedule WHERE schedule_id = ?
-            """, (schedule_id,))
-            
-            result = app.cursor.fetchone()
-            if not result:
+            schedule = App.get_running_app().schedules.get(schedule_id)
+            if not schedule:
                 self.show_error(f"No schedule found with ID {schedule_id}")
                 return
                 
             # Populate input fields
-            self.med_id.text = str(result[0])
-            self.start_date.text = result[1]
-            self.end_date.text = result[2]
-            self.frequency.text = result[3]
+            self.med_id.text = str(schedule.med_id)
+            self.start_date.text = schedule.consumption_start
+            self.end_date.text = schedule.consumption_end
+            self.frequency.text = schedule.frequency
             
             self.show_success(f"Loaded schedule data for ID {schedule_id}")
             
         except sqlite3.Error as e:
-            self.show_error(f"Database error: {str(e)}")
+            self.show_error(error_message(e))
         except Exception as e:
             self.show_error(f"Error loading schedule: {str(e)}")
 
@@ -684,27 +777,18 @@ class ScheduleScreen(BaseCrudScreen):
             app = App.get_running_app()
             
             # Check if schedule exists
-            app.cursor.execute("SELECT schedule_id FROM schedule WHERE schedule_id = ?", (schedule_id,))
-            if not app.cursor.fetchone():
+            if not app.schedules.exists(schedule_id):
                 self.show_error(f"No schedule found with ID {schedule_id}")
                 return
                 
             # Check if medicine exists
-            app.cursor.execute("SELECT med_id FROM med_info WHERE med_id = ?", (med_id,))
-            if not app.cursor.fetchone():
+            if not app.medicines.exists(med_id):
                 self.show_error(f"Medicine with ID {med_id} does not exist")
                 return
             
             # Update the schedule
-            app.cursor.execute("""
-                UPDATE schedule SET
-                    med_id = ?,
-                    consumption_start = ?,
-                    consumption_end = ?,
-                    frequency = ?
-                WHERE schedule_id = ?
-            """, (med_id, start_date, end_date, frequency, schedule_id))
-            app.conn.commit()
+            app.schedules.update(schedule_id, med_id, start_date, end_date, frequency)
+            app.schedule_changed(schedule_id)
             
             # Clear inputs
             self.schedule_id.text = ""
@@ -717,7 +801,7 @@ class ScheduleScreen(BaseCrudScreen):
             self.refresh_list()
             
         except sqlite3.Error as e:
-            self.show_error(f"Database error: {str(e)}")
+            self.show_error(error_message(e))
         except Exception as e:
             self.show_error(f"Error updating schedule: {str(e)}")
 
@@ -734,17 +818,12 @@ class ScheduleScreen(BaseCrudScreen):
                 self.show_error("Schedule ID must be a number")
                 return
                 
+            # Delete the schedule
             app = App.get_running_app()
-            
-            # Check if schedule exists
-            app.cursor.execute("SELECT schedule_id FROM schedule WHERE schedule_id = ?", (schedule_id,))
-            if not app.cursor.fetchone():
+            if not app.schedules.delete(schedule_id):
                 self.show_error(f"No schedule found with ID {schedule_id}")
                 return
-            
-            # Delete the schedule
-            app.cursor.execute("DELETE FROM schedule WHERE schedule_id = ?", (schedule_id,))
-            app.conn.commit()
+            app.schedule_changed(schedule_id)
             
             # Clear inputs
             self.schedule_id.text = ""
@@ -757,44 +836,30 @@ class ScheduleScreen(BaseCrudScreen):
             self.refresh_list()
             
         except sqlite3.Error as e:
-            self.show_error(f"Database error: {str(e)}")
+            self.show_error(error_message(e))
         except Exception as e:
             self.show_error(f"Error deleting schedule: {str(e)}")
 
+    def on_enter(self):
+        self.refresh_list()
+
     def refresh_list(self):
         """Refresh the schedule list"""
-        self.list_content.clear_widgets()
         try:
-            conn = sqlite3.connect("medassist.db")
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT s.schedule_id, m.med_name, s.consumption_start, s.consumption_end, s.frequency 
-                FROM schedule s 
-                JOIN med_info m ON s.med_id = m.med_id
-                ORDER BY s.consumption_start
-            """)
-            schedules = cursor.fetchall()
-            conn.close()
+            schedules = App.get_running_app().schedules.list_all()
 
             if not schedules:
-                self.list_content.add_widget(Label(
-                    text="No schedules found",
-                    size_hint_y=None,
-                    height=40
-                ))
+                self.show_rows(["No schedules found"])
                 return
 
-            for schedule in schedules:
-                item = BoxLayout(orientation="horizontal", size_hint_y=None, height=40)
-                item.add_widget(Label(
-                    text=f"ID: {schedule[0]} | Medicine: {schedule[1]}\nFrom {schedule[2]} to {schedule[3]} ({schedule[4]})",
-                    size_hint_x=1,
-                    halign='left'
-                ))
-                self.list_content.add_widget(item)
+            self.show_rows([
+                f"ID: {schedule.schedule_id} | Medicine: {schedule.med_name}\n"
+                f"From {schedule.consumption_start} to {schedule.consumption_end} ({schedule.frequency})"
+                for schedule in schedules
+            ])
 
         except sqlite3.Error as e:
-            self.show_error(f"Database error: {str(e)}")
+            self.show_error(error_message(e))
             
     def add_schedule(self, instance):
         """Add new schedule"""
@@ -813,17 +878,12 @@ class ScheduleScreen(BaseCrudScreen):
             app = App.get_running_app()
             
             # Check if medicine exists
-            app.cursor.execute("SELECT med_id FROM med_info WHERE med_id = ?", (med_id,))
-            if not app.cursor.fetchone():
+            if not app.medicines.exists(med_id):
                 self.show_error(f"Medicine with ID {med_id} does not exist")
                 return
             
             # Add the schedule
-            app.cursor.execute("""
-                INSERT INTO schedule (med_id, consumption_start, consumption_end, frequency)
-                VALUES (?, ?, ?, ?)
-            """, (med_id, start_date, end_date, frequency))
-            app.conn.commit()
+            app.schedule_changed(app.schedules.add(med_id, start_date, end_date, frequency))
             
             # Clear inputs
             self.med_id.text = ""
@@ -835,7 +895,7 @@ class ScheduleScreen(BaseCrudScreen):
             self.refresh_list()
             
         except sqlite3.Error as e:
-            self.show_error(f"Database error: {str(e)}")
+            self.show_error(error_message(e))
         except Exception as e:
             self.show_error(f"Error adding schedule: {str(e)}")
 
@@ -898,6 +958,14 @@ class InventoryScreen(BaseCrudScreen):
             height=40
         )
         delete_btn.bind(on_press=self.delete_inventory)
+
+        history_btn = Button(
+            text="Lot History",
+            background_color=(0.4, 0.4, 0.7, 1),  # Slate blue
+            size_hint_y=None,
+            height=40
+        )
+        history_btn.bind(on_press=self.show_history)
         
         refresh_btn = Button(
             text="Refresh List",
@@ -906,6 +974,22 @@ class InventoryScreen(BaseCrudScreen):
             height=40
         )
         refresh_btn.bind(on_press=lambda x: self.refresh_list())
+
+        # Batch receive/adjust: many lots typed or pasted as CSV, saved in one transaction
+        self.batch_input = TextInput(
+            hint_text="One lot per line: med_id, quantity, expiration\n"
+                      "To adjust: inventory_id, med_id, quantity, expiration",
+            multiline=True,
+            size_hint_y=None,
+            height=120
+        )
+        batch_btn = Button(
+            text="Apply Batch",
+            background_color=(0.6, 0.3, 0.8, 1),  # Purple
+            size_hint_y=None,
+            height=40
+        )
+        batch_btn.bind(on_press=self.receive_batch)
         
         # Add fields and buttons to controls layout
         self.controls_layout.add_widget(Label(
@@ -932,9 +1016,19 @@ class InventoryScreen(BaseCrudScreen):
         self.controls_layout.add_widget(load_btn)
         self.controls_layout.add_widget(update_btn)
         self.controls_layout.add_widget(delete_btn)
+        self.controls_layout.add_widget(history_btn)
         self.controls_layout.add_widget(refresh_btn)
         self.controls_layout.add_widget(self.status_label)
 
+        self.controls_layout.add_widget(Label(
+            text="Batch Receive/Adjust",
+            bold=True,
+            size_hint_y=None,
+            height=30
+        ))
+        self.controls_layout.add_widget(self.batch_input)
+        self.controls_layout.add_widget(batch_btn)
+
     def show_error(self, message):
         """Display error message"""
         self.status_label.text = message
@@ -945,6 +1039,30 @@ class InventoryScreen(BaseCrudScreen):
         self.status_label.text = message
         self.status_label.color = (0, 0.8, 0, 1)  # Green
 
+    def receive_batch(self, instance):
+        """Receive and adjust every lot in the batch box in one transaction"""
+        from medassist.inventory_batch import apply_batch
+
+        app = App.get_running_app()
+        try:
+            result = apply_batch(app.conn, app.user_id, self.batch_input.text)
+        except sqlite3.Error as e:
+            self.show_error(error_message(e))
+            return
+        if result.errors:
+            # Every bad line at once, in the list, so the batch can be fixed in one go
+            self.show_error(f"{len(result.errors)} line(s) have errors; nothing was saved")
+            self.show_rows([f"Line {line}: {message}" for line, message in result.errors])
+            return
+        if not (result.received or result.adjusted):
+            self.show_error("Enter at least one lot")
+            return
+
+        self.batch_input.text = ""
+        self.show_success(f"Received {result.received} and adjusted {result.adjusted} lot(s)")
+        self.refresh_list()
+        app.check_alerts()
+
     def validate_inventory(self):
         """Validate inventory input fields"""
         errors = []
@@ -989,26 +1107,20 @@ class InventoryScreen(BaseCrudScreen):
                 self.show_error("Inventory ID must be a number")
                 return
                 
-            app = App.get_running_app()
-            app.cursor.execute("""
-                SELECT med_id, quantity, expiration
-                FROM inventory WHERE inventory_id = ?
-            """, (inventory_id,))
-            
-            result = app.cursor.fetchone()
-            if not result:
+            item = App.get_running_app().inventory.get(inventory_id)
+            if not item:
                 self.show_error(f"No inventory found with ID {inventory_id}")
                 return
                 
             # Populate input fields
-            self.med_id.text = str(result[0])
-            self.quantity.text = str(result[1])
-            self.expiration.text = result[2]
+            self.med_id.text = str(item.med_id)
+            self.quantity.text = str(item.quantity)
+            self.expiration.text = item.expiration
             
             self.show_success(f"Loaded inventory data for ID {inventory_id}")
             
         except sqlite3.Error as e:
-            self.show_error(f"Database error: {str(e)}")
+            self.show_error(error_message(e))
         except Exception as e:
             self.show_error(f"Error loading inventory: {str(e)}")
 
@@ -1038,26 +1150,17 @@ class InventoryScreen(BaseCrudScreen):
             app = App.get_running_app()
             
             # Check if inventory exists
-            app.cursor.execute("SELECT inventory_id FROM inventory WHERE inventory_id = ?", (inventory_id,))
-            if not app.cursor.fetchone():
+            if not app.inventory.exists(inventory_id):
                 self.show_error(f"No inventory found with ID {inventory_id}")
                 return
                 
             # Check if medicine exists
-            app.cursor.execute("SELECT med_id FROM med_info WHERE med_id = ?", (med_id,))
-            if not app.cursor.fetchone():
+            if not app.medicines.exists(med_id):
                 self.show_error(f"Medicine with ID {med_id} does not exist")
                 return
             
             # Update the inventory
-            app.cursor.execute("""
-                UPDATE inventory SET
-                    med_id = ?,
-                    quantity = ?,
-                    expiration = ?
-                WHERE inventory_id = ?
-            """, (med_id, quantity, expiration, inventory_id))
-            app.conn.commit()
+            app.inventory.update(inventory_id, med_id, quantity, expiration)
             
             # Clear inputs
             self.inventory_id.text = ""
@@ -1069,7 +1172,7 @@ class InventoryScreen(BaseCrudScreen):
             self.refresh_list()
             
         except sqlite3.Error as e:
-            self.show_error(f"Database error: {str(e)}")
+            self.show_error(error_message(e))
         except Exception as e:
             self.show_error(f"Error updating inventory: {str(e)}")
 
@@ -1086,18 +1189,11 @@ class InventoryScreen(BaseCrudScreen):
                 self.show_error("Inventory ID must be a number")
                 return
                 
-            app = App.get_running_app()
-            
-            # Check if inventory exists
-            app.cursor.execute("SELECT inventory_id FROM inventory WHERE inventory_id = ?", (inventory_id,))
-            if not app.cursor.fetchone():
+            # Delete the inventory
+            if not App.get_running_app().inventory.delete(inventory_id):
                 self.show_error(f"No inventory found with ID {inventory_id}")
                 return
             
-            # Delete the inventory
-            app.cursor.execute("DELETE FROM inventory WHERE inventory_id = ?", (inventory_id,))
-            app.conn.commit()
-            
             # Clear inputs
             self.inventory_id.text = ""
             self.med_id.text = ""
@@ -1108,44 +1204,49 @@ class InventoryScreen(BaseCrudScreen):
             self.refresh_list()
             
         except sqlite3.Error as e:
-            self.show_error(f"Database error: {str(e)}")
+            self.show_error(error_message(e))
         except Exception as e:
             self.show_error(f"Error deleting inventory: {str(e)}")
 
+    def show_history(self, instance):
+        """List every stock movement of the lot in the Inventory ID field"""
+        inventory_id = self.inventory_id.text.strip()
+        if not inventory_id.isdigit():
+            self.show_error("Enter an Inventory ID to see its history")
+            return
+        try:
+            movements = App.get_running_app().stock.history(inventory_id)
+        except sqlite3.Error as e:
+            self.show_error(error_message(e))
+            return
+        if not movements:
+            self.show_error(f"No history found for inventory {inventory_id}")
+            return
+        self.show_success(f"{len(movements)} movement(s) for inventory {inventory_id}")
+        self.show_rows([
+            f"{movement.moved_at} | {movement.kind.capitalize()} | {movement.quantity:+d}"
+            for movement in movements
+        ])
+
+    def on_enter(self):
+        self.refresh_list()
+
     def refresh_list(self):
         """Refresh the inventory list"""
-        self.list_content.clear_widgets()
         try:
-            conn = sqlite3.connect("medassist.db")
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT i.inventory_id, m.med_name, i.quantity, i.expiration 
-                FROM inventory i 
-                JOIN med_info m ON i.med_id = m.med_id
-                ORDER BY i.expiration
-            """)
-            inventory_items = cursor.fetchall()
-            conn.close()
+            inventory_items = App.get_running_app().inventory.list_all()
 
             if not inventory_items:
-                self.list_content.add_widget(Label(
-                    text="No inventory items found",
-                    size_hint_y=None,
-                    height=40
-                ))
+                self.show_rows(["No inventory items found"])
                 return
 
-            for item in inventory_items:
-                list_item = BoxLayout(orientation="horizontal", size_hint_y=None, height=40)
-                list_item.add_widget(Label(
-                    text=f"ID: {item[0]} | Medicine: {item[1]} | Quantity: {item[2]} | Expires: {item[3]}",
-                    size_hint_x=1,
-                    halign='left'
-                ))
-                self.list_content.add_widget(list_item)
+            self.show_rows([
+                f"ID: {item.inventory_id} | Medicine: {item.med_name} | Quantity: {item.quantity} | Expires: {item.expiration}"
+                for item in inventory_items
+            ])
 
         except sqlite3.Error as e:
-            self.show_error(f"Database error: {str(e)}")
+            self.show_error(error_message(e))
             
     def add_inventory(self, instance):
         """Add new inventory"""
@@ -1163,39 +1264,246 @@ class InventoryScreen(BaseCrudScreen):
             app = App.get_running_app()
             
             # Check if medicine exists
-            app.cursor.execute("SELECT med_id FROM med_info WHERE med_id = ?", (med_id,))
-            if not app.cursor.fetchone():
+            if not app.medicines.exists(med_id):
                 self.show_error(f"Medicine with ID {med_id} does not exist")
                 return
             
             # Add the inventory
-            app.cursor.execute("""
-                INSERT INTO inventory (med_id, quantity, expiration)
-                VALUES (?, ?, ?)
-            """, (med_id, quantity, expiration))
-            app.conn.commit()
+            app.inventory.add(med_id, quantity, expiration)
+            level = app.stock.get(med_id)
             
             # Clear inputs
             self.med_id.text = ""
             self.quantity.text = ""
             self.expiration.text = ""
             
-            self.show_success("Successfully added new inventory")
+            self.show_success(f"Added inventory; {level.med_name} now has {level.on_hand} on hand")
             self.refresh_list()
             
         except sqlite3.Error as e:
-            self.show_error(f"Database error: {str(e)}")
+            self.show_error(error_message(e))
         except Exception as e:
             self.show_error(f"Error adding inventory: {str(e)}")
 
 
+class SearchScheduler:
+    """Debounces medicine searches and runs them on a background thread
+
+    The worker owns its own SQLite connection and a CountCache, so paging
+    through one search runs only the page query. Every request gets a new
+    generation number; results from older generations are dropped and a
+    query still running for an older generation is interrupted.
+
+    Fetched pages go into a PageCache. A request for a cached page is
+    answered on the spot, and after every request the worker prefetches the
+    pages on either side, so flipping back and forth needs no query at all.
+    """
+
+    def __init__(self, db_path, on_results, on_error, delay=0.25, page_cache_bytes=PAGE_CACHE_BYTES):
+        self.db_path = db_path
+        self.on_results = on_results
+        self.on_error = on_error
+        self.page_cache = PageCache(page_cache_bytes)
+        self.use_fts = None  # Known once the worker has opened its connection
+        self.generation = 0
+        self._running_generation = None
+        self._pending = None
+        self._conn = None
+        self._requests = queue.Queue()
+        self._debounce = Clock.create_trigger(self._dispatch, delay)
+        self._thread = None
+
+    def schedule(self, query, page, page_size, seek=None):
+        """Queue a search after the debounce delay, restarting the delay on every call"""
+        self._pending = (query, page, page_size, seek)
+        self._debounce.cancel()
+        self._debounce()
+
+    def submit(self, query, page, page_size, seek=None):
+        """Run a search right away, superseding any pending or running one"""
+        self._pending = (query, page, page_size, seek)
+        self._debounce.cancel()
+        self._dispatch()
+
+    def _page_key(self, query, page, page_size):
+        return PageCache.key(query, result_order(query, self.use_fts), page, page_size)
+
+    def _dispatch(self, *args):
+        if self._pending is None:
+            return
+        self.generation += 1
+        query, page, page_size, seek = self._pending
+        self._pending = None
+
+        # Stop work on a stale query instead of waiting for it to finish
+        running = self._running_generation
+        if running is not None and running < self.generation and self._conn is not None:
+            self._conn.interrupt()
+
+        cached = self.page_cache.get(self._page_key(query, page, page_size))
+        if cached is not None:
+            self.on_results(*cached)
+
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        # The worker still runs a cached request: it rechecks for commits from
+        # other terminals and prefetches the neighbouring pages
+        self._requests.put((self.generation, query, page, page_size, seek, cached is not None))
+
+    def _run(self):
+        pool = get_pool(self.db_path)
+        self._conn = pool.connection()
+        cursor = self._conn.cursor()
+        medicines = MedicineRepository(self._conn)
+        use_fts = self.use_fts = fts_enabled(cursor)
+        # Substring-scan fallbacks may report a capped count instead of scanning everything
+        counts = CountCache(approximate=True, use_fts=use_fts)
+        while True:
+            request = self._requests.get()
+            if request is None:
+                break
+            # Only the newest request matters
+            while not self._requests.empty():
+                request = self._requests.get()
+                if request is None:
+                    pool.release()
+                    return
+            generation, query, page, page_size, seek, shown = request
+            if generation != self.generation:
+                continue
+
+            self._running_generation = generation
+            try:
+                self.page_cache.validate(cursor)
+                key = self._page_key(query, page, page_size)
+                entry = self.page_cache.get(key)
+                if entry is None:
+                    total, exact = counts.count(cursor, query)
+                    if generation != self.generation:
+                        continue
+                    page_rows = medicines.page(query, page_size, (page - 1) * page_size, seek, use_fts)
+                    entry = (total, exact, page_rows)
+                    self.page_cache.put(key, *entry)
+                    shown = False  # The cached copy the UI showed, if any, was stale
+                if not shown:
+                    Clock.schedule_once(partial(self._deliver, generation, *entry))
+                self._prefetch(generation, medicines, query, page, page_size, entry)
+            except sqlite3.OperationalError as e:
+                if generation == self.generation and "interrupted" in str(e):
+                    # Caught by an interrupt aimed at the previous query; try again
+                    self._requests.put(request)
+                elif generation == self.generation:
+                    Clock.schedule_once(partial(self._deliver_error, generation, e))
+                continue
+            except sqlite3.Error as e:
+                Clock.schedule_once(partial(self._deliver_error, generation, e))
+                continue
+            finally:
+                self._running_generation = None
+        pool.release()
+
+    def _prefetch(self, generation, medicines, query, page, page_size, entry):
+        """Fetch the pages before and after a delivered one into the page cache"""
+        total, exact, page_rows = entry
+        if not page_rows:
+            return
+        neighbours = []
+        if page * page_size < total or not exact:
+            neighbours.append((page + 1, ("after", page_rows[-1].sort_key)))
+        if page > 1:
+            neighbours.append((page - 1, ("before", page_rows[0].sort_key)))
+        for neighbour, seek in neighbours:
+            # Give way as soon as the user asks for something else
+            if generation != self.generation or not self._requests.empty():
+                return
+            key = self._page_key(query, neighbour, page_size)
+            if key not in self.page_cache:
+                rows = medicines.page(query, page_size, (neighbour - 1) * page_size, seek, self.use_fts)
+                self.page_cache.put(key, total, exact, rows)
+
+    def _deliver(self, generation, total, exact, medicines, dt):
+        if generation == self.generation:
+            self.on_results(total, exact, medicines)
+
+    def _deliver_error(self, generation, error, dt):
+        if generation == self.generation:
+            self.on_error(error)
+
+    def stop(self):
+        """Ask the worker thread to release its connection and exit; see join"""
+        self._debounce.cancel()
+        self.generation += 1
+        if self._thread is not None:
+            self._requests.put(None)
+            if self._running_generation is not None:
+                try:
+                    self._conn.interrupt()
+                except sqlite3.ProgrammingError:
+                    pass  # Released meanwhile
+
+    def join(self, timeout=None):
+        """Wait for the worker thread to exit after stop"""
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+def medicine_cells(med):
+    """Column texts for one med_info row in the medicine list"""
+    # Column 2: Type and Form
+    type_form = f"Type: {med.med_type or 'N/A'}"
+    if med.dosage_form:
+        type_form += f"\nForm: {med.dosage_form}"
+
+    # Column 5: Indication and Classification
+    ind_class = f"Ind: {med.indication or 'N/A'}"
+    if med.classification:
+        ind_class += f"\nClass: {med.classification}"
+
+    return (
+        f"ID: {med.med_id}\n{med.med_name}",  # Column 1: ID and Name
+        type_form,
+        med.strength or "N/A",  # Column 3: Strength
+        med.manufacturer or "N/A",  # Column 4: Manufacturer
+        ind_class
+    )
+
+
+class MedicineRow(RecycleDataViewBehavior, GridLayout):
+    """Reusable five-column row view for the medicine RecycleView"""
+
+    def __init__(self, **kwargs):
+        super().__init__(cols=5, spacing=(2, 0), **kwargs)
+        self.cells = []
+        for _ in range(5):
+            cell = Label(
+                text_size=(None, None),
+                halign='left',
+                color=(0, 0, 0, 1)  # Black text
+            )
+            self.cells.append(cell)
+            self.add_widget(cell)
+
+    def refresh_view_attrs(self, rv, index, data):
+        """Rebind this view to another row of data"""
+        for cell, text in zip(self.cells, data["cells"]):
+            cell.text = text
+        return super().refresh_view_attrs(rv, index, {})
+
+
 class MedicineScreen(Screen):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.page = 1
         self.items_per_page = 10
         self.total_items = 0
+        self.total_exact = True  # False when total_items is only a lower bound
         self.search_query = ""
+        # Keyset positions of the first and last rows on the current page
+        self.first_key = None
+        self.last_key = None
+        self.search_scheduler = SearchScheduler(DB_PATH, self.show_medicines, self.show_load_error)
+        self.export_thread = None
         
         # Create input fields for adding medicine
         self.name_input = TextInput(hint_text="Enter name (required)", multiline=False)
@@ -1260,7 +1568,7 @@ class MedicineScreen(Screen):
         self.search_input = TextInput(
             hint_text="Search medicines...",
             multiline=False,
-            size_hint=(0.7, None),
+            size_hint=(0.58, None),
             height=40
         )
         self.search_input.bind(text=self.on_search_text)
@@ -1281,9 +1589,18 @@ class MedicineScreen(Screen):
         )
         clear_btn.bind(on_press=self.clear_search)
         
+        export_btn = Button(
+            text="Export CSV",
+            size_hint=(0.12, None),
+            height=40,
+            background_color=(0.2, 0.6, 0.5, 1)  # Teal
+        )
+        export_btn.bind(on_press=self.export_medicines)
+        
         search_layout.add_widget(self.search_input)
         search_layout.add_widget(search_btn)
         search_layout.add_widget(clear_btn)
+        search_layout.add_widget(export_btn)
         self.data_layout.add_widget(search_layout)
 
         # Add pagination controls at the top
@@ -1344,17 +1661,20 @@ class MedicineScreen(Screen):
             header_layout.add_widget(header_label)
         self.data_layout.add_widget(header_layout)
 
-        # Scroll view for medicine list
-        self.scroll_view = ScrollView(size_hint=(1, 1))
-        self.list_layout = GridLayout(
-            cols=5,
-            spacing=(2, 2),
+        # Recycled medicine list: a small pool of MedicineRow views bound to data
+        self.medicine_view = RecycleView(size_hint=(1, 1))
+        list_layout = RecycleBoxLayout(
+            orientation="vertical",
+            spacing=2,
             size_hint_y=None,
-            padding=(5, 5)
+            padding=(5, 5),
+            default_size=(None, 60),
+            default_size_hint=(1, None)
         )
-        self.list_layout.bind(minimum_height=self.list_layout.setter('height'))
-        self.scroll_view.add_widget(self.list_layout)
-        self.data_layout.add_widget(self.scroll_view)
+        list_layout.bind(minimum_height=list_layout.setter('height'))
+        self.medicine_view.add_widget(list_layout)
+        self.medicine_view.viewclass = MedicineRow  # Must be set after the layout manager is added
+        self.data_layout.add_widget(self.medicine_view)
 
         # Controls layout with sections
         controls_layout = BoxLayout(
@@ -1504,21 +1824,32 @@ class MedicineScreen(Screen):
 
     def change_page(self, direction):
         new_page = self.page + direction
-        if new_page >= 1 and new_page <= (self.total_items + self.items_per_page - 1) // self.items_per_page:
+        total_pages = (self.total_items + self.items_per_page - 1) // self.items_per_page
+        if new_page >= 1 and (new_page <= total_pages or not self.total_exact):
+            # Seek from the edge of the current page instead of counting rows with OFFSET
+            if new_page == 1:
+                seek = None
+            elif direction > 0 and self.last_key is not None:
+                seek = ("after", self.last_key)
+            elif direction < 0 and self.first_key is not None:
+                seek = ("before", self.first_key)
+            else:
+                seek = None
             self.page = new_page
-            self.refresh_medicines()
+            self.search_scheduler.submit(self.search_query, self.page, self.items_per_page, seek)
 
     def update_pagination_controls(self):
         total_pages = (self.total_items + self.items_per_page - 1) // self.items_per_page
-        self.page_label.text = f"Page {self.page} of {total_pages}"
+        self.page_label.text = f"Page {self.page} of {total_pages}{'' if self.total_exact else '+'}"
         self.prev_btn.disabled = self.page <= 1
-        self.next_btn.disabled = self.page >= total_pages
+        self.next_btn.disabled = self.page >= total_pages and self.total_exact
 
     def on_search_text(self, instance, value):
         """Handle search input changes"""
         self.search_query = value.strip()
         self.page = 1  # Reset to first page when search changes
-        self.refresh_medicines()
+        # Wait for typing to pause before querying
+        self.search_scheduler.schedule(self.search_query, self.page, self.items_per_page)
 
     def on_search(self, instance):
         """Handle search button press"""
@@ -1532,171 +1863,43 @@ class MedicineScreen(Screen):
         self.page = 1
         self.refresh_medicines()
 
-    def get_total_items(self):
-        app = App.get_running_app()
-        try:
-            query = "SELECT COUNT(*) FROM med_info"
-            params = []
-            
-            if self.search_query:
-                query = """
-                    SELECT COUNT(*) FROM med_info 
-                    WHERE med_name LIKE ? OR med_type LIKE ? OR 
-                          dosage_form LIKE ? OR strength LIKE ? OR 
-                          manufacturer LIKE ? OR indication LIKE ? OR 
-                          classification LIKE ?
-                """
-                search_param = f"%{self.search_query}%"
-                params = [search_param] * 7
-            
-            app.cursor.execute(query, params)
-            return app.cursor.fetchone()[0]
-        except sqlite3.Error:
-            return 0
-
     def refresh_medicines(self, *args):
-        app = App.get_running_app()
+        """Load the current page in the background; show_medicines renders it"""
+        seek = ("from", self.first_key) if self.page > 1 and self.first_key is not None else None
+        self.search_scheduler.submit(self.search_query, self.page, self.items_per_page, seek)
+
+    def show_medicines(self, total_items, total_exact, medicines):
+        """Render a page of search results delivered by the search scheduler"""
         try:
-            # Get total count for pagination
-            self.total_items = self.get_total_items()
-            
-            # Calculate offset for current page
-            offset = (self.page - 1) * self.items_per_page
-            
-            # Base query
-            query = """
-                SELECT med_id, med_name, med_type, dosage_form, strength, 
-                       manufacturer, indication, classification 
-                FROM med_info
-            """
-            params = []
-            
-            # Add search condition if there's a search query
-            if self.search_query:
-                query += """
-                    WHERE med_name LIKE ? OR med_type LIKE ? OR 
-                          dosage_form LIKE ? OR strength LIKE ? OR 
-                          manufacturer LIKE ? OR indication LIKE ? OR 
-                          classification LIKE ?
-                """
-                search_param = f"%{self.search_query}%"
-                params = [search_param] * 7
-            
-            # Add ordering and pagination
-            query += " ORDER BY med_name LIMIT ? OFFSET ?"
-            params.extend([self.items_per_page, offset])
-            
-            app.cursor.execute(query, params)
-            medicines = app.cursor.fetchall()
-            
-            # Clear previous content
-            self.list_layout.clear_widgets()
+            self.total_items = total_items
+            self.total_exact = total_exact
+            self.first_key = medicines[0].sort_key if medicines else None
+            self.last_key = medicines[-1].sort_key if medicines else None
             
             if not medicines:
-                # Add a "No medicines found" message spanning all columns
-                self.list_layout.add_widget(
-                    Label(
-                        text="No medicines found" if self.search_query else "No medicines in database",
-                        size_hint_y=None,
-                        height=40,
-                        color=(0, 0, 0, 1)  # Black text
-                    )
-                )
+                # Show a "No medicines found" message in place of the rows
+                self.show_message("No medicines found" if self.search_query else "No medicines in database")
                 return
 
-            # Add medicines to the grid
-            for med in medicines:
-                # Column 1: ID and Name
-                self.list_layout.add_widget(
-                    Label(
-                        text=f"ID: {med[0]}\n{med[1]}",
-                        size_hint_y=None,
-                        height=60,
-                        text_size=(None, None),
-                        halign='left',
-                        color=(0, 0, 0, 1)  # Black text
-                    )
-                )
-
-                # Column 2: Type and Form
-                type_form = f"Type: {med[2] or 'N/A'}"
-                if med[3]:  # dosage_form
-                    type_form += f"\nForm: {med[3]}"
-                self.list_layout.add_widget(
-                    Label(
-                        text=type_form,
-                        size_hint_y=None,
-                        height=60,
-                        text_size=(None, None),
-                        halign='left',
-                        color=(0, 0, 0, 1)  # Black text
-                    )
-                )
-
-                # Column 3: Strength
-                self.list_layout.add_widget(
-                    Label(
-                        text=med[4] or "N/A",
-                        size_hint_y=None,
-                        height=60,
-                        text_size=(None, None),
-                        halign='left',
-                        color=(0, 0, 0, 1)  # Black text
-                    )
-                )
-
-                # Column 4: Manufacturer
-                self.list_layout.add_widget(
-                    Label(
-                        text=med[5] or "N/A",
-                        size_hint_y=None,
-                        height=60,
-                        text_size=(None, None),
-                        halign='left',
-                        color=(0, 0, 0, 1)  # Black text
-                    )
-                )
-
-                # Column 5: Indication and Classification
-                ind_class = f"Ind: {med[6] or 'N/A'}"
-                if med[7]:  # classification
-                    ind_class += f"\nClass: {med[7]}"
-                self.list_layout.add_widget(
-                    Label(
-                        text=ind_class,
-                        size_hint_y=None,
-                        height=60,
-                        text_size=(None, None),
-                        halign='left',
-                        color=(0, 0, 0, 1)  # Black text
-                    )
-                )
+            # Row views are recycled; only the data list is rebuilt
+            self.medicine_view.data = [{"cells": medicine_cells(med)} for med in medicines]
+            self.medicine_view.scroll_y = 1
 
             # Update pagination controls
             self.update_pagination_controls()
 
-        except sqlite3.Error as e:
-            print(f"Database error: {e}")
-            self.list_layout.clear_widgets()
-            self.list_layout.add_widget(
-                Label(
-                    text=f"Error loading medicines: {str(e)}",
-                    size_hint_y=None,
-                    height=40,
-                    color=(0, 0, 0, 1)  # Black text
-                )
-            )
         except Exception as e:
             print(f"Unexpected error: {e}")
-            self.list_layout.clear_widgets()
-            self.list_layout.add_widget(
-                Label(
-                    text=f"Unexpected error: {str(e)}",
-                    size_hint_y=None,
-                    height=40,
-                    color=(0, 0, 0, 1)  # Black text
-                )
-            )
+            self.show_message(f"Unexpected error: {str(e)}")
+
+    def show_message(self, text):
+        """Replace the medicine rows with a single message"""
+        self.medicine_view.data = [{"cells": (text, "", "", "", "")}]
+
+    def show_load_error(self, e):
+        """Display a database error raised while loading medicines"""
+        print(f"Database error: {e}")
+        self.show_message(f"Error loading medicines: {str(e)}")
 
     def on_enter(self):
         self.page = 1  # Reset to first page when entering the screen
@@ -1712,6 +1915,45 @@ class MedicineScreen(Screen):
         self.status_label.text = message
         self.status_label.color = (0, 0.8, 0, 1)  # Green for success
 
+    def export_medicines(self, instance):
+        """Write every medicine matching the current search to a CSV file in the background"""
+        if self.export_thread is not None and self.export_thread.is_alive():
+            self.show_error("An export is already running")
+            return
+        path = f"medicines_export_{datetime.now():%Y%m%d_%H%M%S}.csv"
+        self.show_success(f"Exporting to {path}...")
+        self.export_thread = threading.Thread(
+            target=self._export_worker, args=(path, self.search_query, App.get_running_app().user_id),
+            daemon=True
+        )
+        self.export_thread.start()
+
+    def _export_worker(self, path, query, user_id):
+        from medassist.export import export_dataset  # Only needed once someone exports
+
+        pool = get_pool()
+        try:
+            stats = export_dataset(pool.connection(), "medicines", path, text=query,
+                                   progress=self._export_progress, user_id=user_id)
+            Clock.schedule_once(partial(self._export_finished, path, stats.rows))
+        except (OSError, sqlite3.Error) as e:
+            Clock.schedule_once(partial(self._export_failed, str(e)))
+        finally:
+            pool.release()
+
+    def _export_progress(self, written, total):
+        # Called on the export thread; widgets may only change on the UI thread
+        Clock.schedule_once(partial(self._show_export_progress, written, total))
+
+    def _show_export_progress(self, written, total, dt):
+        self.show_success(f"Exporting... {written} of {total} medicines")
+
+    def _export_finished(self, path, rows, dt):
+        self.show_success(f"Exported {rows} medicines to {path}")
+
+    def _export_failed(self, error, dt):
+        self.show_error(f"Export failed: {error}")
+
     def validate_inputs(self, operation="add"):
         """Validate input fields based on operation type"""
         errors = []
@@ -1771,23 +2013,16 @@ class MedicineScreen(Screen):
             indication = self.indication_input.text.strip() or None
             classification = self.classification_input.text.strip() or None
 
-            app = App.get_running_app()
+            medicines = App.get_running_app().medicines
             
             # Check if medicine with same name already exists
-            app.cursor.execute("SELECT med_id FROM med_info WHERE med_name = ?", (name,))
-            if app.cursor.fetchone():
+            if medicines.find_by_name(name) is not None:
                 self.show_error(f"Medicine with name '{name}' already exists")
                 return
 
             # Insert new medicine
-            app.cursor.execute("""
-                INSERT INTO med_info (
-                    med_name, med_type, dosage_form, strength,
-                    manufacturer, indication, classification
-                ) VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (name, med_type, dosage_form, strength,
-                  manufacturer, indication, classification))
-            app.conn.commit()
+            medicines.add(name, med_type, dosage_form, strength,
+                          manufacturer, indication, classification)
 
             # Clear inputs on success
             for input_field in [
@@ -1803,7 +2038,7 @@ class MedicineScreen(Screen):
         except sqlite3.IntegrityError as e:
             self.show_error(f"Database error: Medicine could not be added (duplicate entry)")
         except sqlite3.Error as e:
-            self.show_error(f"Database error: {str(e)}")
+            self.show_error(error_message(e))
         except Exception as e:
             self.show_error(f"Unexpected error: {str(e)}")
 
@@ -1821,33 +2056,31 @@ class MedicineScreen(Screen):
             med_id = self.med_id_input.text.strip()  # Use med_id_input instead of name_input
 
             app = App.get_running_app()
+            medicines = app.medicines
             
             # Check if medicine exists and get its name
-            app.cursor.execute("SELECT med_name FROM med_info WHERE med_id = ?", (med_id,))
-            result = app.cursor.fetchone()
-            if not result:
+            medicine = medicines.get(med_id, details=False)
+            if not medicine:
                 self.show_error(f"Medicine with ID {med_id} not found")
                 return
                 
-            med_name = result[0]
+            med_name = medicine.med_name
 
-            # Check if medicine is referenced in schedules or inventory
-            app.cursor.execute("SELECT COUNT(*) FROM schedule WHERE med_id = ?", (med_id,))
-            schedule_count = app.cursor.fetchone()[0]
-            
-            app.cursor.execute("SELECT COUNT(*) FROM inventory WHERE med_id = ?", (med_id,))
-            inventory_count = app.cursor.fetchone()[0]
+            # The catalog is shared; other users' schedules and stock keep the medicine in place
+            if medicines.used_by_others(med_id, app.user_id):
+                self.show_error(f"{med_name} is still used by other users and cannot be deleted")
+                return
+
+            # Check if medicine is referenced in this user's schedules or inventory
+            schedule_count, inventory_count = medicines.related_counts(med_id, app.user_id)
             
             if schedule_count > 0 or inventory_count > 0:
                 warning = f"Warning: This medicine has {schedule_count} schedule(s) and {inventory_count} inventory record(s).\n"
                 warning += "These related records will also be deleted.\nProceeding with deletion..."
                 self.show_error(warning)
                 
-            # Delete the medicine and related records
-            app.cursor.execute("DELETE FROM schedule WHERE med_id = ?", (med_id,))
-            app.cursor.execute("DELETE FROM inventory WHERE med_id = ?", (med_id,))
-            app.cursor.execute("DELETE FROM med_info WHERE med_id = ?", (med_id,))
-            app.conn.commit()
+            # Delete the medicine and related records in one transaction
+            medicines.delete(med_id, app.user_id)
 
             # Clear inputs
             self.med_id_input.text = ""  # Clear only the med_id_input
@@ -1856,7 +2089,9 @@ class MedicineScreen(Screen):
             self.refresh_medicines()
 
         except sqlite3.Error as e:
-            self.show_error(f"Database error: {str(e)}")
+            self.show_error(error_message(e))
+        except MedicineInUse as e:
+            self.show_error(str(e))  # Another user started using it meanwhile
         except ValueError as e:
             self.show_error(f"Invalid input: {str(e)}")
         except Exception as e:
@@ -1875,31 +2110,24 @@ class MedicineScreen(Screen):
                 self.show_error("Medicine ID must be a number")
                 return
                 
-            app = App.get_running_app()
-            app.cursor.execute("""
-                SELECT med_name, med_type, dosage_form, strength,
-                       manufacturer, indication, classification
-                FROM med_info WHERE med_id = ?
-            """, (med_id,))
-            
-            result = app.cursor.fetchone()
-            if not result:
+            medicine = App.get_running_app().medicines.get(med_id)
+            if not medicine:
                 self.show_error(f"No medicine found with ID {med_id}")
                 return
                 
             # Populate input fields with existing data
-            self.name_input.text = result[0] or ""
-            self.type_input.text = result[1] or ""
-            self.dosage_form_input.text = result[2] or ""
-            self.strength_input.text = result[3] or ""
-            self.manufacturer_input.text = result[4] or ""
-            self.indication_input.text = result[5] or ""
-            self.classification_input.text = result[6] or ""
+            self.name_input.text = medicine.med_name or ""
+            self.type_input.text = medicine.med_type or ""
+            self.dosage_form_input.text = medicine.dosage_form or ""
+            self.strength_input.text = medicine.strength or ""
+            self.manufacturer_input.text = medicine.manufacturer or ""
+            self.indication_input.text = medicine.indication or ""
+            self.classification_input.text = medicine.classification or ""
             
             self.show_success(f"Loaded data for medicine ID {med_id}")
             
         except sqlite3.Error as e:
-            self.show_error(f"Database error: {str(e)}")
+            self.show_error(error_message(e))
         except Exception as e:
             self.show_error(f"Error loading medicine data: {str(e)}")
 
@@ -1933,30 +2161,24 @@ class MedicineScreen(Screen):
             indication = self.indication_input.text.strip() or None
             classification = self.classification_input.text.strip() or None
 
-            app = App.get_running_app()
+            medicines = App.get_running_app().medicines
             
             # Check if medicine exists
-            app.cursor.execute("SELECT med_id FROM med_info WHERE med_id = ?", (med_id,))
-            if not app.cursor.fetchone():
+            if not medicines.exists(med_id):
                 self.show_error(f"No medicine found with ID {med_id}")
                 return
             
             # Check if new name conflicts with existing medicine (excluding current record)
-            app.cursor.execute("SELECT med_id FROM med_info WHERE med_name = ? AND med_id != ?", (name, med_id))
-            if app.cursor.fetchone():
+            if medicines.find_by_name(name, exclude_id=med_id) is not None:
                 self.show_error(f"Another medicine with name '{name}' already exists")
                 return
 
             # Update the medicine
-            app.cursor.execute("""
-                UPDATE med_info SET
-                    med_name = ?, med_type = ?, dosage_form = ?,
-                    strength = ?, manufacturer = ?, indication = ?,
-                    classification = ?
-                WHERE med_id = ?
-            """, (name, med_type, dosage_form, strength,
-                  manufacturer, indication, classification, med_id))
-            app.conn.commit()
+            medicines.update(
+                med_id, med_name=name, med_type=med_type, dosage_form=dosage_form,
+                strength=strength, manufacturer=manufacturer, indication=indication,
+                classification=classification
+            )
 
             # Clear inputs
             self.update_id_input.text = ""
@@ -1972,33 +2194,299 @@ class MedicineScreen(Screen):
             self.refresh_medicines()
 
         except sqlite3.Error as e:
-            self.show_error(f"Database error: {str(e)}")
+            self.show_error(error_message(e))
         except Exception as e:
             self.show_error(f"Error updating medicine: {str(e)}")
 
 
+# Seconds between passive WAL checkpoints
+CHECKPOINT_INTERVAL = 60
+
+# Longest wait before the reminder timer re-reads the clock, in case the system clock jumps
+REMINDER_MAX_WAIT = 300
+
+# Seconds between checks for schedules added by other terminals
+REMINDER_RELOAD_INTERVAL = 600
+
+# Longest wait at shutdown for each background thread to finish with its connection
+SHUTDOWN_JOIN_TIMEOUT = 5
+
+
+class LazyScreenManager(ScreenManager):
+    """ScreenManager that builds registered screens the first time they are shown or looked up"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.factories = {}
+
+    def register(self, name, factory):
+        """Build factory(name=name) when the screen is first needed"""
+        self.factories[name] = factory
+
+    def get_screen(self, name):
+        # Setting current goes through get_screen, so navigation builds the screen too
+        factory = self.factories.pop(name, None)
+        if factory is not None:
+            self.add_widget(factory(name=name))
+        return super().get_screen(name)
+
+
 class MedicineApp(App):
-    def build(self):
-        # Initialize and check database
-        init_db()
-        check_database()
+    # Background database setup, shown by StartupProgress; the data screens wait for db_ready
+    db_progress = NumericProperty(0)
+    db_status = StringProperty("Preparing database...")
+    db_ready = BooleanProperty(False)
+    # Latest medassist.alerts.Alerts, shown on the dashboard
+    alerts = ObjectProperty(None, allownone=True)
+    # medassist.reminders.Reminder values: the doses that last came due, and the next pending one
+    due_reminders = ListProperty([])
+    next_reminder = ObjectProperty(None, allownone=True)
 
-        self.conn = sqlite3.connect("medassist.db")
-        self.cursor = self.conn.cursor()
+    def build(self):
+        # Main-thread connection from the shared pool; worker threads get their own.
+        # Interactive: a write fails fast on a locked database instead of freezing the UI
+        self.conn = get_pool().connection(interactive=True)
+        self.medicines = MedicineRepository(self.conn)
+        self.schedules = ScheduleRepository(self.conn)
+        self.inventory = InventoryRepository(self.conn)
+        self.stock = StockRepository(self.conn)
+        # Set at login; the schedule, inventory and stock repositories only see this user's rows
         self.username = None
+        self.user_id = None
+        # Navigation checks the session token instead of asking for the password again
+        self.session_token = None
+        self.login_cache = VerificationCache()
 
-        self.screen_manager = ScreenManager()
+        # Only the login screen is built up front; the others load their data in on_enter
+        self.screen_manager = LazyScreenManager()
         self.screen_manager.add_widget(LoginScreen(name="login"))
-        self.screen_manager.add_widget(DashboardScreen(name="dashboard"))
-        self.screen_manager.add_widget(MedicineScreen(name="medicine"))
-        self.screen_manager.add_widget(ScheduleScreen(name="schedule"))
-        self.screen_manager.add_widget(InventoryScreen(name="inventory"))
+        self.screen_manager.register("dashboard", DashboardScreen)
+        self.screen_manager.register("medicine", MedicineScreen)
+        self.screen_manager.register("schedule", ScheduleScreen)
+        self.screen_manager.register("inventory", InventoryScreen)
+        self.screen_manager.bind(current=self._check_session)
+
+        # Initialize and check the database off the UI thread so the login screen shows at once
+        self.alert_watcher = None
+        self.reminders = ReminderQueue()
+        self.reminders_version = None
+        self.workers = []  # Short-lived threads on pooled connections, joined at shutdown
+        self.init_thread = threading.Thread(target=self._init_worker, daemon=True)
+        self.init_thread.start()
+
+        # Keep the WAL file short without waiting for a commit to cross the autocheckpoint size
+        Clock.schedule_interval(self.checkpoint_wal, CHECKPOINT_INTERVAL)
 
         return self.screen_manager
 
-    def on_stop(self):
-        self.conn.close()
+    def _init_worker(self):
+        init_db(progress=self._report_init_progress)
+        check_database()
+        Clock.schedule_once(self._database_ready)
+
+    def _report_init_progress(self, fraction, message):
+        Clock.schedule_once(partial(self._show_init_progress, fraction, message))
+
+    def _show_init_progress(self, fraction, message, dt):
+        self.db_progress = fraction
+        self.db_status = message
+
+    def _database_ready(self, dt):
+        self.db_progress = 1
+        self.db_status = "Database ready"
+        self.db_ready = True
+
+        # Expiry and low-stock checks need migrated tables, so they start here
+        self.alert_watcher = AlertWatcher(self._report_alerts, user_id=self.user_id)
+        self.alert_watcher.start()
+
+        if self.user_id is not None:
+            self.load_reminders()
+        Clock.schedule_interval(self.reload_reminders, REMINDER_RELOAD_INTERVAL)
+
+    def _set_user(self, username, user_id):
+        self.username = username
+        self.user_id = user_id
+        self.schedules.user_id = user_id
+        self.inventory.user_id = user_id
+        self.stock.user_id = user_id
+        if self.alert_watcher is not None:
+            self.alert_watcher.set_user(user_id)
+
+    def log_in(self, username, user_id, session_token):
+        """Scope the data screens, alerts and reminders to a user whose session was just created"""
+        self.session_token = session_token
+        self._set_user(username, user_id)
+        self.screen_manager.get_screen("dashboard").update_welcome(username)
+        if self.db_ready:
+            self.load_reminders()
+
+    def log_out(self):
+        self._end_session()
+        self._set_user(None, None)
+        self.alerts = None
+        self.reminders.load([], datetime.now())
+        self.due_reminders = []
+        self._arm_reminders()
+
+    def take_due_doses(self):
+        """Dispense one dose per due reminder; returns the DispenseResult
+
+        Reminders are cleared once their doses are taken. Those of a
+        medicine short of stock stay due, and nothing of it is taken.
+        """
+        from medassist.dispensing import dispense_doses
+
+        result = dispense_doses(self.conn, self.user_id, self.due_reminders)
+        short = {shortage.med_id for shortage in result.shortages}
+        self.due_reminders = [reminder for reminder in self.due_reminders if reminder.med_id in short]
+        if result.allocations:
+            self.check_alerts()
+        return result
+
+    def check_alerts(self):
+        """Ask the alert watcher for an immediate check"""
+        if self.alert_watcher is not None:
+            self.alert_watcher.wake()
+
+    def _report_alerts(self, alerts):
+        # Called on the watcher thread
+        Clock.schedule_once(partial(self._show_alerts, alerts))
+
+    def _show_alerts(self, alerts, dt):
+        self.alerts = alerts
+
+    def _end_session(self):
+        token, self.session_token = self.session_token, None
+        try:
+            end_session(self.conn, token)
+        except sqlite3.Error as e:
+            print(f"Ending session failed: {e}")
+
+    def _check_session(self, manager, current):
+        """Send the user back to the login screen once their session has expired"""
+        if current == "login" or self.session_token is None:
+            return
+        try:
+            if resolve_session(self.conn, self.session_token) is not None:
+                return
+        except sqlite3.Error as e:
+            print(f"Session check failed: {e}")
+            return
+        # Not while the screen manager is still switching to the screen
+        Clock.schedule_once(self._session_expired)
+
+    def _session_expired(self, dt):
+        self.log_out()
+        self.screen_manager.current = "login"
+        self.screen_manager.get_screen("login").greeting.text = "Session expired, please log in again"
+
+    def load_reminders(self):
+        """Queue the logged-in user's doses, reading their schedules off the UI thread"""
+        self.start_worker(self._reminders_worker, self.user_id)
+
+    def _reminders_worker(self, user_id):
+        pool = get_pool()
+        try:
+            schedules = ScheduleRepository(pool.connection(), user_id).list_active(date.today().isoformat())
+        except sqlite3.Error as e:
+            print(f"Loading schedules for reminders failed: {e}")
+            return
+        finally:
+            pool.release()
+        Clock.schedule_once(partial(self._load_reminders, user_id, schedules))
+
+    def _load_reminders(self, user_id, schedules, dt):
+        if user_id != self.user_id:
+            return  # Logged out or switched user meanwhile
+        self.reminders.load(schedules, datetime.now())
+        self.reminders_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        print(f"Reminders loaded for {len(self.reminders)} active schedule(s)")
+        self._arm_reminders()
+
+    def _arm_reminders(self):
+        """Wake up when the earliest pending dose is due; nothing else polls the schedules"""
+        Clock.unschedule(self._fire_reminders)
+        self.next_reminder = self.reminders.peek()
+        if self.next_reminder is None:
+            return
+        delay = (self.next_reminder.due - datetime.now()).total_seconds()
+        Clock.schedule_once(self._fire_reminders, min(max(delay, 0), REMINDER_MAX_WAIT))
+
+    def _fire_reminders(self, dt):
+        try:
+            # Each due schedule is re-read by id, so edits and deletions elsewhere are honoured
+            due = self.reminders.pop_due(datetime.now(), refresh=self.schedules.get)
+        except sqlite3.Error as e:
+            print(f"Reminder check failed: {e}")
+            due = []
+        for reminder in due:
+            print(f"Reminder: take {reminder.med_name} ({reminder.frequency}), due {reminder.due:%Y-%m-%d %H:%M}")
+        if due:
+            self.due_reminders = due
+        self._arm_reminders()
+
+    def schedule_changed(self, schedule_id):
+        """Re-queue one schedule after it was added, edited or deleted on this terminal"""
+        try:
+            schedule = self.schedules.get(schedule_id)
+        except sqlite3.Error as e:
+            print(f"Reminder update failed: {e}")
+            return
+        self.reminders.update(int(schedule_id), schedule, datetime.now())
+        self._arm_reminders()
+
+    def reload_reminders(self, dt):
+        """Rebuild the queue when another terminal has committed since the last load"""
+        if self.user_id is None:
+            return
+        if self.conn.execute("PRAGMA data_version").fetchone()[0] != self.reminders_version:
+            self.load_reminders()
+
+    def checkpoint_wal(self, dt):
+        """Run a passive checkpoint off the UI thread"""
+        self.start_worker(self._checkpoint_worker)
+
+    def start_worker(self, target, *args):
+        """Run target on a new thread that on_stop waits for"""
+        self.workers = [thread for thread in self.workers if thread.is_alive()]
+        thread = threading.Thread(target=target, args=args, daemon=True)
+        self.workers.append(thread)
+        thread.start()
+
+    def _checkpoint_worker(self):
+        pool = get_pool()
+        try:
+            checkpoint(pool.connection())
+        except sqlite3.Error as e:
+            print(f"WAL checkpoint failed: {e}")
+        finally:
+            pool.release()
 
+    def on_stop(self):
+        Clock.unschedule(self.checkpoint_wal)
+        Clock.unschedule(self.reload_reminders)
+        Clock.unschedule(self._fire_reminders)
+        # Every background thread releases its own pooled connection; wait for them to do so
+        threads = [self.init_thread] + self.workers
+        if self.alert_watcher is not None:
+            self.alert_watcher.stop()
+            threads.append(self.alert_watcher)
+        if self.screen_manager.has_screen("medicine"):
+            medicine_screen = self.screen_manager.get_screen("medicine")
+            medicine_screen.search_scheduler.stop()
+            threads += [medicine_screen.search_scheduler, medicine_screen.export_thread]
+        for thread in threads:
+            if thread is not None:
+                thread.join(SHUTDOWN_JOIN_TIMEOUT)
+        if self.session_token is not None:
+            self._end_session()
+        try:
+            # Fold the WAL back into the database file so it is self-contained on disk
+            checkpoint(self.conn, "TRUNCATE")
+        except sqlite3.Error as e:
+            print(f"WAL checkpoint failed: {e}")
+        get_pool().release()
 
 if __name__ == "__main__":
     MedicineApp().run()
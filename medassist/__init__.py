@@ -0,0 +1 @@
+"""Data layer for the MedAssist medicine management system"""
@@ -0,0 +1,162 @@
+"""Expired, expiring and low-stock inventory alerts
+
+Expiration dates are stored as zero-padded ISO text (see
+validation.normalize_date and migration 3), so "expiring in the next 30
+days" is a string range on idx_inventory_user_expiry within one user's
+lots. Low stock is judged per medicine from the stock_on_hand totals that
+triggers maintain (migration 7), a range on idx_stock_on_hand_level, so no
+lots are summed. No row is ever parsed in Python, whatever the size of the
+inventory.
+"""
+import sqlite3
+import threading
+from collections import namedtuple
+from datetime import date, timedelta
+
+from medassist.db import DB_PATH, get_pool
+from medassist.models import InventoryItem, StockLevel
+from medassist.repository import SELECT_INVENTORY, SELECT_STOCK
+
+# Lots expiring within this many days are reported as expiring soon
+EXPIRY_WARNING_DAYS = 30
+
+# Medicines with this many units or fewer on hand, over all their lots, are reported as low stock
+LOW_STOCK_QUANTITY = 10
+
+# Rows listed per alert kind; the counts always cover every match
+ALERT_LIMIT = 20
+
+# Seconds between background checks; a check with nothing changed costs one pragma
+ALERT_INTERVAL = 30
+
+# Lots already empty are not worth an expiry alert
+EXPIRED_WHERE = "i.user_id = ? AND i.expiration < ? AND i.quantity > 0"
+EXPIRING_WHERE = "i.user_id = ? AND i.expiration >= ? AND i.expiration < ? AND i.quantity > 0"
+# On hand counts every lot, expired ones included; those are also reported as expired
+LOW_STOCK_WHERE = "s.user_id = ? AND s.on_hand <= ?"
+
+LIST_EXPIRED = SELECT_INVENTORY + f" WHERE {EXPIRED_WHERE} ORDER BY i.expiration LIMIT ?"
+LIST_EXPIRING = SELECT_INVENTORY + f" WHERE {EXPIRING_WHERE} ORDER BY i.expiration LIMIT ?"
+LIST_LOW_STOCK = SELECT_STOCK + f" WHERE {LOW_STOCK_WHERE} ORDER BY s.on_hand LIMIT ?"
+COUNT_EXPIRED = f"SELECT COUNT(*) FROM inventory i WHERE {EXPIRED_WHERE}"
+COUNT_EXPIRING = f"SELECT COUNT(*) FROM inventory i WHERE {EXPIRING_WHERE}"
+COUNT_LOW_STOCK = f"SELECT COUNT(*) FROM stock_on_hand s WHERE {LOW_STOCK_WHERE}"
+
+Alerts = namedtuple("Alerts", [
+    "as_of", "expired", "expired_count", "expiring", "expiring_count", "low_stock", "low_stock_count"
+])
+
+
+def find_alerts(conn, user_id, today=None, warning_days=EXPIRY_WARNING_DAYS,
+                low_stock=LOW_STOCK_QUANTITY, limit=ALERT_LIMIT):
+    """Alerts for a user's inventory as of today
+
+    expired and expiring hold InventoryItem lots, soonest first; low_stock
+    holds StockLevel medicines, least stock first.
+    """
+    today = today or date.today()
+    start = today.isoformat()
+    end = (today + timedelta(days=warning_days)).isoformat()
+
+    def rows(sql, params, make=InventoryItem._make):
+        return [make(row) for row in conn.execute(sql, params + (limit,))]
+
+    def count(sql, params):
+        return conn.execute(sql, params).fetchone()[0]
+
+    return Alerts(
+        today,
+        rows(LIST_EXPIRED, (user_id, start)), count(COUNT_EXPIRED, (user_id, start)),
+        rows(LIST_EXPIRING, (user_id, start, end)), count(COUNT_EXPIRING, (user_id, start, end)),
+        rows(LIST_LOW_STOCK, (user_id, low_stock), StockLevel._make),
+        count(COUNT_LOW_STOCK, (user_id, low_stock)),
+    )
+
+
+class AlertMonitor:
+    """Re-runs find_alerts only when the data, the user or the date has changed
+
+    A check compares PRAGMA data_version (commits by other connections),
+    the connection's own total_changes, the user and today's date with the
+    previous check, so a timer can call it often and it usually costs one pragma.
+    Use one monitor per connection.
+    """
+
+    def __init__(self, warning_days=EXPIRY_WARNING_DAYS, low_stock=LOW_STOCK_QUANTITY, limit=ALERT_LIMIT):
+        self.warning_days = warning_days
+        self.low_stock = low_stock
+        self.limit = limit
+        self.alerts = None
+        self._stamp = None
+
+    def invalidate(self):
+        """Make the next check query again"""
+        self._stamp = None
+
+    def check(self, conn, user_id, today=None):
+        """New Alerts, or None when nothing changed since the last check"""
+        today = today or date.today()
+        stamp = (conn.execute("PRAGMA data_version").fetchone()[0], conn.total_changes, user_id, today)
+        if stamp == self._stamp:
+            return None
+        self.alerts = find_alerts(conn, user_id, today, self.warning_days, self.low_stock, self.limit)
+        self._stamp = stamp
+        return self.alerts
+
+
+class AlertWatcher:
+    """Checks alerts on a background thread every interval seconds, or sooner when woken
+
+    on_alerts(alerts) is called on the watcher thread whenever the alerts
+    of user_id may have changed; with user_id None they are always empty.
+    The thread keeps one pooled connection for its whole life, as
+    AlertMonitor needs.
+    """
+
+    def __init__(self, on_alerts, db_path=DB_PATH, interval=ALERT_INTERVAL, monitor=None, user_id=None):
+        self.on_alerts = on_alerts
+        self.user_id = user_id
+        self.db_path = db_path
+        self.interval = interval
+        self.monitor = monitor or AlertMonitor()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def wake(self):
+        """Check now instead of waiting for the next interval"""
+        self._wake.set()
+
+    def set_user(self, user_id):
+        """Switch to another user's inventory and check it now"""
+        self.user_id = user_id
+        self.wake()
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+
+    def join(self, timeout=None):
+        """Wait for the thread to release its connection after stop"""
+        if self._thread.is_alive():
+            self._thread.join(timeout)
+
+    def _run(self):
+        pool = get_pool(self.db_path)
+        try:
+            conn = pool.connection()
+            while not self._stopped.is_set():
+                try:
+                    alerts = self.monitor.check(conn, self.user_id)
+                except sqlite3.Error as e:
+                    print(f"Inventory alert check failed: {e}")
+                    alerts = None
+                if alerts is not None:
+                    self.on_alerts(alerts)
+                self._wake.wait(self.interval)
+                self._wake.clear()
+        finally:
+            pool.release()
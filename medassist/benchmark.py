@@ -0,0 +1,443 @@
+"""Headless benchmarks for the MedAssist data paths
+
+Generates synthetic catalogs, times the queries the screens run and prints
+JSON that can be compared across commits:
+
+    python -m medassist.benchmark --sizes 10000 100000 --out bench.json
+
+No window or running App is needed; everything goes through medassist.
+"""
+import argparse
+import contextlib
+import csv
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from medassist.alerts import find_alerts
+from medassist.csv_import import sync_medicine_csv
+from medassist.db import connect
+from medassist.dispensing import dispense, dispense_many
+from medassist.ingest import ingest_files
+from medassist.inventory_batch import apply_batch
+from medassist.migrations import migrate
+from medassist.reminders import ReminderQueue
+from medassist.repository import (
+    LIST_INVENTORY, LIST_SCHEDULES, LIST_STOCK, InventoryRepository, MedicineRepository, ScheduleRepository
+)
+from medassist.schema import create_tables
+from medassist.search import (
+    count_medicines, ensure_fts_index, fetch_medicines, fts_enabled, page_key
+)
+
+DEFAULT_SIZES = (10000, 100000)
+DEFAULT_REPEAT = 5
+
+# Related rows generated per medicine, spread over BENCH_USERS accounts
+SCHEDULES_PER_MEDICINE = 0.1
+INVENTORY_PER_MEDICINE = 0.1
+BENCH_USERS = 10
+
+# Share of CSV rows edited before the delta sync benchmark
+DELTA_FRACTION = 0.01
+
+# Files the catalog is split into for the parallel ingest benchmark
+INGEST_FILES = 4
+
+SEARCH_TERMS = ("amo", "ibuprocillin", "pfizer tablet", "zzzz")
+CRUD_OPERATIONS = 100
+# Lots of one medicine for the dispensing benchmark
+DISPENSE_LOTS = 5000
+MEMORY_SAMPLE_ROWS = 5000
+
+_NAME_PARTS = (
+    ("Aceto", "Ibupro", "Amoxi", "Cipro", "Metfor", "Losar", "Atorva", "Parace", "Doxy", "Predni"),
+    ("cillin", "fen", "mycin", "statin", "prazole", "tamol", "sartan", "min", "zole", "lone"),
+)
+_TYPES = ("Antibiotic", "Antiviral", "Antidiabetic", "Analgesic", "Antifungal", "Antidepressant")
+_FORMS = ("Tablet", "Capsule", "Injection", "Syrup", "Cream", "Ointment", "Drops", "Inhaler")
+_MANUFACTURERS = ("Pfizer Inc.", "Roche Holding AG", "CSL Limited", "Novartis AG", "Bayer AG", "Sanofi")
+_INDICATIONS = ("Infection", "Pain", "Fever", "Diabetes", "Virus", "Wound", "Depression")
+_CLASSES = ("Prescription", "Over-the-Counter")
+
+
+def synthetic_medicine(rng, index):
+    """One CSV row; the index suffix keeps names spread across the alphabet"""
+    name = f"{rng.choice(_NAME_PARTS[0])}{rng.choice(_NAME_PARTS[1])} {index}"
+    return [
+        name, rng.choice(_TYPES), rng.choice(_FORMS), f"{rng.randint(1, 100) * 10} mg",
+        rng.choice(_MANUFACTURERS), rng.choice(_INDICATIONS), rng.choice(_CLASSES),
+    ]
+
+
+def write_catalog(path, size, seed=0, edit_fraction=0.0):
+    """Write a synthetic medicine.csv with size rows
+
+    With edit_fraction > 0 the same catalog is written with that share of
+    rows given the other classification, for delta sync runs.
+    """
+    rng = random.Random(seed)
+    edit_rng = random.Random(seed + 1)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Name", "Category", "Dosage Form", "Strength",
+                         "Manufacturer", "Indication", "Classification"])
+        for index in range(size):
+            row = synthetic_medicine(rng, index)
+            if edit_fraction and edit_rng.random() < edit_fraction:
+                row[6] = _CLASSES[1 - _CLASSES.index(row[6])]
+            writer.writerow(row)
+
+
+def populate_related(conn, seed=0):
+    """Add users, and schedule and inventory rows scaled to the catalog size"""
+    rng = random.Random(seed)
+    med_ids = [row[0] for row in conn.execute("SELECT med_id FROM med_info")]
+    conn.executemany("INSERT INTO user (username, password) VALUES (?, ?)",
+                     [(f"user{index}", "password") for index in range(BENCH_USERS)])
+    user_ids = [row[0] for row in conn.execute("SELECT user_id FROM user")]
+    schedules = [
+        (rng.choice(med_ids), f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+         f"2026-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}", "Daily", rng.choice(user_ids))
+        for _ in range(int(len(med_ids) * SCHEDULES_PER_MEDICINE))
+    ]
+    inventory = [
+        (rng.choice(med_ids), rng.randint(0, 500),
+         f"{rng.randint(2025, 2028)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}", rng.choice(user_ids))
+        for _ in range(int(len(med_ids) * INVENTORY_PER_MEDICINE))
+    ]
+    conn.executemany("""
+        INSERT INTO schedule (med_id, consumption_start, consumption_end, frequency, user_id)
+        VALUES (?, ?, ?, ?, ?)
+    """, schedules)
+    conn.executemany("INSERT INTO inventory (med_id, quantity, expiration, user_id) VALUES (?, ?, ?, ?)", inventory)
+    conn.commit()
+    return len(schedules), len(inventory)
+
+
+def time_call(func, repeat=1):
+    """Run func repeat times; returns (timings in seconds, last result)"""
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return timings, result
+
+
+def summarize(timings):
+    """Timing statistics stored in the JSON output"""
+    return {
+        "runs": len(timings),
+        "median_ms": round(statistics.median(timings) * 1000, 3),
+        "min_ms": round(min(timings) * 1000, 3),
+        "max_ms": round(max(timings) * 1000, 3),
+    }
+
+
+def open_database(path):
+    """Fresh database with the app schema, indexes and search index"""
+    conn = connect(path)
+    create_tables(conn.cursor())
+    conn.commit()
+    migrate(conn)
+    ensure_fts_index(conn)
+    return conn
+
+
+def _advance_mtime(path, seconds):
+    """Move a file's mtime forward so a rewrite within the same second still looks modified"""
+    mtime = time.time() + seconds
+    os.utime(path, (mtime, mtime))
+
+
+def bench_import(workdir, size, seed):
+    """Cold sync, unchanged resync and delta resync of a generated CSV"""
+    results = {}
+    csv_path = os.path.join(workdir, "medicine.csv")
+    write_catalog(csv_path, size, seed)
+    conn = open_database(os.path.join(workdir, "medassist.db"))
+
+    timings, _ = time_call(lambda: sync_medicine_csv(conn, csv_path))
+    results["import.cold_sync"] = summarize(timings)
+    # A rewrite with identical content only costs a hash of the file
+    write_catalog(csv_path, size, seed)
+    _advance_mtime(csv_path, 1)
+    timings, _ = time_call(lambda: sync_medicine_csv(conn, csv_path))
+    results["import.unchanged_sync"] = summarize(timings)
+    write_catalog(csv_path, size, seed, edit_fraction=DELTA_FRACTION)
+    _advance_mtime(csv_path, 2)
+    timings, _ = time_call(lambda: sync_medicine_csv(conn, csv_path))
+    results["import.delta_sync"] = summarize(timings)
+    return conn, results
+
+
+def bench_ingest(workdir, size, seed):
+    """Multi-file ingest with one worker and with one worker per CPU"""
+    results = {}
+    csv_dir = os.path.join(workdir, "ingest")
+    os.makedirs(csv_dir)
+    for part in range(INGEST_FILES):
+        write_catalog(os.path.join(csv_dir, f"part{part}.csv"), size // INGEST_FILES, seed + part)
+    for workers in sorted({1, os.cpu_count() or 1}):
+        conn = open_database(os.path.join(workdir, f"ingest_{workers}.db"))
+        try:
+            timings, _ = time_call(lambda: ingest_files(conn, [csv_dir], workers))
+        finally:
+            conn.close()
+        results[f"ingest.workers_{workers}"] = summarize(timings)
+    return results
+
+
+def bench_search(conn, repeat):
+    """Count and first page for a few search terms, as MedicineScreen runs them"""
+    results = {}
+    cursor = conn.cursor()
+    use_fts = fts_enabled(cursor)
+    for term in SEARCH_TERMS:
+        timings, _ = time_call(lambda: count_medicines(cursor, term, approximate=True, use_fts=use_fts), repeat)
+        results[f"search.count[{term}]"] = summarize(timings)
+        timings, _ = time_call(lambda: fetch_medicines(cursor, term, 10, use_fts=use_fts), repeat)
+        results[f"search.page[{term}]"] = summarize(timings)
+    return results
+
+
+def bench_pagination(conn, repeat, page_size=10):
+    """First, middle and last page of the browse list, by keyset and by offset"""
+    results = {}
+    cursor = conn.cursor()
+    total = count_medicines(cursor)[0]
+    last_offset = max(total - page_size, 0)
+    for label, offset in (("first", 0), ("middle", last_offset // 2), ("last", last_offset)):
+        timings, _ = time_call(lambda: fetch_medicines(cursor, "", page_size, offset), repeat)
+        results[f"page.offset.{label}"] = summarize(timings)
+        # Keyset pages seek from the key of the row just before the page
+        before = fetch_medicines(cursor, "", 1, offset - 1) if offset else []
+        seek = ("after", page_key(before[0])) if before else None
+        timings, _ = time_call(lambda: fetch_medicines(cursor, "", page_size, seek=seek), repeat)
+        results[f"page.keyset.{label}"] = summarize(timings)
+    return results
+
+
+def bench_crud(conn):
+    """Single-medicine add, lookup, update and delete through MedicineRepository"""
+    medicines = MedicineRepository(conn)
+    names = [f"Benchmark medicine {index}" for index in range(CRUD_OPERATIONS)]
+    med_ids = []
+
+    def add():
+        med_ids.extend(medicines.add(name, "Benchmark") for name in names)
+
+    def lookup():
+        for name in names:
+            medicines.find_by_name(name)
+
+    def update():
+        for med_id in med_ids:
+            medicines.update(med_id, med_type="Updated")
+
+    def delete():
+        for med_id in med_ids:
+            medicines.delete(med_id)
+
+    results = {}
+    for label, func in (("add", add), ("lookup", lookup), ("update", update), ("delete", delete)):
+        timings, _ = time_call(func)
+        # Reported per operation so runs with different counts compare
+        results[f"crud.{label}"] = summarize([timings[0] / CRUD_OPERATIONS])
+    return results
+
+
+def bench_inventory_batch(conn):
+    """Receiving CRUD_OPERATIONS lots one commit at a time, then as one batch"""
+    lots = [(med_id, 10, "2099-01-01") for med_id in range(1, CRUD_OPERATIONS + 1)]
+    inventory = InventoryRepository(conn, BENCH_USER_ID)
+
+    def single():
+        for lot in lots:
+            inventory.add(*lot)
+
+    text = "\n".join(",".join(str(value) for value in lot) for lot in lots)
+    results = {}
+    for label, func in (("single", single), ("batch", lambda: apply_batch(conn, BENCH_USER_ID, text))):
+        timings, _ = time_call(func)
+        results[f"inventory.receive_{label}"] = summarize([timings[0] / CRUD_OPERATIONS])
+    return results
+
+
+def bench_dispense(conn, lots=DISPENSE_LOTS):
+    """FEFO dispensing from a medicine with many lots, one dose and a large order, then a day of doses"""
+    med_id = conn.execute("SELECT MAX(med_id) FROM med_info").fetchone()[0]
+    InventoryRepository(conn, BENCH_USER_ID).add_many(
+        (med_id, 2, f"{2030 + index % 50}-01-01") for index in range(lots)
+    )
+    today = datetime(2025, 6, 1).date()
+    due = [(row[0], 1) for row in conn.execute(
+        "SELECT med_id FROM stock_on_hand WHERE user_id = ? AND on_hand > 0 LIMIT 20", (BENCH_USER_ID,)
+    )]
+    results = {}
+    for label, func in (
+        ("dispense.one_dose", lambda: dispense(conn, BENCH_USER_ID, med_id, 1, today)),
+        ("dispense.large_order", lambda: dispense(conn, BENCH_USER_ID, med_id, lots // 2, today)),
+        ("dispense.due_doses", lambda: dispense_many(conn, BENCH_USER_ID, due, today)),
+    ):
+        timings, _ = time_call(func)
+        results[label] = summarize(timings)
+    return results
+
+
+def bench_row_memory(conn, rows=MEMORY_SAMPLE_ROWS):
+    """Bytes held per medicine row: raw tuples, full Medicine rows and rows without details"""
+    medicines = MedicineRepository(conn)
+    cursor = conn.cursor()
+    samples = {
+        "memory.tuple_row_bytes": lambda: fetch_medicines(cursor, "", rows),
+        "memory.medicine_row_bytes": lambda: medicines.page("", rows),
+        "memory.medicine_summary_row_bytes": lambda: medicines.list_summaries()[:rows],
+    }
+    results = {}
+    for name, load in samples.items():
+        tracemalloc.start()
+        try:
+            before = tracemalloc.get_traced_memory()[0]
+            loaded = load()
+            held = tracemalloc.get_traced_memory()[0] - before
+        finally:
+            tracemalloc.stop()
+        results[name] = round(held / max(len(loaded), 1), 1)
+    return results
+
+
+# The user whose screens are measured; holds about 1/BENCH_USERS of the rows
+BENCH_USER_ID = 1
+
+# name -> (sql, parameters)
+DASHBOARD_QUERIES = {
+    "dashboard.table_counts": ("""
+        SELECT (SELECT COUNT(*) FROM user), (SELECT COUNT(*) FROM med_info),
+               (SELECT COUNT(*) FROM schedule), (SELECT COUNT(*) FROM inventory)
+    """, ()),
+    "dashboard.schedule_list": (LIST_SCHEDULES, (BENCH_USER_ID,)),
+    "dashboard.inventory_list": (LIST_INVENTORY, (BENCH_USER_ID,)),
+    "dashboard.stock_levels": (LIST_STOCK, (BENCH_USER_ID,)),
+}
+
+
+def bench_alerts(conn, repeat):
+    """Expired, expiring and low-stock alerts over one user's generated inventory"""
+    timings, _ = time_call(lambda: find_alerts(conn, BENCH_USER_ID), repeat)
+    return {"alerts.find": summarize(timings)}
+
+
+def bench_reminders(conn, repeat):
+    """Loading one user's active schedules into the reminder queue, then firing a day of doses"""
+    # Fixed "now" inside the generated schedule dates, so runs are comparable
+    now = datetime(2025, 6, 1)
+    schedules = ScheduleRepository(conn, BENCH_USER_ID)
+    queue = ReminderQueue()
+    timings, _ = time_call(lambda: queue.load(schedules.list_active(now.date().isoformat()), now), repeat)
+    results = {"reminders.load": summarize(timings)}
+    fire = []
+    for hour in range(24):
+        start = time.perf_counter()
+        fired = queue.pop_due(now + timedelta(hours=hour + 1))
+        if fired:
+            fire.append((time.perf_counter() - start) / len(fired))
+    if fire:
+        results["reminders.fire_per_dose"] = summarize(fire)
+    return results
+
+
+def bench_dashboard(conn, repeat):
+    """Table counts and one user's full schedule and inventory lists"""
+    results = {}
+    for name, (sql, params) in DASHBOARD_QUERIES.items():
+        timings, _ = time_call(lambda: conn.execute(sql, params).fetchall(), repeat)
+        results[name] = summarize(timings)
+    return results
+
+
+def run_size(size, repeat=DEFAULT_REPEAT, seed=0, workdir=None):
+    """All benchmarks for one catalog size; returns a result dict"""
+    with tempfile.TemporaryDirectory(dir=workdir) as tmp:
+        conn, results = bench_import(tmp, size, seed)
+        results.update(bench_ingest(tmp, size, seed))
+        try:
+            schedules, inventory = populate_related(conn, seed)
+            results.update(bench_search(conn, repeat))
+            results.update(bench_pagination(conn, repeat))
+            results.update(bench_dashboard(conn, repeat))
+            results.update(bench_alerts(conn, repeat))
+            results.update(bench_reminders(conn, repeat))
+            results.update(bench_crud(conn))
+            results.update(bench_inventory_batch(conn))
+            results.update(bench_dispense(conn))
+            memory = bench_row_memory(conn)
+        finally:
+            conn.close()
+    return {"size": size, "schedules": schedules, "inventory": inventory,
+            "timings": results, "memory": memory}
+
+
+def git_revision():
+    """Current commit of the working tree, or None outside a git checkout"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            check=True, cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    """What the numbers were measured on"""
+    return {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES),
+                        help="catalog sizes to generate (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT,
+                        help="runs per query benchmark (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", help="directory for the generated databases (default: system temp)")
+    parser.add_argument("--out", help="write JSON here instead of stdout")
+    args = parser.parse_args(argv)
+
+    report = {"environment": environment(), "results": []}
+    # Progress messages from the import code go to stderr so stdout stays valid JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        for size in args.sizes:
+            print(f"Benchmarking {size} medicines...")
+            report["results"].append(run_size(size, args.repeat, args.seed, args.workdir))
+
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,529 @@
+"""Bulk import of medicine.csv into the med_info table"""
+import csv
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from itertools import islice
+
+from medassist.schema import MED_INFO_COLUMNS, STRENGTH_COLUMNS
+from medassist.search import bulk_fts_insert
+from medassist.validation import RowError, validate_medicine_row
+
+# Rows handed to a single executemany call
+CHUNK_SIZE = 5000
+
+# Pragmas applied only for the duration of a bulk load
+BULK_LOAD_PRAGMAS = (
+    ("synchronous", "OFF"),
+    ("journal_mode", "MEMORY"),
+    ("cache_size", "-65536"),  # 64 MiB
+)
+
+# Columns written for every CSV row: the validated med_info values and the split strength
+STORED_COLUMNS = MED_INFO_COLUMNS + STRENGTH_COLUMNS
+
+INSERT_MED_INFO = f"""
+    INSERT INTO med_info ({", ".join(STORED_COLUMNS)})
+    VALUES ({", ".join("?" for _ in STORED_COLUMNS)})
+"""
+INSERT_SYNCED_MED_INFO = f"""
+    INSERT INTO med_info (med_id, {", ".join(STORED_COLUMNS)})
+    VALUES (?, {", ".join("?" for _ in STORED_COLUMNS)})
+"""
+UPDATE_SYNCED_MED_INFO = f"""
+    UPDATE med_info SET {", ".join(f"{column} = ?" for column in STORED_COLUMNS)}
+    WHERE med_id = ?
+"""
+
+# Where refused CSV rows are written by default
+REJECTS_PATH = "medicine_rejects.csv"
+
+# Header of the reject file: where the row came from, why it was refused, then the raw row
+REJECT_COLUMNS = ("file", "line", "reason") + MED_INFO_COLUMNS
+
+# Columns that identify a product; the rest are attributes that may be updated in place
+NATURAL_KEY_COLUMNS = MED_INFO_COLUMNS[:5]
+
+# Key columns whose edit is a correction of the same product rather than a
+# different one; a new form, strength or manufacturer is a new medicine
+REKEYABLE_COLUMNS = ("med_name", "med_type")
+
+ImportStats = namedtuple("ImportStats", ["rows", "rejected", "seconds"])
+SyncStats = namedtuple(
+    "SyncStats", ["inserted", "updated", "deleted", "kept", "unchanged", "rejected", "seconds"]
+)
+
+
+def rows_per_second(stats):
+    """Throughput of a finished import"""
+    if stats.seconds <= 0:
+        return float(stats.rows)
+    return stats.rows / stats.seconds
+
+
+def iter_numbered_csv_rows(path):
+    """Yield (line number, 7-column tuple) from the medicine CSV, skipping the header"""
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.reader(f)
+        next(reader, None)  # Skip header row
+        width = len(MED_INFO_COLUMNS)
+        for row in reader:
+            if not row:
+                continue
+            # Pad short rows with None and drop any extra columns
+            row += [None] * (width - len(row))
+            yield reader.line_num, tuple(row[:width])
+
+
+def iter_csv_rows(path):
+    """Yield 7-column tuples from the medicine CSV, skipping the header"""
+    for _, row in iter_numbered_csv_rows(path):
+        yield row
+
+
+def iter_chunks(rows, chunk_size=CHUNK_SIZE):
+    """Group an iterable of rows into lists of at most chunk_size"""
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+@contextmanager
+def bulk_load_pragmas(conn):
+    """Temporarily relax durability settings, restoring the previous values on exit
+
+    A database in WAL mode keeps its journal mode: leaving WAL needs exclusive
+    access, and WAL already avoids the rollback journal's extra writes.
+    """
+    previous = []
+    for name, value in BULK_LOAD_PRAGMAS:
+        current = conn.execute(f"PRAGMA {name}").fetchone()[0]
+        if name == "journal_mode" and str(current).lower() == "wal":
+            continue
+        previous.append((name, current))
+        conn.execute(f"PRAGMA {name} = {value}")
+    try:
+        yield
+    finally:
+        for name, value in reversed(previous):
+            conn.execute(f"PRAGMA {name} = {value}")
+
+
+class RejectFile:
+    """CSV file collecting the rows an import refused, created on the first reject"""
+
+    def __init__(self, path):
+        self.path = path
+        self.rows = 0
+        self._file = None
+        self._writer = None
+
+    def write(self, source, rejects):
+        """Record (line, row, reason) tuples refused from the source file"""
+        if not rejects:
+            return
+        if self._writer is None:
+            self._file = open(self.path, "w", newline="", encoding="utf-8")
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(REJECT_COLUMNS)
+        self._writer.writerows((source, line, reason) + tuple(row) for line, row, reason in rejects)
+        self.rows += len(rejects)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _digest(values):
+    """Short, stable hash of a sequence of column values"""
+    try:
+        text = "\x1f".join(values)
+    except TypeError:
+        # Short rows are padded with None
+        text = "\x1f".join("" if value is None else value for value in values)
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def validate_chunk(chunk):
+    """Validate and digest a list of (line, row); returns (valid, rejects)
+
+    valid holds (base_key, fingerprint, stored_row) where stored_row lists
+    the values for STORED_COLUMNS; rejects holds (line, row, reason). Keys
+    and fingerprints come from the raw row, so cleaning up the validation
+    rules never reassigns med_ids. Runs in ingest worker processes, so it
+    only takes and returns plain values.
+    """
+    width = len(NATURAL_KEY_COLUMNS)
+    valid = []
+    rejects = []
+    for line, row in chunk:
+        try:
+            stored = validate_medicine_row(row)
+        except RowError as e:
+            rejects.append((line, row, str(e)))
+            continue
+        valid.append((_digest(row[:width]), _digest(row[width:]), stored))
+    return valid, rejects
+
+
+def _insert_chunk(cursor, chunk):
+    """Insert one chunk, falling back to row-by-row inserts if the batch fails
+
+    Returns the number of rejected rows. Must run inside a transaction; a
+    savepoint undoes the rows the failed batch had already inserted, so
+    the fallback does not insert them twice.
+    """
+    cursor.execute("SAVEPOINT chunk")
+    try:
+        cursor.executemany(INSERT_MED_INFO, chunk)
+        cursor.execute("RELEASE chunk")
+        return 0
+    except sqlite3.Error:
+        cursor.execute("ROLLBACK TO chunk")
+        cursor.execute("RELEASE chunk")
+
+    rejected = 0
+    for row in chunk:
+        try:
+            cursor.execute(INSERT_MED_INFO, row)
+        except sqlite3.Error:
+            rejected += 1
+    return rejected
+
+
+def import_medicine_csv(conn, csv_path, chunk_size=CHUNK_SIZE, rejects=None):
+    """Replace the contents of med_info with the rows of csv_path
+
+    The whole load runs in one explicit transaction, so a failure leaves the
+    previous catalog untouched. The connection must not have an open
+    transaction when this is called.
+    """
+    start = time.perf_counter()
+    rows = 0
+    rejected = 0
+
+    with bulk_load_pragmas(conn):
+        cursor = conn.cursor()
+        cursor.execute("BEGIN")
+        try:
+            cursor.execute("DELETE FROM med_info")
+            for chunk in iter_chunks(iter_numbered_csv_rows(csv_path), chunk_size):
+                valid, refused = validate_chunk(chunk)
+                if rejects is not None:
+                    rejects.write(csv_path, refused)
+                rejected += len(refused)
+                failed = _insert_chunk(cursor, [row for _, _, row in valid])
+                rejected += failed
+                rows += len(valid) - failed
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+    stats = ImportStats(rows, rejected, time.perf_counter() - start)
+    print(f"Imported {stats.rows} medicines from {csv_path} "
+          f"in {stats.seconds:.3f}s ({rows_per_second(stats):,.0f} rows/sec)")
+    if stats.rejected:
+        print(f"Skipped {stats.rejected} invalid row(s) in {csv_path}")
+    return stats
+
+
+def file_content_hash(path):
+    """Hash of the raw file contents, used to skip syncs after a bare touch"""
+    digest = hashlib.blake2b()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def key_rows(digested):
+    """Yield (source_key, fingerprint, row) for each (base_key, fingerprint, row)
+
+    Rows sharing the same natural key are told apart by their occurrence
+    number, so the nth duplicate always maps to the same med_id. This must
+    see a file's rows in order, so it runs in the writer, not the workers.
+    """
+    occurrences = {}
+    for base, fingerprint, row in digested:
+        n = occurrences.get(base, 0)
+        occurrences[base] = n + 1
+        yield f"{base}:{n}", fingerprint, row
+
+
+def iter_keyed_rows(rows):
+    """Yield (source_key, fingerprint, row) for each row
+
+    The fingerprint only covers the non-key columns, since rows are only
+    ever compared against the row with the same key.
+    """
+    width = len(NATURAL_KEY_COLUMNS)
+    return key_rows((_digest(row[:width]), _digest(row[width:]), row) for row in rows)
+
+
+def _tracked_rows(cursor, csv_path):
+    """Map source_key -> (med_id, fingerprint) for rows previously synced from csv_path"""
+    # Medicines deleted through the UI leave dangling source rows when
+    # foreign keys are off; forget them so the CSV can restore the medicine
+    cursor.execute("""
+        DELETE FROM med_info_source
+        WHERE med_id NOT IN (SELECT med_id FROM med_info)
+    """)
+    cursor.execute(
+        "SELECT source_key, med_id, fingerprint FROM med_info_source WHERE filename = ?",
+        (csv_path,)
+    )
+    return {key: (med_id, fingerprint) for key, med_id, fingerprint in cursor}
+
+
+def _adoptable_rows(cursor):
+    """Map source_key -> (med_id, fingerprint) for medicines not tracked by any CSV
+
+    Catalogs loaded by the old wipe-and-reload import have no source rows.
+    Matching those medicines by natural key lets the first sync keep their
+    med_ids (and any schedules or inventory pointing at them).
+    """
+    cursor.execute(f"""
+        SELECT med_id, {", ".join(MED_INFO_COLUMNS)} FROM med_info
+        WHERE med_id NOT IN (SELECT med_id FROM med_info_source)
+        ORDER BY med_id
+    """)
+    med_rows = cursor.fetchall()
+    keyed = iter_keyed_rows(row[1:] for row in med_rows)
+    return {key: (row[0], fingerprint) for (key, fingerprint, _), row in zip(keyed, med_rows)}
+
+
+def _next_med_id(cursor):
+    """First med_id that AUTOINCREMENT has never handed out"""
+    cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'med_info'")
+    seq = cursor.fetchone()
+    cursor.execute("SELECT COALESCE(MAX(med_id), 0) FROM med_info")
+    return max(seq[0] if seq else 0, cursor.fetchone()[0]) + 1
+
+
+def _rekey_renamed(cursor, removed_ids, new_rows):
+    """Match medicines whose CSV row vanished to new rows that only differ in a rekeyable column
+
+    Correcting a name or category in the CSV gives the row a new key.
+    Pairing it with the medicine that lost its key lets that medicine keep
+    its med_id, and with it every schedule and lot. A pair is only made when
+    the row matches exactly one medicine and no other row matches that
+    medicine; anything ambiguous is left to delete plus insert. Returns
+    {index in new_rows: med_id}.
+    """
+    if not removed_ids or not new_rows:
+        return {}
+    width = len(NATURAL_KEY_COLUMNS)
+    columns = [NATURAL_KEY_COLUMNS.index(column) for column in REKEYABLE_COLUMNS]
+    cursor.execute(f"""
+        SELECT m.med_id, {", ".join(f"m.{column}" for column in NATURAL_KEY_COLUMNS)}
+        FROM json_each(?) j CROSS JOIN med_info m ON m.med_id = j.value
+    """, (json.dumps(removed_ids),))
+    # (blanked column, the other key values) -> med_ids
+    candidates = {}
+    for med_id, *key in cursor.fetchall():
+        for column in columns:
+            candidates.setdefault((column, tuple(key[:column] + key[column + 1:])), set()).add(med_id)
+
+    # index in new_rows -> the medicines it could be, and med_id -> how many rows could be it
+    matches = {}
+    claims = {}
+    for index, (_, _, row) in enumerate(new_rows):
+        key = list(row[:width])
+        med_ids = set()
+        for column in columns:
+            med_ids.update(candidates.get((column, tuple(key[:column] + key[column + 1:])), ()))
+        if med_ids:
+            matches[index] = med_ids
+            for med_id in med_ids:
+                claims[med_id] = claims.get(med_id, 0) + 1
+
+    matched = {}
+    for index, med_ids in matches.items():
+        med_id = next(iter(med_ids))
+        if len(med_ids) == 1 and claims[med_id] == 1:
+            matched[index] = med_id
+    return matched
+
+
+def _in_use(cursor, med_ids):
+    """The med_ids that still have a schedule or an inventory lot, of any user"""
+    cursor.execute("""
+        SELECT j.value FROM json_each(?) j
+        WHERE EXISTS (SELECT 1 FROM schedule s WHERE s.med_id = j.value)
+           OR EXISTS (SELECT 1 FROM inventory i WHERE i.med_id = j.value)
+    """, (json.dumps(med_ids),))
+    return {med_id for (med_id,) in cursor.fetchall()}
+
+
+def pending_sync(conn, csv_path, force=False):
+    """(mtime, content_hash) when csv_path needs syncing, None when its content is unchanged"""
+    cursor = conn.cursor()
+    mtime = int(os.path.getmtime(csv_path))
+
+    cursor.execute(
+        "SELECT last_modified, content_hash FROM csv_import_status WHERE filename = ?",
+        (csv_path,)
+    )
+    status = cursor.fetchone()
+    if status and status[0] is not None and status[0] >= mtime and not force:
+        return None
+
+    content_hash = file_content_hash(csv_path)
+    if status and status[1] == content_hash and not force:
+        # Touched but not edited: just remember the new mtime
+        cursor.execute(
+            "UPDATE csv_import_status SET last_modified = ? WHERE filename = ?",
+            (mtime, csv_path)
+        )
+        conn.commit()
+        return None
+    return mtime, content_hash
+
+
+def apply_keyed_rows(conn, csv_path, keyed_rows, mtime, content_hash):
+    """Apply one file's (source_key, fingerprint, stored_row) in a single write transaction
+
+    keyed_rows is consumed inside the transaction, so it may still be
+    producing rows. Returns (inserted, updated, deleted, kept, unchanged)
+    counts.
+
+    A row whose key changed updates the medicine that lost its key when
+    the two only differ in its name or category (see _rekey_renamed). Medicines
+    gone from the file are only deleted when no schedule or lot refers to
+    them; the rest are kept, untracked, and counted as kept.
+
+    Unlike the wipe-and-reload import this runs under the connection's
+    normal journal and synchronous settings: a sync edits a live catalog
+    that schedules and inventory point at.
+    """
+    cursor = conn.cursor()
+    new_rows = []
+    updated = []
+    sources = []
+    unchanged = 0
+
+    cursor.execute("BEGIN IMMEDIATE")  # Take the write lock before reading what to change
+    try:
+        tracked = _tracked_rows(cursor, csv_path)
+        adoptable = {} if tracked else _adoptable_rows(cursor)
+        seen = set()
+        first_new_id = next_id = _next_med_id(cursor)
+
+        for key, fingerprint, row in keyed_rows:
+            seen.add(key)
+            current = tracked.get(key)
+            if current is None and key in adoptable:
+                current = adoptable[key]
+                sources.append((current[0], csv_path, key, fingerprint))
+            if current is None:
+                new_rows.append((key, fingerprint, row))
+            elif current[1] != fingerprint:
+                updated.append(row + (current[0],))
+                if key in tracked:
+                    sources.append((current[0], csv_path, key, fingerprint))
+            else:
+                unchanged += 1
+
+        removed = [key for key in tracked if key not in seen]
+        removed_ids = [tracked[key][0] for key in removed]
+
+        rekeyed = _rekey_renamed(cursor, removed_ids, new_rows)
+        inserted = []
+        for index, (key, fingerprint, row) in enumerate(new_rows):
+            med_id = rekeyed.get(index)
+            if med_id is None:
+                med_id = next_id
+                inserted.append((med_id,) + row)
+                next_id += 1
+            else:
+                updated.append(row + (med_id,))
+            sources.append((med_id, csv_path, key, fingerprint))
+        rekeyed_ids = set(rekeyed.values())
+        remaining = [med_id for med_id in removed_ids if med_id not in rekeyed_ids]
+        # Never take schedules or stock down with a medicine the CSV dropped
+        kept = _in_use(cursor, remaining)
+        deleted = [(med_id,) for med_id in remaining if med_id not in kept]
+
+        with bulk_fts_insert(cursor, first_new_id):
+            for chunk in iter_chunks(inserted):
+                cursor.executemany(INSERT_SYNCED_MED_INFO, chunk)
+        cursor.executemany(UPDATE_SYNCED_MED_INFO, updated)
+        cursor.executemany(
+            "DELETE FROM med_info_source WHERE filename = ? AND source_key = ?",
+            [(csv_path, key) for key in removed]
+        )
+        cursor.executemany("DELETE FROM med_info WHERE med_id = ?", deleted)
+        for chunk in iter_chunks(sources):
+            cursor.executemany("""
+                INSERT OR REPLACE INTO med_info_source (med_id, filename, source_key, fingerprint)
+                VALUES (?, ?, ?, ?)
+            """, chunk)
+
+        cursor.execute("""
+            INSERT OR REPLACE INTO csv_import_status (filename, last_modified, content_hash)
+            VALUES (?, ?, ?)
+        """, (csv_path, mtime, content_hash))
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+    if kept:
+        print(f"Kept {len(kept)} medicine(s) removed from {csv_path} that still have schedules or "
+              f"inventory: med_id {', '.join(str(med_id) for med_id in sorted(kept))}")
+    return len(inserted), len(updated), len(deleted), len(kept), unchanged
+
+
+def report_sync(csv_path, counts, rejected, start):
+    """Print and return the SyncStats of a finished sync"""
+    stats = SyncStats(*counts, rejected, time.perf_counter() - start)
+    print(f"Synced {csv_path} in {stats.seconds:.3f}s: {stats.inserted} inserted, "
+          f"{stats.updated} updated, {stats.deleted} deleted, {stats.kept} kept, {stats.unchanged} unchanged")
+    if stats.rejected:
+        print(f"Skipped {stats.rejected} invalid row(s) in {csv_path}")
+    return stats
+
+
+def sync_medicine_csv(conn, csv_path, force=False, rejects=None):
+    """Bring med_info in line with csv_path by applying only the rows that changed
+
+    Each CSV row is matched to a medicine by its natural key, so existing
+    med_ids stay stable and related schedules and inventory are kept. Only
+    medicines that disappeared from the CSV and are not in use are deleted;
+    medicines added through the app are never touched. Refused rows go to rejects (a
+    RejectFile) when given. Returns None when the file content is unchanged
+    since the last sync.
+    """
+    start = time.perf_counter()
+    pending = pending_sync(conn, csv_path, force)
+    if pending is None:
+        return None
+
+    rejected = 0
+
+    def validated_rows():
+        nonlocal rejected
+        for chunk in iter_chunks(iter_numbered_csv_rows(csv_path)):
+            valid, refused = validate_chunk(chunk)
+            rejected += len(refused)
+            if rejects is not None:
+                rejects.write(csv_path, refused)
+            yield from valid
+
+    counts = apply_keyed_rows(conn, csv_path, key_rows(validated_rows()), *pending)
+    return report_sync(csv_path, counts, rejected, start)
@@ -0,0 +1,228 @@
+"""SQLite connection setup and per-thread connection pooling"""
+import os
+import sqlite3
+import threading
+import time
+
+DB_PATH = "medassist.db"
+
+# "wal" lets readers on other terminals keep reading while one terminal writes.
+# "rollback" is the classic journal, for databases on network shares where
+# WAL's shared-memory index is not available.
+STORAGE_MODE = os.environ.get("MEDASSIST_STORAGE_MODE", "wal").lower()
+
+STORAGE_MODE_PRAGMAS = {
+    "wal": (
+        ("journal_mode", "WAL"),
+        ("synchronous", "NORMAL"),  # Durable across app crashes; fsync at checkpoints
+        ("wal_autocheckpoint", "1000"),  # Pages of WAL before a commit checkpoints
+    ),
+    "rollback": (
+        ("journal_mode", "DELETE"),
+        ("synchronous", "FULL"),
+    ),
+}
+
+# How long a connection waits for another terminal's lock before failing
+BUSY_TIMEOUT_MS = int(os.environ.get("MEDASSIST_BUSY_TIMEOUT_MS", "5000"))
+# The same for a connection the UI thread writes through, which freezes the screen while it waits
+INTERACTIVE_BUSY_TIMEOUT_MS = int(os.environ.get("MEDASSIST_INTERACTIVE_BUSY_TIMEOUT_MS", "250"))
+
+if STORAGE_MODE not in STORAGE_MODE_PRAGMAS:
+    raise ValueError(f"MEDASSIST_STORAGE_MODE must be one of {sorted(STORAGE_MODE_PRAGMAS)}, not {STORAGE_MODE!r}")
+
+# Applied once to every connection when it is opened
+CONNECTION_PRAGMAS = STORAGE_MODE_PRAGMAS[STORAGE_MODE] + (
+    ("foreign_keys", "ON"),
+    ("cache_size", "-16000"),  # 16 MiB page cache
+    ("mmap_size", "268435456"),  # 256 MiB memory-mapped reads
+    ("busy_timeout", str(BUSY_TIMEOUT_MS)),
+)
+
+# Compiled statements kept per connection by the sqlite3 module
+STATEMENT_CACHE_SIZE = 256
+
+# Extra attempts for a write that still finds the database locked after busy_timeout
+WRITE_RETRIES = 3
+RETRY_BACKOFF = 0.05  # Seconds, doubled after every attempt
+
+
+class InteractiveConnection(sqlite3.Connection):
+    """Connection of the UI thread: a write waits briefly for a lock and is never retried
+
+    A busy database then fails fast with a lock error the screen can
+    report, instead of blocking the UI for busy_timeout on every attempt.
+    """
+    write_retries = 0
+
+
+def connect(path=DB_PATH, interactive=False):
+    """Open a connection with the standard MedAssist pragmas applied
+
+    interactive gives an InteractiveConnection with INTERACTIVE_BUSY_TIMEOUT_MS.
+    """
+    conn = sqlite3.connect(path, cached_statements=STATEMENT_CACHE_SIZE,
+                           factory=InteractiveConnection if interactive else sqlite3.Connection)
+    for name, value in CONNECTION_PRAGMAS:
+        conn.execute(f"PRAGMA {name} = {value}")
+    if interactive:
+        conn.execute(f"PRAGMA busy_timeout = {INTERACTIVE_BUSY_TIMEOUT_MS}")
+    return conn
+
+
+def is_lock_error(error):
+    """Whether an OperationalError means another connection holds a lock"""
+    message = str(error).lower()
+    return "locked" in message or "busy" in message
+
+
+def error_message(error):
+    """Text a screen shows for a failed database call"""
+    if isinstance(error, sqlite3.OperationalError) and is_lock_error(error):
+        return "Database is busy on another terminal, please try again"
+    return f"Database error: {error}"
+
+
+def _write_transaction(conn, work, retries):
+    """Run work(cursor) inside BEGIN IMMEDIATE, retrying the whole transaction on lock errors
+
+    retries None means the connection's own write_retries, or WRITE_RETRIES.
+    """
+    if retries is None:
+        retries = getattr(conn, "write_retries", WRITE_RETRIES)
+    for attempt in range(retries + 1):
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            cursor = conn.cursor()
+            work(cursor)
+            conn.commit()
+            return cursor
+        except sqlite3.OperationalError as e:
+            if conn.in_transaction:
+                conn.rollback()
+            if not is_lock_error(e) or attempt == retries:
+                raise
+            time.sleep(RETRY_BACKOFF * 2 ** attempt)
+        except BaseException:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+
+
+def run_transaction(conn, work, retries=None):
+    """Run work(cursor) as one write transaction, see run_writes
+
+    For reads and writes that must see the same state, such as existence
+    checks followed by the writes they allow. work may run more than once.
+    """
+    return _write_transaction(conn, work, retries)
+
+
+def run_writes(conn, statements, retries=None):
+    """Execute (sql, params) pairs in one write transaction, retrying on lock errors
+
+    BEGIN IMMEDIATE takes the write lock up front, where busy_timeout applies,
+    instead of upgrading a read lock halfway through, which fails at once in
+    WAL mode when another terminal committed in between. Returns the cursor
+    of the last statement. Must not be called with a transaction open.
+    """
+    def work(cursor):
+        for sql, params in statements:
+            cursor.execute(sql, params)
+    return _write_transaction(conn, work, retries)
+
+
+def run_write(conn, sql, params=(), retries=None):
+    """Execute a single write statement in its own transaction, see run_writes"""
+    return run_writes(conn, [(sql, params)], retries)
+
+
+def run_writes_many(conn, statements, retries=None):
+    """executemany() each (sql, rows) pair in one write transaction, see run_writes"""
+    # Generators would be used up by a failed attempt
+    statements = [(sql, list(rows)) for sql, rows in statements]
+
+    def work(cursor):
+        for sql, rows in statements:
+            cursor.executemany(sql, rows)
+    return _write_transaction(conn, work, retries)
+
+
+def run_write_many(conn, sql, rows, retries=None):
+    """executemany() one statement over rows in its own transaction, see run_writes"""
+    return run_writes_many(conn, [(sql, rows)], retries)
+
+
+def checkpoint(conn, mode="PASSIVE"):
+    """Copy WAL content back into the database file
+
+    PASSIVE never blocks other terminals; TRUNCATE waits for readers and
+    resets the WAL file, which suits shutdown. Returns (busy, wal_pages,
+    checkpointed_pages), or None when the database is not in WAL mode.
+    """
+    if conn.execute("PRAGMA journal_mode").fetchone()[0].lower() != "wal":
+        return None
+    return conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone()
+
+
+def estimated_rows(conn, table):
+    """Approximate row count of a rowid table without scanning it
+
+    Uses the row count ANALYZE stored in sqlite_stat1 when there is one,
+    otherwise MAX(rowid), which is a single b-tree seek and an upper bound
+    once rows have been deleted.
+    """
+    try:
+        row = conn.execute(
+            "SELECT stat FROM sqlite_stat1 WHERE tbl = ? ORDER BY idx IS NOT NULL LIMIT 1", (table,)
+        ).fetchone()
+    except sqlite3.OperationalError:
+        row = None  # ANALYZE has never run, so there is no sqlite_stat1
+    if row:
+        return int(row[0].split()[0])
+    return conn.execute(f"SELECT MAX(rowid) FROM {table}").fetchone()[0] or 0
+
+
+class ConnectionPool:
+    """Hands out one configured connection per thread, reused across calls
+
+    A connection belongs to the thread that opened it, and only that
+    thread closes it, with release().
+    """
+
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        self._local = threading.local()
+
+    def connection(self, interactive=False):
+        """The calling thread's connection, opened on first use; see connect for interactive"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = connect(self.path, interactive)
+            self._local.conn = conn
+        return conn
+
+    def cursor(self):
+        """A new cursor on the calling thread's connection"""
+        return self.connection().cursor()
+
+    def release(self):
+        """Close the calling thread's connection, e.g. when a worker thread exits"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            return
+        self._local.conn = None
+        conn.close()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(path=DB_PATH):
+    """Shared pool for a database file"""
+    with _pools_lock:
+        pool = _pools.get(path)
+        if pool is None:
+            pool = _pools[path] = ConnectionPool(path)
+        return pool
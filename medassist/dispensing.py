@@ -0,0 +1,123 @@
+"""First-expired-first-out dispensing from a user's inventory lots
+
+A dispense takes units from the lots of a medicine that expire soonest,
+skipping expired and empty ones. Lots are read in expiration order from
+idx_inventory_user_med_stock, which only holds lots with stock left, and
+the walk stops as soon as the quantity is covered, so a medicine with
+thousands of lots costs as many rows as the lots actually used. Each
+allocation is written as a dispense movement in the stock ledger, whose
+triggers lower the lot and stock_on_hand (see migration 7).
+
+A request for several medicines, such as every dose due at once, runs in
+one transaction with each medicine in its own savepoint: a medicine that
+is short is left untouched and reported, and the others are dispensed.
+"""
+import sqlite3
+from collections import namedtuple
+from datetime import date
+
+from medassist.db import run_transaction
+from medassist.repository import RECORD_MOVEMENT
+
+# Units taken per scheduled dose; schedules do not record a dose size
+DOSE_UNITS = 1
+
+# Usable lots of a medicine, soonest expiry first; ties go to the oldest lot
+FEFO_LOTS = """
+    SELECT inventory_id, quantity, expiration FROM inventory
+    WHERE user_id = ? AND med_id = ? AND quantity > 0 AND expiration >= ?
+    ORDER BY expiration, inventory_id
+"""
+USABLE_STOCK = """
+    SELECT IFNULL(SUM(quantity), 0) FROM inventory
+    WHERE user_id = ? AND med_id = ? AND quantity > 0 AND expiration >= ?
+"""
+# Units on hand over every lot, expired ones included, so never less than what can be dispensed
+ON_HAND = "SELECT on_hand FROM stock_on_hand WHERE user_id = ? AND med_id = ?"
+
+# Lots fetched per step of the walk
+FETCH_LOTS = 16
+
+Allocation = namedtuple("Allocation", ["med_id", "inventory_id", "quantity", "expiration"])
+Shortage = namedtuple("Shortage", ["med_id", "requested", "available"])
+DispenseResult = namedtuple("DispenseResult", ["allocations", "shortages"])
+
+
+def _allocate(cursor, user_id, med_id, quantity, today):
+    """(allocations, units still missing) for quantity units of one medicine"""
+    row = cursor.execute(ON_HAND, (user_id, med_id)).fetchone()
+    if row is None or row[0] < quantity:
+        # Short even counting expired lots; no need to walk them
+        return [], quantity - (row[0] if row else 0)
+    allocations = []
+    remaining = quantity
+    cursor.execute(FEFO_LOTS, (user_id, med_id, today))
+    while remaining > 0:
+        lots = cursor.fetchmany(FETCH_LOTS)
+        if not lots:
+            break
+        for inventory_id, available, expiration in lots:
+            taken = min(available, remaining)
+            allocations.append(Allocation(med_id, inventory_id, taken, expiration))
+            remaining -= taken
+            if not remaining:
+                break
+    return allocations, remaining
+
+
+def dispense_many(conn, user_id, requests, today=None):
+    """Dispense (med_id, quantity) pairs for user_id in one transaction, FEFO within each medicine
+
+    Requests for the same medicine are added together. Returns
+    DispenseResult: the allocations made and, for each medicine that could
+    not be covered in full, a shortage; nothing is taken of a short
+    medicine. Lots expired by today are never used.
+    """
+    if user_id is None:
+        raise ValueError("No user is logged in")
+    today = (today or date.today()).isoformat()
+    wanted = {}
+    for med_id, quantity in requests:
+        quantity = int(quantity)
+        if quantity <= 0:
+            raise ValueError("Quantity must be positive")
+        wanted[int(med_id)] = wanted.get(int(med_id), 0) + quantity
+    result = None
+
+    def work(cursor):
+        nonlocal result
+        allocations = []
+        shortages = []
+        for med_id, quantity in wanted.items():
+            taken, missing = _allocate(cursor, user_id, med_id, quantity, today)
+            if not missing:
+                # The ledger triggers lower each lot and stock_on_hand, and refuse to overdraw a lot
+                cursor.execute("SAVEPOINT medicine")
+                try:
+                    cursor.executemany(RECORD_MOVEMENT, [
+                        ("dispense", -allocation.quantity, allocation.inventory_id, user_id) for allocation in taken
+                    ])
+                except sqlite3.IntegrityError:
+                    cursor.execute("ROLLBACK TO medicine")
+                    missing = quantity
+                cursor.execute("RELEASE medicine")
+            if missing:
+                available = cursor.execute(USABLE_STOCK, (user_id, med_id, today)).fetchone()[0]
+                shortages.append(Shortage(med_id, quantity, available))
+            else:
+                allocations.extend(taken)
+        result = DispenseResult(allocations, shortages)
+
+    if wanted:
+        run_transaction(conn, work)
+    return result or DispenseResult([], [])
+
+
+def dispense(conn, user_id, med_id, quantity, today=None):
+    """Dispense quantity units of one medicine, see dispense_many"""
+    return dispense_many(conn, user_id, [(med_id, quantity)], today)
+
+
+def dispense_doses(conn, user_id, schedules, today=None):
+    """Dispense one dose for each schedule or reminder (anything with a med_id), see dispense_many"""
+    return dispense_many(conn, user_id, [(schedule.med_id, DOSE_UNITS) for schedule in schedules], today)
@@ -0,0 +1,188 @@
+"""Streaming export of the medicine catalog, schedules and inventory
+
+Rows are read from the cursor with fetchmany() and written as they
+arrive, so memory stays bounded by EXPORT_BATCH_SIZE whatever the table
+size. Output goes to a temporary file that replaces the target only once
+the export is complete.
+
+    python -m medassist.export medicines medicines.csv --search amox
+    python -m medassist.export inventory inventory.jsonl --user amy
+
+Schedules and inventory belong to one user, so those exports need one.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import namedtuple
+
+from medassist.db import DB_PATH, connect
+from medassist.search import count_medicines, select_matching
+
+# Rows fetched from SQLite per fetchmany() call
+EXPORT_BATCH_SIZE = 1000
+
+FORMATS = ("csv", "jsonl")
+
+ExportStats = namedtuple("ExportStats", ["rows", "seconds"])
+
+_SCHEDULE_EXPORT_SQL = """
+    SELECT s.schedule_id, s.med_id, m.med_name, s.consumption_start, s.consumption_end, s.frequency
+    FROM schedule s
+    JOIN med_info m ON s.med_id = m.med_id
+    WHERE s.user_id = ?
+    ORDER BY s.consumption_start, s.schedule_id
+"""
+
+_INVENTORY_EXPORT_SQL = """
+    SELECT i.inventory_id, i.med_id, m.med_name, i.quantity, i.expiration
+    FROM inventory i
+    JOIN med_info m ON i.med_id = m.med_id
+    WHERE i.user_id = ?
+    ORDER BY i.expiration, i.inventory_id
+"""
+
+FIND_USER_ID = "SELECT user_id FROM user WHERE username = ?"
+
+
+def _select_medicines(cursor, text, user_id):
+    # The catalog is shared by every user
+    return select_matching(cursor, text)
+
+
+def _count_medicines(cursor, text, user_id):
+    return count_medicines(cursor, text)[0]
+
+
+def _select_table(sql):
+    def select(cursor, text, user_id):
+        if text:
+            raise ValueError("Search filters only apply to the medicines export")
+        if user_id is None:
+            raise ValueError("Schedules and inventory can only be exported for one user")
+        return cursor.execute(sql, (user_id,))
+    return select
+
+
+def _count_table(table):
+    return lambda cursor, text, user_id: cursor.execute(
+        f"SELECT COUNT(*) FROM {table} WHERE user_id = ?", (user_id,)
+    ).fetchone()[0]
+
+
+# dataset name -> (run the query on a cursor, count the rows it will return)
+DATASETS = {
+    "medicines": (_select_medicines, _count_medicines),
+    "schedules": (_select_table(_SCHEDULE_EXPORT_SQL), _count_table("schedule")),
+    "inventory": (_select_table(_INVENTORY_EXPORT_SQL), _count_table("inventory")),
+}
+
+
+def format_for_path(path):
+    """Export format implied by a file name, defaulting to CSV"""
+    return "jsonl" if path.lower().endswith((".jsonl", ".ndjson", ".json")) else "csv"
+
+
+class _CsvWriter:
+    def __init__(self, f, columns):
+        self._writer = csv.writer(f)
+        self._writer.writerow(columns)
+
+    def write(self, rows):
+        self._writer.writerows(rows)
+
+
+class _JsonLinesWriter:
+    def __init__(self, f, columns):
+        self._f = f
+        self._columns = columns
+
+    def write(self, rows):
+        self._f.writelines(
+            json.dumps(dict(zip(self._columns, row)), ensure_ascii=False) + "\n" for row in rows
+        )
+
+
+_WRITERS = {"csv": _CsvWriter, "jsonl": _JsonLinesWriter}
+
+
+def export_dataset(conn, dataset, path, fmt=None, text="", progress=None, batch_size=EXPORT_BATCH_SIZE,
+                   user_id=None):
+    """Stream a dataset to path as CSV or JSON Lines
+
+    text filters the medicines export like the MedicineScreen search;
+    schedules and inventory are limited to user_id's rows.
+    progress(rows_written, total_rows) is called after every batch; it runs
+    on the exporting thread. Returns ExportStats.
+    """
+    if dataset not in DATASETS:
+        raise ValueError(f"Unknown dataset {dataset!r}; choose from {', '.join(DATASETS)}")
+    fmt = fmt or format_for_path(path)
+    if fmt not in _WRITERS:
+        raise ValueError(f"Unknown export format {fmt!r}; choose from {', '.join(FORMATS)}")
+
+    start = time.perf_counter()
+    select, count = DATASETS[dataset]
+    cursor = conn.cursor()
+    total = count(cursor, text, user_id) if progress else None
+    select(cursor, text, user_id)
+    columns = [description[0] for description in cursor.description]
+
+    temp_path = f"{path}.part"
+    written = 0
+    try:
+        with open(temp_path, "w", newline="", encoding="utf-8") as f:
+            writer = _WRITERS[fmt](f, columns)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                writer.write(rows)
+                written += len(rows)
+                if progress:
+                    progress(written, total)
+        os.replace(temp_path, path)
+    except BaseException:
+        cursor.close()
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    stats = ExportStats(written, time.perf_counter() - start)
+    print(f"Exported {stats.rows} row(s) of {dataset} to {path} in {stats.seconds:.3f}s")
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export MedAssist data as CSV or JSON Lines")
+    parser.add_argument("dataset", choices=sorted(DATASETS))
+    parser.add_argument("path", help="output file; .jsonl writes JSON Lines, anything else CSV")
+    parser.add_argument("--format", choices=FORMATS, help="override the format implied by the file name")
+    parser.add_argument("--search", default="", help="medicines only: same filter as the search box")
+    parser.add_argument("--user", help="username whose schedules or inventory to export")
+    parser.add_argument("--db", default=DB_PATH)
+    args = parser.parse_args(argv)
+
+    if args.search and args.dataset != "medicines":
+        parser.error("--search only applies to the medicines export")
+    if args.dataset != "medicines" and not args.user:
+        parser.error(f"--user is required for the {args.dataset} export")
+
+    conn = connect(args.db)
+    try:
+        user_id = None
+        if args.user:
+            row = conn.execute(FIND_USER_ID, (args.user,)).fetchone()
+            if row is None:
+                parser.error(f"No user named {args.user!r}")
+            user_id = row[0]
+        export_dataset(conn, args.dataset, args.path, args.format, args.search, user_id=user_id)
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
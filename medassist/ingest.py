@@ -0,0 +1,164 @@
+"""Parallel ingestion of many medicine CSV files
+
+    python -m medassist.ingest medicine.csv extra_catalogs/ --workers 4
+
+Worker processes parse-check, normalize and digest chunks of rows (see
+validate_chunk) while the parent reads ahead, keeping a bounded number of
+chunks in flight. Validated chunks come back in file order to a single
+writer connection, which applies each file with the same delta sync as
+init_db, so SQLite only ever sees one writer. Refused rows are written to
+a reject file with the reason instead of being printed.
+"""
+import argparse
+import os
+import sys
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from itertools import groupby
+
+from medassist.csv_import import (
+    REJECTS_PATH, RejectFile, apply_keyed_rows, iter_chunks, iter_numbered_csv_rows, key_rows, pending_sync,
+    report_sync, validate_chunk
+)
+from medassist.db import DB_PATH, connect
+from medassist.migrations import migrate
+from medassist.schema import create_tables
+from medassist.search import catalog_changed, ensure_fts_index
+
+# Rows sent to a worker per task; large enough to amortize pickling
+INGEST_CHUNK_SIZE = 2000
+
+# Chunks queued per worker, bounding memory while keeping every worker busy
+CHUNKS_PER_WORKER = 2
+
+IngestStats = namedtuple("IngestStats", ["files", "rows", "rejected", "seconds"])
+
+
+def expand_paths(paths):
+    """CSV files named by paths, with directories expanded to the .csv files directly inside them"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(
+                os.path.join(path, name) for name in os.listdir(path) if name.lower().endswith(".csv")
+            ))
+        else:
+            files.append(path)
+    return list(dict.fromkeys(files))  # Drop repeats, keeping order
+
+
+def _file_chunks(paths, chunk_size):
+    """Yield (path, chunk of (line, row)); every file yields at least one, possibly empty, chunk"""
+    for path in paths:
+        empty = True
+        for chunk in iter_chunks(iter_numbered_csv_rows(path), chunk_size):
+            empty = False
+            yield path, chunk
+        if empty:
+            yield path, []
+
+
+def _validated_chunks(executor, chunks, in_flight):
+    """Yield (path, (valid, rejects)) in input order, with at most in_flight chunks submitted
+
+    Without an executor the chunks are validated in this process.
+    """
+    if executor is None:
+        for path, chunk in chunks:
+            yield path, validate_chunk(chunk)
+        return
+    pending = deque()
+    for path, chunk in chunks:
+        pending.append((path, executor.submit(validate_chunk, chunk)))
+        if len(pending) >= in_flight:
+            path, future = pending.popleft()
+            yield path, future.result()
+    while pending:
+        path, future = pending.popleft()
+        yield path, future.result()
+
+
+def ingest_files(conn, paths, workers=None, rejects=None, force=False, chunk_size=INGEST_CHUNK_SIZE):
+    """Sync every CSV in paths (files or directories) into med_info
+
+    workers defaults to the CPU count; 1 validates in this process.
+    Refused rows go to rejects (a RejectFile) when given. Files unchanged
+    since their last sync are skipped. Returns IngestStats.
+    """
+    start = time.perf_counter()
+    pending = {}
+    for path in expand_paths(paths):
+        status = pending_sync(conn, path, force)
+        if status is None:
+            print(f"{path} unchanged since last import, skipping...")
+        else:
+            pending[path] = status
+
+    workers = workers or os.cpu_count() or 1
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 and pending else None
+    rows = 0
+    total_rejected = 0
+    try:
+        results = _validated_chunks(executor, _file_chunks(pending, chunk_size), workers * CHUNKS_PER_WORKER)
+        for path, group in groupby(results, key=lambda result: result[0]):
+            file_start = time.perf_counter()
+            rejected = 0
+
+            def valid_rows():
+                nonlocal rejected
+                for _, (valid, refused) in group:
+                    rejected += len(refused)
+                    if rejects is not None:
+                        rejects.write(path, refused)
+                    yield from valid
+
+            counts = apply_keyed_rows(conn, path, key_rows(valid_rows()), *pending[path])
+            stats = report_sync(path, counts, rejected, file_start)
+            rows += stats.inserted + stats.updated + stats.unchanged
+            total_rejected += rejected
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    if pending:
+        catalog_changed()
+    stats = IngestStats(len(pending), rows, total_rejected, time.perf_counter() - start)
+    print(f"Ingested {stats.rows} medicine row(s) from {stats.files} file(s) "
+          f"with {workers} worker(s) in {stats.seconds:.3f}s")
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Validate and sync medicine CSV files in parallel")
+    parser.add_argument("paths", nargs="+", help="CSV files, or directories of CSV files")
+    parser.add_argument("--workers", type=int, default=None, help="validation processes (default: CPU count)")
+    parser.add_argument("--rejects", default=REJECTS_PATH, help="CSV file for refused rows")
+    parser.add_argument("--force", action="store_true", help="sync files even if unchanged")
+    parser.add_argument("--db", default=DB_PATH)
+    args = parser.parse_args(argv)
+
+    if args.workers is not None and args.workers < 1:
+        parser.error("--workers must be at least 1")
+    missing = [path for path in args.paths if not os.path.exists(path)]
+    if missing:
+        parser.error(f"not found: {', '.join(missing)}")
+
+    conn = connect(args.db)
+    try:
+        # The tables, strength columns and search index may not exist yet
+        create_tables(conn.cursor())
+        conn.commit()
+        migrate(conn)
+        ensure_fts_index(conn)
+        with RejectFile(args.rejects) as rejects:
+            ingest_files(conn, args.paths, args.workers, rejects, args.force)
+        if rejects.rows:
+            print(f"Wrote {rejects.rows} rejected row(s) to {rejects.path}")
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
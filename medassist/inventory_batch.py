@@ -0,0 +1,180 @@
+"""Receiving and adjusting many inventory lots at once
+
+A batch is CSV text, typed or pasted, with one lot per line:
+
+    med_id, quantity, expiration                  receive a new lot
+    inventory_id, med_id, quantity, expiration    adjust an existing lot
+
+An adjust line may leave med_id, quantity or expiration empty to keep the
+current value. A header row naming these columns may be given instead,
+in any order. Every line is checked first, then medicines and lots are
+looked up with one query each, and the writes happen in the same
+transaction as those lookups. A batch with any bad line writes nothing.
+"""
+import csv
+import json
+from collections import namedtuple
+from datetime import date
+
+from medassist.db import run_transaction
+from medassist.repository import ADJUST_QUANTITY, INSERT_INVENTORY
+from medassist.validation import RowError, normalize_date
+
+BATCH_COLUMNS = ("inventory_id", "med_id", "quantity", "expiration")
+RECEIVE_COLUMNS = BATCH_COLUMNS[1:]
+
+# Empty parameters keep the lot's current value; quantities change through ADJUST_QUANTITY
+ADJUST_INVENTORY = """
+    UPDATE inventory SET
+        med_id = COALESCE(?, med_id),
+        expiration = COALESCE(?, expiration)
+    WHERE inventory_id = ? AND user_id = ?
+"""
+# Set-based existence checks. The ids travel as one JSON array, so there is no limit on
+# batch size, and each is a primary key lookup; CROSS JOIN keeps SQLite from walking
+# all of the user's lots instead.
+EXISTING_MEDICINES = """
+    SELECT m.med_id FROM json_each(?) j
+    CROSS JOIN med_info m ON m.med_id = j.value
+"""
+EXISTING_LOTS = """
+    SELECT i.inventory_id FROM json_each(?) j
+    CROSS JOIN inventory i ON i.inventory_id = j.value
+    WHERE i.user_id = ?
+"""
+
+# line: 1-based line of the batch text; inventory_id is None for a new lot
+BatchRow = namedtuple("BatchRow", ["line", "inventory_id", "med_id", "quantity", "expiration"])
+BatchResult = namedtuple("BatchResult", ["received", "adjusted", "errors"])
+
+
+def _whole_number(value, label, allow_blank=False):
+    if not value:
+        if allow_blank:
+            return None
+        raise RowError(f"{label} is required")
+    if not value.isdigit():
+        raise RowError(f"{label} must be a whole number, not {value!r}")
+    return int(value)
+
+
+def _parse_row(line, cells, columns, today):
+    """BatchRow for one line of cells under columns; raises RowError"""
+    values = dict(zip(columns, (cell.strip() for cell in cells)))
+    inventory_id = _whole_number(values.get("inventory_id"), "Inventory ID", allow_blank=True)
+    adjusting = inventory_id is not None
+    med_id = _whole_number(values.get("med_id"), "Medicine ID", allow_blank=adjusting)
+    quantity = _whole_number(values.get("quantity"), "Quantity", allow_blank=adjusting)
+    expiration = values.get("expiration")
+    if expiration:
+        expiration = normalize_date(expiration)
+        if expiration < today:
+            raise RowError("Expiration date cannot be in the past")
+    elif not adjusting:
+        raise RowError("Expiration date is required")
+    else:
+        expiration = None
+    if adjusting and med_id is None and quantity is None and expiration is None:
+        raise RowError("Nothing to change")
+    return BatchRow(line, inventory_id, med_id, quantity, expiration)
+
+
+def parse_batch(text, today=None):
+    """(rows, errors) for batch text; errors are (line, message) pairs"""
+    today = (today or date.today()).isoformat()
+    rows = []
+    errors = []
+    columns = None
+    seen_lots = set()
+    reader = csv.reader(text.splitlines())
+    for cells in reader:
+        line = reader.line_num
+        if not any(cell.strip() for cell in cells):
+            continue
+        names = [cell.strip().lower().replace(" ", "_") for cell in cells]
+        if columns is None and not rows and not errors and set(names) <= set(BATCH_COLUMNS):
+            columns = names  # Header row
+            continue
+        if columns is not None:
+            row_columns = columns
+        elif len(cells) == len(RECEIVE_COLUMNS):
+            row_columns = RECEIVE_COLUMNS
+        elif len(cells) == len(BATCH_COLUMNS):
+            row_columns = BATCH_COLUMNS
+        else:
+            errors.append((line, f"Expected {len(RECEIVE_COLUMNS)} or {len(BATCH_COLUMNS)} values, got {len(cells)}"))
+            continue
+        if len(cells) != len(row_columns):
+            errors.append((line, f"Expected {len(row_columns)} values, got {len(cells)}"))
+            continue
+        try:
+            row = _parse_row(line, cells, row_columns, today)
+        except RowError as e:
+            errors.append((line, str(e)))
+            continue
+        if row.inventory_id is not None:
+            if row.inventory_id in seen_lots:
+                errors.append((line, f"Inventory ID {row.inventory_id} appears more than once"))
+                continue
+            seen_lots.add(row.inventory_id)
+        rows.append(row)
+    return rows, errors
+
+
+def _missing(cursor, rows, user_id):
+    """(line, message) for rows naming a medicine or lot that does not exist, one query per kind"""
+    med_ids = sorted({row.med_id for row in rows if row.med_id is not None})
+    lot_ids = [row.inventory_id for row in rows if row.inventory_id is not None]
+    cursor.execute(EXISTING_MEDICINES, (json.dumps(med_ids),))
+    known_meds = {med_id for (med_id,) in cursor.fetchall()}
+    cursor.execute(EXISTING_LOTS, (json.dumps(lot_ids), user_id))
+    known_lots = {inventory_id for (inventory_id,) in cursor.fetchall()}
+
+    errors = []
+    for row in rows:
+        if row.inventory_id is not None and row.inventory_id not in known_lots:
+            errors.append((row.line, f"No inventory found with ID {row.inventory_id}"))
+        elif row.med_id is not None and row.med_id not in known_meds:
+            errors.append((row.line, f"Medicine with ID {row.med_id} does not exist"))
+    return errors
+
+
+def apply_batch(conn, user_id, text, today=None):
+    """Receive and adjust every lot in batch text for user_id, in one transaction
+
+    Returns BatchResult; when errors is not empty nothing was written.
+    Lines that parse are still checked against the database, so one pass
+    reports every problem.
+    """
+    if user_id is None:
+        raise ValueError("No user is logged in")
+    rows, errors = parse_batch(text, today)
+    if errors:
+        return BatchResult(0, 0, sorted(errors + _missing(conn.cursor(), rows, user_id)))
+    if not rows:
+        return BatchResult(0, 0, [])
+    receive = [row for row in rows if row.inventory_id is None]
+    adjust = [row for row in rows if row.inventory_id is not None]
+    result = None
+
+    def work(cursor):
+        nonlocal result
+        # Checked inside the write transaction, so no other terminal can delete them before the writes
+        missing = _missing(cursor, rows, user_id)
+        if missing:
+            result = BatchResult(0, 0, missing)
+            return  # Commits an empty transaction
+        cursor.executemany(INSERT_INVENTORY, [
+            (row.med_id, row.quantity, row.expiration, user_id) for row in receive
+        ])
+        # Each quantity change is an adjustment in the stock ledger; a blank quantity records nothing
+        cursor.executemany(ADJUST_QUANTITY, [
+            (row.quantity, row.inventory_id, user_id) for row in adjust
+        ])
+        cursor.executemany(ADJUST_INVENTORY, [
+            (row.med_id, row.expiration, row.inventory_id, user_id) for row in adjust
+        ])
+        result = BatchResult(len(receive), len(adjust), [])
+
+    run_transaction(conn, work)
+    return result
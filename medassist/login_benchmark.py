@@ -0,0 +1,125 @@
+"""Password hashing cost calibration for the login screen
+
+Times one password hash at increasing work factors on this machine and
+recommends the strongest one that keeps a login under the target latency:
+
+    python -m medassist.login_benchmark --target-ms 250
+    python -m medassist.login_benchmark --scheme pbkdf2_sha256 --out login.json
+
+Run it on the kiosk hardware, then set the MEDASSIST_SCRYPT_N or
+MEDASSIST_PBKDF2_ITERATIONS it prints. Existing hashes move to the new
+cost at each user's next login.
+"""
+import argparse
+import json
+import sys
+
+from medassist.benchmark import environment, summarize, time_call
+from medassist.users import (
+    PASSWORD_SCHEME, SALT_BYTES, SCHEMES, SCRYPT_P, SCRYPT_R, VerificationCache, derive_key, scheme_parameters
+)
+
+DEFAULT_TARGET_MS = 250
+DEFAULT_RUNS = 3
+
+# scrypt cost must be a power of two; 2**18 already needs 256 MiB per login
+SCRYPT_MIN_N = 2 ** 12
+SCRYPT_MAX_N = 2 ** 18
+
+# PBKDF2 time grows linearly, so one probe predicts the rest
+PBKDF2_PROBE_ITERATIONS = 100000
+PBKDF2_STEP = 10000
+
+ENV_VARS = {"scrypt": "MEDASSIST_SCRYPT_N", "pbkdf2_sha256": "MEDASSIST_PBKDF2_ITERATIONS"}
+
+_PASSWORD = "correct horse battery staple"
+_SALT = bytes(SALT_BYTES)
+
+
+def measure(scheme, parameters, runs):
+    """Timing summary for one hash, with what it costs an attacker"""
+    timings, _ = time_call(lambda: derive_key(scheme, parameters, _PASSWORD, _SALT), runs)
+    result = {"parameters": list(parameters), **summarize(timings)}
+    # Guesses one core of this machine can try per second against a stolen hash
+    result["guesses_per_second"] = round(1000 / result["median_ms"], 1)
+    if scheme == "scrypt":
+        n, r, _ = parameters
+        result["memory_mib"] = 128 * r * n // (1024 * 1024)
+    return result
+
+
+def calibrate(scheme, target_ms, runs):
+    """(results for every work factor tried, the strongest under target_ms or None)"""
+    results = []
+    best = None
+    if scheme == "scrypt":
+        n = SCRYPT_MIN_N
+        while n <= SCRYPT_MAX_N:
+            result = measure(scheme, (n, SCRYPT_R, SCRYPT_P), runs)
+            results.append(result)
+            if result["median_ms"] > target_ms:
+                break
+            best = result
+            n *= 2
+        return results, best
+
+    probe = measure(scheme, (PBKDF2_PROBE_ITERATIONS,), runs)
+    results.append(probe)
+    iterations = int(PBKDF2_PROBE_ITERATIONS * target_ms / probe["median_ms"]) // PBKDF2_STEP * PBKDF2_STEP
+    while iterations >= PBKDF2_STEP:
+        result = measure(scheme, (iterations,), runs)
+        results.append(result)
+        if result["median_ms"] <= target_ms:
+            return results, result
+        iterations -= PBKDF2_STEP * max(1, iterations // (PBKDF2_STEP * 10))  # Back off about 10%
+    return results, best
+
+
+def bench_cache_hit(runs):
+    """A repeat login answered by VerificationCache instead of the hash"""
+    cache = VerificationCache()
+    cache.add("user", _PASSWORD, "stored")
+    timings, _ = time_call(lambda: cache.check("user", _PASSWORD, "stored"), max(runs, 100))
+    return summarize(timings)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Calibrate the password hashing cost for a target login time")
+    parser.add_argument("--target-ms", type=float, default=DEFAULT_TARGET_MS,
+                        help="longest acceptable hash time per login (default: %(default)s)")
+    parser.add_argument("--scheme", choices=SCHEMES, default=PASSWORD_SCHEME)
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS, help="hashes timed per work factor")
+    parser.add_argument("--out", help="write JSON here instead of stdout")
+    args = parser.parse_args(argv)
+
+    print(f"Calibrating {args.scheme} for {args.target_ms:g} ms...", file=sys.stderr)
+    results, best = calibrate(args.scheme, args.target_ms, args.runs)
+    current = scheme_parameters(args.scheme)
+    report = {
+        "environment": environment(),
+        "scheme": args.scheme,
+        "target_ms": args.target_ms,
+        "results": results,
+        "current": measure(args.scheme, current, args.runs),
+        "recommended": best,
+        "cache_hit": bench_cache_hit(args.runs),
+    }
+
+    if best is None:
+        print(f"No {args.scheme} work factor is fast enough for {args.target_ms:g} ms on this machine",
+              file=sys.stderr)
+    else:
+        print(f"Recommended: {ENV_VARS[args.scheme]}={best['parameters'][0]} "
+              f"({best['median_ms']:.0f} ms per login; currently {current[0]})", file=sys.stderr)
+
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,321 @@
+"""Versioned schema migrations tracked with PRAGMA user_version"""
+from medassist.users import LEGACY_SCHEME
+from medassist.validation import RowError, normalize_date, parse_strength
+
+
+def _add_column(table, definition):
+    """Step adding a column, unless the table was created by init_db with it already"""
+    name = definition.split()[0]
+
+    def add(cursor):
+        cursor.execute(f"PRAGMA table_info({table})")
+        if name not in [column[1] for column in cursor.fetchall()]:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {definition}")
+    return add
+
+
+def _backfill_strength(cursor):
+    """Split the strength of existing medicines into value and unit
+
+    The strength text itself is left as stored: a catalog loaded before
+    med_info_source existed is matched to its CSV by that text (see
+    csv_import._adoptable_rows), so rewriting it would duplicate medicines.
+    """
+    cursor.execute("SELECT med_id, strength FROM med_info WHERE strength IS NOT NULL")
+    updates = []
+    for med_id, strength in cursor.fetchall():
+        try:
+            _, value, unit = parse_strength(strength)
+        except RowError:
+            continue  # Left with no value or unit
+        updates.append((value, unit, med_id))
+    cursor.executemany("UPDATE med_info SET strength_value = ?, strength_unit = ? WHERE med_id = ?", updates)
+
+
+# (table, key column, date column) for every date stored as text
+DATE_COLUMNS = (
+    ("schedule", "schedule_id", "consumption_start"),
+    ("schedule", "schedule_id", "consumption_end"),
+    ("inventory", "inventory_id", "expiration"),
+)
+
+
+def _normalize_dates(cursor):
+    """Rewrite dates such as '2025-1-5' as zero-padded ISO text so they compare as strings"""
+    for table, key, column in DATE_COLUMNS:
+        cursor.execute(f"""
+            SELECT {key}, {column} FROM {table}
+            WHERE {column} NOT GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]'
+        """)
+        updates = []
+        for row_id, value in cursor.fetchall():
+            try:
+                updates.append((normalize_date(value), row_id))
+            except RowError:
+                continue  # Not a date at all; left for the user to fix
+        cursor.executemany(f"UPDATE {table} SET {column} = ? WHERE {key} = ?", updates)
+
+
+def _add_user_id(cursor):
+    """Rebuild the user table with an integer user_id key, keeping accounts in registration order"""
+    cursor.execute("PRAGMA table_info(user)")
+    if "user_id" in [column[1] for column in cursor.fetchall()]:
+        return
+    cursor.execute("""
+        CREATE TABLE user_new (
+            user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT NOT NULL UNIQUE,
+            password TEXT NOT NULL
+        )""")
+    cursor.execute("INSERT INTO user_new (username, password) SELECT username, password FROM user ORDER BY rowid")
+    cursor.execute("DROP TABLE user")
+    cursor.execute("ALTER TABLE user_new RENAME TO user")
+
+
+# Earliest expiration among a user's lots of a medicine that still hold stock; a single
+# seek on idx_inventory_user_med_stock
+_EARLIEST_EXPIRY = """
+    SELECT MIN(expiration) FROM inventory
+    WHERE user_id = {user_id} AND med_id = {med_id} AND quantity > 0
+"""
+# The same as a standalone query, parameters (user_id, med_id), for medassist.query_plans
+EARLIEST_EXPIRY = _EARLIEST_EXPIRY.format(user_id="?", med_id="?")
+
+
+def _earliest_expiry(row):
+    """_EARLIEST_EXPIRY as a subquery on a lot; row is NEW or OLD inside a trigger"""
+    return "(" + _EARLIEST_EXPIRY.format(user_id=f"{row}.user_id", med_id=f"{row}.med_id") + ")"
+
+
+def _stock_add(row):
+    """Trigger body adding a lot's stock to its stock_on_hand row"""
+    return f"""
+        INSERT INTO stock_on_hand (user_id, med_id, lots, on_hand, earliest_expiry)
+        VALUES ({row}.user_id, {row}.med_id, 1, IFNULL({row}.quantity, 0), {_earliest_expiry(row)})
+        ON CONFLICT (user_id, med_id) DO UPDATE SET
+            lots = lots + 1,
+            on_hand = on_hand + excluded.on_hand,
+            earliest_expiry = excluded.earliest_expiry;"""
+
+
+def _stock_remove(row):
+    """Trigger body taking a lot's stock out of its stock_on_hand row"""
+    return f"""
+        UPDATE stock_on_hand SET
+            lots = lots - 1,
+            on_hand = on_hand - IFNULL({row}.quantity, 0),
+            earliest_expiry = {_earliest_expiry(row)}
+        WHERE user_id = {row}.user_id AND med_id = {row}.med_id;
+        DELETE FROM stock_on_hand WHERE user_id = {row}.user_id AND med_id = {row}.med_id AND lots = 0;"""
+
+
+# Columns whose change moves a lot's stock in stock_on_hand
+_STOCK_COLUMNS = "med_id, quantity, expiration, user_id"
+
+# (name, CREATE statement) for the triggers that read a lot's quantity. Lots from
+# before the ledger may have a NULL quantity, which counts as 0.
+_STOCK_TRIGGERS = (
+    # Other movements change the lot; a receipt was made by inserting it
+    ("stock_movement_check", """CREATE TRIGGER IF NOT EXISTS stock_movement_check BEFORE INSERT ON stock_movement
+        WHEN NEW.kind != 'receive' BEGIN
+            SELECT RAISE(ABORT, 'Not enough stock in the lot')
+            WHERE (SELECT IFNULL(quantity, 0) FROM inventory WHERE inventory_id = NEW.inventory_id) + NEW.quantity < 0;
+        END"""),
+    ("stock_movement_apply", """CREATE TRIGGER IF NOT EXISTS stock_movement_apply AFTER INSERT ON stock_movement
+        WHEN NEW.kind != 'receive' BEGIN
+            UPDATE inventory SET quantity = IFNULL(quantity, 0) + NEW.quantity WHERE inventory_id = NEW.inventory_id;
+        END"""),
+    # stock_on_hand follows every lot change, however it was made, including cascades
+    ("inventory_stock_insert", f"""CREATE TRIGGER IF NOT EXISTS inventory_stock_insert AFTER INSERT ON inventory
+        WHEN NEW.user_id IS NOT NULL AND NEW.med_id IS NOT NULL BEGIN {_stock_add("NEW")}
+        END"""),
+    ("inventory_stock_delete", f"""CREATE TRIGGER IF NOT EXISTS inventory_stock_delete AFTER DELETE ON inventory
+        WHEN OLD.user_id IS NOT NULL AND OLD.med_id IS NOT NULL BEGIN {_stock_remove("OLD")}
+        END"""),
+    # An update takes the old row out and puts the new one in; the two triggers run in
+    # either order, since both read the lot's final state for the earliest expiry
+    ("inventory_stock_update_old", f"""CREATE TRIGGER IF NOT EXISTS inventory_stock_update_old
+        AFTER UPDATE OF {_STOCK_COLUMNS} ON inventory
+        WHEN OLD.user_id IS NOT NULL AND OLD.med_id IS NOT NULL BEGIN {_stock_remove("OLD")}
+        END"""),
+    ("inventory_stock_update_new", f"""CREATE TRIGGER IF NOT EXISTS inventory_stock_update_new
+        AFTER UPDATE OF {_STOCK_COLUMNS} ON inventory
+        WHEN NEW.user_id IS NOT NULL AND NEW.med_id IS NOT NULL BEGIN {_stock_add("NEW")}
+        END"""),
+)
+
+
+# (version, description, steps), applied in order to databases below that version.
+# A step is an SQL statement or a function taking the cursor.
+# init_db creates the tables of medassist.schema in their current shape, so a fresh
+# database skips the column changes below; tables added later are created here.
+MIGRATIONS = [
+    (1, "Indexes for medicine, schedule and inventory lookups", (
+        # Duplicate-name checks and the name-ordered medicine list
+        "CREATE INDEX IF NOT EXISTS idx_med_info_name ON med_info (med_name, med_id)",
+        # Per-medicine schedule counts and deletes, cascades from med_info
+        "CREATE INDEX IF NOT EXISTS idx_schedule_med ON schedule (med_id, consumption_start)",
+        # Schedule list ordered by start date
+        "CREATE INDEX IF NOT EXISTS idx_schedule_start ON schedule (consumption_start)",
+        # Per-medicine inventory counts and deletes, cascades from med_info
+        "CREATE INDEX IF NOT EXISTS idx_inventory_med ON inventory (med_id, expiration)",
+        # Inventory list ordered by expiration
+        "CREATE INDEX IF NOT EXISTS idx_inventory_expiration ON inventory (expiration)",
+        # Cascade from med_info to the CSV source mapping
+        "CREATE INDEX IF NOT EXISTS idx_med_info_source_med ON med_info_source (med_id)",
+    )),
+    (2, "Numeric strength value and unit for medicines", (
+        _add_column("med_info", "strength_value REAL"),
+        _add_column("med_info", "strength_unit TEXT"),
+        _backfill_strength,
+    )),
+    (3, "Canonical dates and indexes for inventory alerts", (
+        _normalize_dates,
+        # Expired and expiring lots: a range on expiration, with quantity read from the index
+        "CREATE INDEX IF NOT EXISTS idx_inventory_expiry ON inventory (expiration, quantity)",
+        # Superseded by idx_inventory_expiry, which also serves the list ordered by expiration
+        "DROP INDEX IF EXISTS idx_inventory_expiration",
+        # Low-stock lots: a range on quantity
+        "CREATE INDEX IF NOT EXISTS idx_inventory_quantity ON inventory (quantity, expiration)",
+    )),
+    (4, "Index for loading active schedules into the reminder queue", (
+        "CREATE INDEX IF NOT EXISTS idx_schedule_end ON schedule (consumption_end)",
+    )),
+    (5, "Owner columns and per-user indexes for schedules and inventory", (
+        _add_user_id,
+        _add_column("schedule", "user_id INTEGER REFERENCES user(user_id) ON DELETE CASCADE"),
+        _add_column("inventory", "user_id INTEGER REFERENCES user(user_id) ON DELETE CASCADE"),
+        # Rows from before accounts owned data go to the first account; with none yet,
+        # the first account registered claims them (see medassist.users)
+        "UPDATE schedule SET user_id = (SELECT MIN(user_id) FROM user) WHERE user_id IS NULL",
+        "UPDATE inventory SET user_id = (SELECT MIN(user_id) FROM user) WHERE user_id IS NULL",
+        # Every schedule and inventory query is scoped to one user, so user_id leads each index
+        "CREATE INDEX IF NOT EXISTS idx_schedule_user_start ON schedule (user_id, consumption_start)",
+        "CREATE INDEX IF NOT EXISTS idx_schedule_user_end ON schedule (user_id, consumption_end)",
+        "CREATE INDEX IF NOT EXISTS idx_inventory_user_expiry ON inventory (user_id, expiration, quantity)",
+        "CREATE INDEX IF NOT EXISTS idx_inventory_user_quantity ON inventory (user_id, quantity, expiration)",
+        "DROP INDEX IF EXISTS idx_schedule_start",
+        "DROP INDEX IF EXISTS idx_schedule_end",
+        "DROP INDEX IF EXISTS idx_inventory_expiry",
+        "DROP INDEX IF EXISTS idx_inventory_quantity",
+    )),
+    (6, "Hashed passwords and login sessions", (
+        # Marks passwords stored as plain text; medassist.users rehashes them at the next login
+        f"""UPDATE user SET password = '{LEGACY_SCHEME}$' || password
+            WHERE password NOT LIKE 'scrypt$%' AND password NOT LIKE 'pbkdf2_sha256$%'""",
+        """CREATE TABLE IF NOT EXISTS session (
+            token_hash TEXT PRIMARY KEY,
+            user_id INTEGER NOT NULL REFERENCES user(user_id) ON DELETE CASCADE,
+            expires_at REAL NOT NULL
+        ) WITHOUT ROWID""",
+        # Purging expired sessions, and the cascade from user
+        "CREATE INDEX IF NOT EXISTS idx_session_expires ON session (expires_at)",
+        "CREATE INDEX IF NOT EXISTS idx_session_user ON session (user_id)",
+    )),
+    (7, "Stock movement ledger and per-medicine stock on hand", (
+        # Append-only history of every change to a lot's quantity. No foreign keys:
+        # it outlives the lots, medicines and users it mentions.
+        """CREATE TABLE IF NOT EXISTS stock_movement (
+            movement_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            inventory_id INTEGER NOT NULL,
+            med_id INTEGER,
+            user_id INTEGER,
+            kind TEXT NOT NULL CHECK (kind IN ('receive', 'dispense', 'discard', 'adjust')),
+            quantity INTEGER NOT NULL CHECK (kind = 'adjust' OR (kind = 'receive') = (quantity > 0)),
+            moved_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )""",
+        # One row per user and medicine with any lots, kept by the triggers below
+        """CREATE TABLE IF NOT EXISTS stock_on_hand (
+            user_id INTEGER NOT NULL,
+            med_id INTEGER NOT NULL,
+            lots INTEGER NOT NULL,
+            on_hand INTEGER NOT NULL,
+            earliest_expiry TEXT,
+            PRIMARY KEY (user_id, med_id)
+        ) WITHOUT ROWID""",
+        # Lot history
+        "CREATE INDEX IF NOT EXISTS idx_stock_movement_lot ON stock_movement (inventory_id)",
+        # Low-stock medicines: a range on on_hand
+        "CREATE INDEX IF NOT EXISTS idx_stock_on_hand_level ON stock_on_hand (user_id, on_hand)",
+        # A medicine's lots with stock left, soonest expiry first
+        """CREATE INDEX IF NOT EXISTS idx_inventory_user_med_stock
+            ON inventory (user_id, med_id, expiration) WHERE quantity > 0""",
+        # Low stock is now judged per medicine from stock_on_hand, not per lot
+        "DROP INDEX IF EXISTS idx_inventory_user_quantity",
+        # Opening balances: existing lots count as received, and the only full aggregate ever run
+        """INSERT INTO stock_movement (inventory_id, med_id, user_id, kind, quantity)
+            SELECT inventory_id, med_id, user_id, 'receive', quantity FROM inventory
+            WHERE quantity > 0 ORDER BY inventory_id""",
+        """INSERT INTO stock_on_hand (user_id, med_id, lots, on_hand, earliest_expiry)
+            SELECT user_id, med_id, COUNT(*), IFNULL(SUM(quantity), 0), MIN(CASE WHEN quantity > 0 THEN expiration END)
+            FROM inventory WHERE user_id IS NOT NULL AND med_id IS NOT NULL
+            GROUP BY user_id, med_id""",
+        # A new lot is a receipt and a deleted one a discard of what was left
+        """CREATE TRIGGER IF NOT EXISTS inventory_receive AFTER INSERT ON inventory
+            WHEN NEW.quantity > 0 BEGIN
+                INSERT INTO stock_movement (inventory_id, med_id, user_id, kind, quantity)
+                VALUES (NEW.inventory_id, NEW.med_id, NEW.user_id, 'receive', NEW.quantity);
+            END""",
+        """CREATE TRIGGER IF NOT EXISTS inventory_discard AFTER DELETE ON inventory
+            WHEN OLD.quantity > 0 BEGIN
+                INSERT INTO stock_movement (inventory_id, med_id, user_id, kind, quantity)
+                VALUES (OLD.inventory_id, OLD.med_id, OLD.user_id, 'discard', -OLD.quantity);
+            END""",
+        """CREATE TRIGGER IF NOT EXISTS stock_movement_no_update BEFORE UPDATE ON stock_movement BEGIN
+                SELECT RAISE(ABORT, 'stock_movement is append-only');
+            END""",
+        """CREATE TRIGGER IF NOT EXISTS stock_movement_no_delete BEFORE DELETE ON stock_movement BEGIN
+                SELECT RAISE(ABORT, 'stock_movement is append-only');
+            END""",
+        *(sql for name, sql in _STOCK_TRIGGERS),
+    )),
+    (8, "Content hash for detecting changed CSV files", (
+        # Older databases only compared the file's mtime
+        _add_column("csv_import_status", "content_hash TEXT"),
+    )),
+    (9, "Stock triggers that count a NULL lot quantity as 0", (
+        # Databases from migration 7 got triggers that failed on such lots, so that
+        # updating or deleting the lot, or its medicine, hit NOT NULL on stock_on_hand
+        *(f"DROP TRIGGER IF EXISTS {name}" for name, sql in _STOCK_TRIGGERS),
+        *(sql for name, sql in _STOCK_TRIGGERS),
+    )),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def schema_version(cursor):
+    """Migration version the database is at"""
+    cursor.execute("PRAGMA user_version")
+    return cursor.fetchone()[0]
+
+
+def migrate(conn):
+    """Apply pending migrations, each in its own transaction; returns versions applied
+
+    The version is re-read after taking the write lock, so two terminals
+    starting at once do not apply the same migration twice.
+    """
+    cursor = conn.cursor()
+    applied = []
+    for version, description, steps in MIGRATIONS:
+        if schema_version(cursor) >= version:
+            continue
+        if conn.in_transaction:
+            conn.commit()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            if schema_version(cursor) < version:
+                for step in steps:
+                    if callable(step):
+                        step(cursor)
+                    else:
+                        cursor.execute(step)
+                cursor.execute(f"PRAGMA user_version = {int(version)}")
+                applied.append(version)
+                print(f"Applied migration {version}: {description}")
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+    return applied
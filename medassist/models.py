@@ -0,0 +1,133 @@
+"""Row objects returned by the MedAssist repositories
+
+Rows use __slots__ instead of a per-instance __dict__, and repeated
+category values (type, form, strength, manufacturer, ...) are interned so
+every cached row shares one string object per distinct value. A medicine
+can be fetched without its wide descriptive columns, which the repository
+then loads for a whole list of rows at once.
+"""
+import sys
+
+from medassist.schema import MED_INFO_COLUMNS
+
+# Columns that repeat across many medicines and are worth sharing
+INTERNED_COLUMNS = frozenset({
+    "med_type", "dosage_form", "strength", "manufacturer", "indication", "classification"
+})
+
+# med_info columns fetched with every medicine; the rest only when asked for
+MEDICINE_EAGER_COLUMNS = ("med_id",) + MED_INFO_COLUMNS[:4]
+MEDICINE_LAZY_COLUMNS = MED_INFO_COLUMNS[4:]
+
+
+def _intern(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+class Row:
+    """Base for fixed-field rows built from a SELECT in field order"""
+    __slots__ = ()
+    _fields = ()
+
+    def __init__(self, *values):
+        for name, value in zip(self._fields, values):
+            setattr(self, name, _intern(value) if name in INTERNED_COLUMNS else value)
+
+    @classmethod
+    def _make(cls, row):
+        return cls(*row)
+
+    def estimated_size(self):
+        """Bytes held by this row and its values, counting shared strings as its own"""
+        size = sys.getsizeof(self)
+        for cls in type(self).__mro__:
+            for name in getattr(cls, "__slots__", ()):
+                value = getattr(self, name, None)
+                size += sys.getsizeof(value)
+                if type(value) is tuple:
+                    size += sum(sys.getsizeof(item) for item in value)
+        return size
+
+    def _astuple(self):
+        return tuple(getattr(self, name) for name in self._fields)
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return self._astuple() == other._astuple()
+
+    def __hash__(self):
+        return hash(self._astuple())
+
+    def __repr__(self):
+        values = ", ".join(f"{name}={getattr(self, name)!r}" for name in self._fields)
+        return f"{type(self).__name__}({values})"
+
+
+class Medicine(Row):
+    """A med_info row
+
+    A row fetched without manufacturer, indication and classification
+    raises LookupError on reading them until MedicineRepository.load_details
+    has filled them in. Rows hold no reference to the repository.
+    """
+    __slots__ = MEDICINE_EAGER_COLUMNS + ("_details",)
+    _fields = ("med_id",) + MED_INFO_COLUMNS
+
+    def __init__(self, med_id, med_name, med_type, dosage_form, strength, *details):
+        super().__init__(med_id, med_name, med_type, dosage_form, strength)
+        self._details = tuple(_intern(value) for value in details) if details else None
+
+    @property
+    def details_loaded(self):
+        return self._details is not None
+
+    def set_details(self, details):
+        """Attach (manufacturer, indication, classification) fetched elsewhere"""
+        self._details = tuple(_intern(value) for value in details)
+
+    def _detail(self, index):
+        if self._details is None:
+            raise LookupError(f"Details of medicine {self.med_id} were not loaded")
+        return self._details[index]
+
+    def _astuple(self):
+        # Details not loaded yet compare as None instead of raising
+        return tuple(getattr(self, name) for name in MEDICINE_EAGER_COLUMNS) + (self._details,)
+
+    def __repr__(self):
+        if self.details_loaded:
+            return super().__repr__()
+        values = ", ".join(f"{name}={getattr(self, name)!r}" for name in MEDICINE_EAGER_COLUMNS)
+        return f"{type(self).__name__}({values}, details not loaded)"
+
+    manufacturer = property(lambda self: self._detail(0))
+    indication = property(lambda self: self._detail(1))
+    classification = property(lambda self: self._detail(2))
+
+    @property
+    def sort_key(self):
+        """Keyset position (med_name, med_id) in the name-ordered medicine list"""
+        return (self.med_name, self.med_id)
+
+
+class Schedule(Row):
+    """A schedule row joined with its medicine's name"""
+    __slots__ = _fields = (
+        "schedule_id", "med_id", "med_name", "consumption_start", "consumption_end", "frequency"
+    )
+
+
+class InventoryItem(Row):
+    """An inventory row joined with its medicine's name"""
+    __slots__ = _fields = ("inventory_id", "med_id", "med_name", "quantity", "expiration")
+
+
+class StockLevel(Row):
+    """A user's stock of one medicine over all its lots, from stock_on_hand"""
+    __slots__ = _fields = ("med_id", "med_name", "lots", "on_hand", "earliest_expiry")
+
+
+class StockMovement(Row):
+    """A stock_movement ledger row; quantity is negative for stock leaving a lot"""
+    __slots__ = _fields = ("movement_id", "inventory_id", "med_id", "kind", "quantity", "moved_at")
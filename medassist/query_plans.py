@@ -0,0 +1,135 @@
+"""EXPLAIN QUERY PLAN checks that keep the app's hot queries on indexes
+
+Run against a database to catch a query that regressed to a full scan:
+
+    python -m medassist.query_plans [medassist.db]
+"""
+import argparse
+import pathlib
+import sqlite3
+import sys
+
+from medassist.alerts import (
+    COUNT_EXPIRED, COUNT_EXPIRING, COUNT_LOW_STOCK, LIST_EXPIRED, LIST_EXPIRING, LIST_LOW_STOCK
+)
+from medassist.db import DB_PATH
+from medassist.dispensing import FEFO_LOTS, ON_HAND, USABLE_STOCK
+from medassist.inventory_batch import EXISTING_LOTS, EXISTING_MEDICINES
+from medassist.migrations import EARLIEST_EXPIRY
+from medassist.repository import (
+    COUNT_MEDICINE_INVENTORY, COUNT_MEDICINE_SCHEDULES, DELETE_MEDICINE, LIST_ACTIVE_SCHEDULES, LIST_INVENTORY,
+    LIST_LOT_MOVEMENTS, LIST_SCHEDULES, MEDICINE_BY_NAME, MEDICINE_USED_BY_OTHERS, SELECT_MEDICINE,
+    SELECT_STOCK_LEVEL
+)
+from medassist.search import FTS_COUNT_SQL, FTS_PAGE_SQL, fts_enabled, like_filter, name_ordered_page_sql
+from medassist.users import FIND_USER, PURGE_SESSIONS, RESOLVE_SESSION
+
+_LIKE_CLAUSE, _LIKE_PARAMS = like_filter("a")
+
+# name -> (sql, sample parameters) for every lookup the screens run on user input,
+# built from the statements the app itself runs
+HOT_QUERIES = {
+    "login": (FIND_USER, ("u",)),
+    "session": (RESOLVE_SESSION, ("0" * 64,)),
+    "expired sessions": (PURGE_SESSIONS, (0.0,)),
+    "medicine by id": (SELECT_MEDICINE, (1,)),
+    "duplicate name": (MEDICINE_BY_NAME, ("a", -1)),
+    "medicine page": (name_ordered_page_sql(), (10, 0)),
+    "medicine page after": (name_ordered_page_sql(direction="after"), ("a", 1, 10, 0)),
+    "medicine page before": (name_ordered_page_sql(direction="before"), ("a", 1, 10, 0)),
+    "medicine search without index": (
+        name_ordered_page_sql(_LIKE_CLAUSE, "after"), tuple(_LIKE_PARAMS) + ("a", 1, 10, 0)
+    ),
+    "schedule count": (COUNT_MEDICINE_SCHEDULES, (1, 1)),
+    "inventory count": (COUNT_MEDICINE_INVENTORY, (1, 1)),
+    "medicine used by others": (MEDICINE_USED_BY_OTHERS, (1, 1, 1, 1)),
+    **{f"medicine delete {index}": (sql, (1,)) for index, sql in enumerate(DELETE_MEDICINE, 1)},
+    "schedule list": (LIST_SCHEDULES, (1,)),
+    "active schedules": (LIST_ACTIVE_SCHEDULES, (1, "2025-01-01")),
+    "inventory list": (LIST_INVENTORY, (1,)),
+    "batch medicines exist": (EXISTING_MEDICINES, ("[1, 2]",)),
+    "batch lots exist": (EXISTING_LOTS, ("[1, 2]", 1)),
+    "expired inventory": (LIST_EXPIRED, (1, "2025-01-01", 20)),
+    "expired inventory count": (COUNT_EXPIRED, (1, "2025-01-01")),
+    "expiring inventory": (LIST_EXPIRING, (1, "2025-01-01", "2025-01-31", 20)),
+    "expiring inventory count": (COUNT_EXPIRING, (1, "2025-01-01", "2025-01-31")),
+    "low stock": (LIST_LOW_STOCK, (1, 10, 20)),
+    "low stock count": (COUNT_LOW_STOCK, (1, 10)),
+    "stock level": (SELECT_STOCK_LEVEL, (1, 1)),
+    "dispense on hand": (ON_HAND, (1, 1)),
+    "dispense lots": (FEFO_LOTS, (1, 1, "2025-01-01")),
+    "dispense shortage": (USABLE_STOCK, (1, 1, "2025-01-01")),
+    "lot history": (LIST_LOT_MOVEMENTS, (1, 1)),
+    # What the stock_on_hand triggers run on every lot change
+    "earliest expiry": (EARLIEST_EXPIRY, (1, 1)),
+}
+
+# Full-text searches, checked when the database has the FTS index
+SEARCH_QUERIES = {
+    "medicine search": (FTS_PAGE_SQL, ('"a"*', 10, 0)),
+    "medicine search count": (FTS_COUNT_SQL, ('"a"*',)),
+}
+
+# Ranked by bm25, which no index can order; the sort only covers the matches
+RANKED_QUERIES = frozenset({"medicine search"})
+
+
+def plan_problems(detail):
+    """Why a single EXPLAIN QUERY PLAN row is a regression, or None"""
+    # Scanning a table-valued function such as json_each only walks its arguments
+    if detail.startswith("SCAN") and "USING" not in detail and "VIRTUAL TABLE" not in detail:
+        return "full table scan"
+    if "USE TEMP B-TREE" in detail:
+        return "sort without an index"
+    return None
+
+
+def hot_queries(cursor):
+    """HOT_QUERIES, plus SEARCH_QUERIES when the database has the FTS index"""
+    return dict(HOT_QUERIES, **SEARCH_QUERIES) if fts_enabled(cursor) else dict(HOT_QUERIES)
+
+
+def check_query_plans(conn, queries=None):
+    """List of (query name, problem, plan row) for every regressed query; queries defaults to hot_queries"""
+    cursor = conn.cursor()
+    if queries is None:
+        queries = hot_queries(cursor)
+    failures = []
+    for name, (sql, params) in queries.items():
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+        for row in cursor.fetchall():
+            detail = row[-1]
+            problem = plan_problems(detail)
+            if problem == "sort without an index" and name in RANKED_QUERIES:
+                continue
+            if problem:
+                failures.append((name, problem, detail))
+    return failures
+
+
+def open_read_only(path):
+    """Connection that can neither write to the database nor create a missing file"""
+    return sqlite3.connect(pathlib.Path(path).absolute().as_uri() + "?mode=ro", uri=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check that the app's hot queries use indexes")
+    parser.add_argument("db", nargs="?", default=DB_PATH, help=f"database to check (default: {DB_PATH})")
+    args = parser.parse_args(argv)
+    try:
+        conn = open_read_only(args.db)
+        try:
+            queries = hot_queries(conn.cursor())
+            failures = check_query_plans(conn, queries)
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        parser.error(f"{args.db}: {e}")
+    for name, problem, detail in failures:
+        print(f"{name}: {problem} ({detail})")
+    print(f"{len(queries)} queries checked, {len(failures)} problems")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
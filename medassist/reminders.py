@@ -0,0 +1,235 @@
+"""Dose reminders expanded from schedule.frequency
+
+parse_frequency turns free text such as "Twice daily", "Every 8 hours",
+"08:00 and 20:00" or "bid" into a Recurrence. ReminderQueue keeps only
+the next dose of each active schedule in a heap ordered by due time, so
+firing a reminder or editing a schedule costs O(log n) however many
+schedules there are, and nothing ever walks the schedule table to find
+what is due.
+"""
+import heapq
+import re
+from collections import namedtuple
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+
+# Dose times of a day with several doses are spread evenly over this window
+FIRST_DOSE_HOUR = 8
+LAST_DOSE_HOUR = 20
+
+# times: sorted datetime.time values of each dosing day; every_days: length of the repeating cycle;
+# days: sorted offsets of the dosing days within each cycle, so "twice a week" doses on days 0 and 3 of 7
+Recurrence = namedtuple("Recurrence", ["times", "every_days", "days"], defaults=((0,),))
+
+Reminder = namedtuple("Reminder", ["due", "schedule_id", "med_id", "med_name", "frequency"])
+
+_COUNT_WORDS = {"once": 1, "twice": 2, "thrice": 3, "one": 1, "two": 2, "three": 3, "four": 4}
+
+# Prescription shorthand -> (doses per dosing day, every_days)
+_ABBREVIATIONS = {"qd": (1, 1), "od": (1, 1), "bid": (2, 1), "tid": (3, 1), "qid": (4, 1), "qod": (1, 2)}
+
+_AS_NEEDED = ("as needed", "prn", "when needed", "as required", "when required")
+
+_COUNT_RE = re.compile(r"\b(\d+|one|two|three|four) ?(?:times?|x)\b|\b(once|twice|thrice)\b")
+_EVERY_DAYS_RE = re.compile(r"every (other|\d+) days?")
+_EVERY_WEEKS_RE = re.compile(r"every (other|\d+) weeks?")
+_EVERY_HOURS_RE = re.compile(r"every (\d+) ?(?:hours?|hrs?|h)\b|\bq(\d+)h\b")
+_HOURS_RE = re.compile(r"\b(?:hours?|hrs?|hourly)\b")
+# Intervals a Recurrence cannot express; text naming one gets no reminders rather than daily ones
+_UNSUPPORTED_RE = re.compile(r"\b(?:minutes?|mins?|months?|monthly|years?|yearly|annually)\b")
+_CLOCK_RE = re.compile(r"\b(\d{1,2}):(\d{2})\b")
+_WEEKLY_RE = re.compile(r"\bweekly\b|\ba week\b|\bper week\b|every week")
+_FORTNIGHTLY_RE = re.compile(r"\bfortnightly\b|\b(?:a|per|every) fortnight\b")
+
+
+def dose_times(count):
+    """count dose times spread from FIRST_DOSE_HOUR to LAST_DOSE_HOUR"""
+    if count == 1:
+        return (time(FIRST_DOSE_HOUR),)
+    step = (LAST_DOSE_HOUR - FIRST_DOSE_HOUR) * 60 // (count - 1)
+    return tuple(
+        time(*divmod(FIRST_DOSE_HOUR * 60 + step * i, 60)) for i in range(count)
+    )
+
+
+@lru_cache(maxsize=1024)
+def parse_frequency(text):
+    """Recurrence for a free-text frequency, or None when it has no fixed dose times
+
+    "As needed", text that names no count, interval or clock time, and
+    intervals that do not fit whole days (monthly, every 5 hours) give
+    None, so those schedules never raise reminders.
+    """
+    text = " ".join((text or "").lower().replace("-", " ").split())
+    if not text or any(phrase in text for phrase in _AS_NEEDED) or _UNSUPPORTED_RE.search(text):
+        return None
+
+    every_days = 1
+    match = _EVERY_DAYS_RE.search(text)
+    if match:
+        every_days = 2 if match.group(1) == "other" else int(match.group(1))
+    weekly = _WEEKLY_RE.search(text) is not None
+    if weekly:
+        every_days = 7
+    match = _EVERY_WEEKS_RE.search(text)
+    if match:
+        weekly = True
+        every_days = 14 if match.group(1) == "other" else 7 * int(match.group(1))
+    if _FORTNIGHTLY_RE.search(text):
+        weekly = True
+        every_days = 14
+
+    clock = _CLOCK_RE.findall(text)
+    if clock:
+        times = {time(int(hour), int(minute)) for hour, minute in clock if int(hour) < 24 and int(minute) < 60}
+        return Recurrence(tuple(sorted(times)), every_days) if times else None
+
+    match = _EVERY_HOURS_RE.search(text)
+    if match:
+        step = int(match.group(1) or match.group(2))
+        if step and step % 24 == 0:
+            return Recurrence((time(FIRST_DOSE_HOUR),), step // 24)
+        if not step or 24 % step:
+            return None  # Every 5 hours drifts across days; no fixed daily times
+        times = {time((FIRST_DOSE_HOUR + step * i) % 24) for i in range(24 // step)}
+        return Recurrence(tuple(sorted(times)), every_days)
+    if _HOURS_RE.search(text):
+        return None
+
+    count = None
+    for word in text.split():
+        if word in _ABBREVIATIONS:
+            count, every_days = _ABBREVIATIONS[word]
+            break
+    match = _COUNT_RE.search(text)
+    if match:
+        word = match.group(1) or match.group(2)
+        count = int(word) if word.isdigit() else _COUNT_WORDS[word]
+    elif count is None and (weekly or every_days > 1 or re.search(r"daily|every day|a day|per day", text)):
+        count = 1
+    if not count or count > 24:
+        return None
+    if weekly and count > 1:
+        # "Twice a week" is one dose on each of count days spread over the week,
+        # rounded down to whole days: 2 a week doses on days 0 and 3, 3 on 0, 2 and 4
+        days = sorted({every_days * i // count for i in range(count)})
+        return Recurrence(dose_times(1), every_days, tuple(days))
+    return Recurrence(dose_times(count), every_days)
+
+
+def _parse_day(value):
+    try:
+        return date.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+
+def next_occurrence(recurrence, start, end, after):
+    """First dose strictly after the datetime after, or None once the schedule has ended
+
+    start and end are dates; end may be None for an open-ended schedule.
+    """
+    first = max(start, after.date())
+    cycle = first - timedelta(days=(first - start).days % recurrence.every_days)
+    while True:
+        for offset in recurrence.days:
+            day = cycle + timedelta(days=offset)
+            if day < first:
+                continue
+            if end is not None and day > end:
+                return None
+            for dose in recurrence.times:
+                due = datetime.combine(day, dose)
+                if due > after:
+                    return due
+        cycle += timedelta(days=recurrence.every_days)
+
+
+def next_dose(schedule, after):
+    """Next dose of a Schedule row after the datetime after, or None"""
+    recurrence = parse_frequency(schedule.frequency)
+    start = _parse_day(schedule.consumption_start)
+    if recurrence is None or start is None:
+        return None
+    return next_occurrence(recurrence, start, _parse_day(schedule.consumption_end), after)
+
+
+class ReminderQueue:
+    """Heap of the next dose of every active schedule
+
+    Each schedule has at most one live heap entry. Replacing or removing a
+    schedule leaves its old entry in the heap, and it is skipped when it
+    reaches the top, so every change is a single push.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._due = {}  # schedule_id -> (due, Schedule) of its live heap entry
+
+    def __len__(self):
+        return len(self._due)
+
+    def load(self, schedules, now):
+        """Replace the queue with the next dose of each Schedule row"""
+        self._due = {}
+        for schedule in schedules:
+            due = next_dose(schedule, now)
+            if due is not None:
+                self._due[schedule.schedule_id] = (due, schedule)
+        self._heap = [(due, schedule_id) for schedule_id, (due, _) in self._due.items()]
+        heapq.heapify(self._heap)
+
+    def update(self, schedule_id, schedule, now):
+        """Track a schedule that was added or edited; schedule None removes it"""
+        due = next_dose(schedule, now) if schedule is not None else None
+        if due is None:
+            self._due.pop(schedule_id, None)
+            return
+        self._due[schedule_id] = (due, schedule)
+        heapq.heappush(self._heap, (due, schedule_id))
+
+    def _live_top(self):
+        while self._heap:
+            due, schedule_id = self._heap[0]
+            entry = self._due.get(schedule_id)
+            if entry is not None and entry[0] == due:
+                return due, schedule_id, entry[1]
+            heapq.heappop(self._heap)  # Superseded or removed
+        return None
+
+    def next_due(self):
+        """Due time of the earliest pending dose, or None"""
+        top = self._live_top()
+        return top[0] if top else None
+
+    def peek(self):
+        """Reminder for the earliest pending dose, or None"""
+        top = self._live_top()
+        if top is None:
+            return None
+        due, schedule_id, schedule = top
+        return Reminder(due, schedule_id, schedule.med_id, schedule.med_name, schedule.frequency)
+
+    def pop_due(self, now, refresh=None):
+        """Reminders due at or before now, each schedule moved on to its next dose
+
+        refresh(schedule_id) returns the current Schedule row, or None once
+        it was deleted; edits made elsewhere are picked up that way before
+        a reminder fires. A schedule that missed several doses, say while
+        the app was closed, fires once.
+        """
+        reminders = []
+        while True:
+            top = self._live_top()
+            if top is None or top[0] > now:
+                return reminders
+            due, schedule_id, schedule = top
+            heapq.heappop(self._heap)
+            if refresh is not None:
+                current = refresh(schedule_id)
+                if current != schedule:
+                    # Reschedule from just before this dose with the current row
+                    self.update(schedule_id, current, due - timedelta(seconds=1))
+                    continue
+            reminders.append(Reminder(due, schedule_id, schedule.med_id, schedule.med_name, schedule.frequency))
+            self.update(schedule_id, schedule, max(due, now))
@@ -0,0 +1,427 @@
+"""Medicine, schedule and inventory data access shared by every screen
+
+The repositories hold no widget state, so the same code runs in the app,
+the benchmarks and scripts. SQL lives in module constants: identical
+statement text lets the connection's statement cache (see
+STATEMENT_CACHE_SIZE) reuse each prepared statement across calls. All
+writes go through run_write and friends, so they take the write lock up
+front and retry on lock errors.
+"""
+from medassist.db import run_transaction, run_write, run_write_many, run_writes
+from medassist.models import (
+    MEDICINE_EAGER_COLUMNS, MEDICINE_LAZY_COLUMNS, InventoryItem, Medicine, Schedule, StockLevel,
+    StockMovement
+)
+from medassist.schema import MED_INFO_COLUMNS, STRENGTH_COLUMNS
+from medassist.search import catalog_changed, count_medicines, fetch_medicines
+from medassist.validation import RowError, normalize_date, parse_strength
+
+_MED_INFO_COLUMN_LIST = ", ".join(MED_INFO_COLUMNS)
+_EAGER_COLUMN_LIST = ", ".join(MEDICINE_EAGER_COLUMNS)
+_LAZY_COLUMN_LIST = ", ".join(MEDICINE_LAZY_COLUMNS)
+
+# Largest IN (...) list per detail query, below SQLite's default variable limit
+DETAIL_BATCH_SIZE = 500
+
+SELECT_MEDICINE = f"SELECT med_id, {_MED_INFO_COLUMN_LIST} FROM med_info WHERE med_id = ?"
+SELECT_MEDICINE_BRIEF = f"SELECT {_EAGER_COLUMN_LIST} FROM med_info WHERE med_id = ?"
+MEDICINE_EXISTS = "SELECT 1 FROM med_info WHERE med_id = ?"
+MEDICINE_BY_NAME = "SELECT med_id FROM med_info WHERE med_name = ? AND med_id != ? LIMIT 1"
+LIST_MEDICINE_SUMMARIES = f"SELECT {_EAGER_COLUMN_LIST} FROM med_info ORDER BY med_name"
+INSERT_MEDICINE = f"""
+    INSERT INTO med_info ({_MED_INFO_COLUMN_LIST}, {", ".join(STRENGTH_COLUMNS)})
+    VALUES ({", ".join("?" for _ in MED_INFO_COLUMNS + STRENGTH_COLUMNS)})
+"""
+# The catalog is shared, so a medicine is only deleted once no other user's rows use it
+DELETE_MEDICINE = (
+    "DELETE FROM schedule WHERE med_id = ?",
+    "DELETE FROM inventory WHERE med_id = ?",
+    "DELETE FROM med_info WHERE med_id = ?",
+)
+# Parameters: (med_id, user_id, med_id, user_id)
+MEDICINE_USED_BY_OTHERS = """
+    SELECT 1 FROM schedule WHERE med_id = ? AND user_id IS NOT ?
+    UNION ALL
+    SELECT 1 FROM inventory WHERE med_id = ? AND user_id IS NOT ?
+    LIMIT 1
+"""
+COUNT_MEDICINE_SCHEDULES = "SELECT COUNT(*) FROM schedule WHERE med_id = ? AND user_id = ?"
+COUNT_MEDICINE_INVENTORY = "SELECT COUNT(*) FROM inventory WHERE med_id = ? AND user_id = ?"
+
+SELECT_SCHEDULES = """
+    SELECT s.schedule_id, s.med_id, m.med_name, s.consumption_start, s.consumption_end, s.frequency
+    FROM schedule s
+    JOIN med_info m ON s.med_id = m.med_id
+"""
+SELECT_SCHEDULE = SELECT_SCHEDULES + " WHERE s.schedule_id = ? AND s.user_id = ?"
+LIST_SCHEDULES = SELECT_SCHEDULES + " WHERE s.user_id = ? ORDER BY s.consumption_start"
+LIST_ACTIVE_SCHEDULES = SELECT_SCHEDULES + (
+    " WHERE s.user_id = ? AND (s.consumption_end IS NULL OR s.consumption_end >= ?)"
+)
+SCHEDULE_EXISTS = "SELECT 1 FROM schedule WHERE schedule_id = ? AND user_id = ?"
+INSERT_SCHEDULE = """
+    INSERT INTO schedule (med_id, consumption_start, consumption_end, frequency, user_id)
+    VALUES (?, ?, ?, ?, ?)
+"""
+UPDATE_SCHEDULE = """
+    UPDATE schedule SET
+        med_id = ?,
+        consumption_start = ?,
+        consumption_end = ?,
+        frequency = ?
+    WHERE schedule_id = ? AND user_id = ?
+"""
+DELETE_SCHEDULE = "DELETE FROM schedule WHERE schedule_id = ? AND user_id = ?"
+
+SELECT_INVENTORY = """
+    SELECT i.inventory_id, i.med_id, m.med_name, i.quantity, i.expiration
+    FROM inventory i
+    JOIN med_info m ON i.med_id = m.med_id
+"""
+SELECT_INVENTORY_ITEM = SELECT_INVENTORY + " WHERE i.inventory_id = ? AND i.user_id = ?"
+LIST_INVENTORY = SELECT_INVENTORY + " WHERE i.user_id = ? ORDER BY i.expiration"
+INVENTORY_EXISTS = "SELECT 1 FROM inventory WHERE inventory_id = ? AND user_id = ?"
+INSERT_INVENTORY = "INSERT INTO inventory (med_id, quantity, expiration, user_id) VALUES (?, ?, ?, ?)"
+# Quantity changes go through the stock_movement ledger, see ADJUST_QUANTITY
+UPDATE_INVENTORY = """
+    UPDATE inventory SET
+        med_id = ?,
+        expiration = ?
+    WHERE inventory_id = ? AND user_id = ?
+"""
+DELETE_INVENTORY = "DELETE FROM inventory WHERE inventory_id = ? AND user_id = ?"
+
+# Ledger rows copy the lot's medicine and owner, and are only written for the user's own lots.
+# A trigger applies each movement to the lot, which keeps stock_on_hand in step (migration 7).
+RECORD_MOVEMENT = """
+    INSERT INTO stock_movement (inventory_id, med_id, user_id, kind, quantity)
+    SELECT inventory_id, med_id, user_id, ?, ? FROM inventory
+    WHERE inventory_id = ? AND user_id = ?
+"""
+# Sets a lot's quantity by recording the difference; writes nothing when the quantity
+# is unchanged or the new one is NULL. Parameters: (quantity, inventory_id, user_id).
+# A lot whose quantity is NULL, from before the ledger, counts as holding 0.
+ADJUST_QUANTITY = """
+    INSERT INTO stock_movement (inventory_id, med_id, user_id, kind, quantity)
+    SELECT inventory_id, med_id, user_id, 'adjust', ?1 - IFNULL(quantity, 0) FROM inventory
+    WHERE inventory_id = ?2 AND user_id = ?3 AND ?1 IS NOT NULL AND quantity IS NOT ?1
+"""
+LIST_LOT_MOVEMENTS = """
+    SELECT movement_id, inventory_id, med_id, kind, quantity, moved_at FROM stock_movement
+    WHERE inventory_id = ? AND user_id = ? ORDER BY movement_id
+"""
+
+SELECT_STOCK = """
+    SELECT s.med_id, m.med_name, s.lots, s.on_hand, s.earliest_expiry
+    FROM stock_on_hand s
+    JOIN med_info m ON s.med_id = m.med_id
+"""
+SELECT_STOCK_LEVEL = SELECT_STOCK + " WHERE s.user_id = ? AND s.med_id = ?"
+LIST_STOCK = SELECT_STOCK + " WHERE s.user_id = ? ORDER BY m.med_name"
+
+# Movements recorded directly; receipts are new lots and adjustments come from update()
+OUTGOING_KINDS = ("dispense", "discard")
+
+
+class MedicineInUse(ValueError):
+    """A medicine other users still schedule or hold stock of cannot be deleted"""
+
+
+def _split_strength(strength):
+    """(strength, strength_value, strength_unit) to store, keeping text that does not parse"""
+    try:
+        return parse_strength(strength)
+    except RowError:
+        return strength, None, None
+
+
+def _schedule_values(med_id, consumption_start, consumption_end, frequency):
+    """INSERT_SCHEDULE parameters with the dates in canonical ISO form"""
+    return med_id, normalize_date(consumption_start), normalize_date(consumption_end), frequency
+
+
+def _inventory_values(med_id, quantity, expiration):
+    """INSERT_INVENTORY parameters with the expiration in canonical ISO form"""
+    return med_id, quantity, normalize_date(expiration)
+
+
+def _medicine_values(row):
+    """INSERT_MEDICINE parameters for a (med_name, ..., classification) tuple"""
+    strength, value, unit = _split_strength(row[3])
+    return tuple(row[:3]) + (strength,) + tuple(row[4:7]) + (value, unit)
+
+
+class Repository:
+    """Base for the repositories; wraps one connection used by one thread"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def _one(self, make, sql, params):
+        row = self.conn.execute(sql, params).fetchone()
+        return None if row is None else make(row)
+
+    def _all(self, make, sql, params=()):
+        return [make(row) for row in self.conn.execute(sql, params)]
+
+    def _exists(self, sql, key):
+        return self.conn.execute(sql, (key,)).fetchone() is not None
+
+
+class OwnedRepository(Repository):
+    """Rows owned by one user; every query is limited to user_id
+
+    With user_id None (nobody logged in) nothing matches, and adding rows
+    raises ValueError rather than leaving them without an owner.
+    """
+
+    def __init__(self, conn, user_id=None):
+        super().__init__(conn)
+        self.user_id = user_id
+
+    def _exists(self, sql, key):
+        return self.conn.execute(sql, (key, self.user_id)).fetchone() is not None
+
+    def _owner(self):
+        if self.user_id is None:
+            raise ValueError("No user is logged in")
+        return self.user_id
+
+
+class MedicineRepository(Repository):
+    """med_info rows and their search, paging and cascade deletes"""
+
+    def get(self, med_id, details=True):
+        """Medicine with this id, or None; details=False leaves out the wide columns, see load_details"""
+        return self._one(Medicine._make, SELECT_MEDICINE if details else SELECT_MEDICINE_BRIEF, (med_id,))
+
+    def load_details(self, medicines):
+        """Fetch the wide columns for every row still missing them, a batch per query
+
+        For rows from list_summaries or get(details=False), before reading
+        manufacturer, indication or classification.
+        """
+        pending = {medicine.med_id: medicine for medicine in medicines if not medicine.details_loaded}
+        ids = list(pending)
+        for start in range(0, len(ids), DETAIL_BATCH_SIZE):
+            batch = ids[start:start + DETAIL_BATCH_SIZE]
+            placeholders = ", ".join("?" for _ in batch)
+            for med_id, *details in self.conn.execute(
+                f"SELECT med_id, {_LAZY_COLUMN_LIST} FROM med_info WHERE med_id IN ({placeholders})", batch
+            ):
+                pending.pop(med_id).set_details(details)
+        # Medicines deleted in the meantime have no details left
+        for medicine in pending.values():
+            medicine.set_details((None,) * len(MEDICINE_LAZY_COLUMNS))
+
+    def exists(self, med_id):
+        return self._exists(MEDICINE_EXISTS, med_id)
+
+    def find_by_name(self, name, exclude_id=None):
+        """Id of a medicine with exactly this name, ignoring exclude_id, or None"""
+        row = self.conn.execute(MEDICINE_BY_NAME, (name, -1 if exclude_id is None else exclude_id)).fetchone()
+        return None if row is None else row[0]
+
+    def list_summaries(self):
+        """Every medicine ordered by name, without the wide columns"""
+        return self._all(Medicine._make, LIST_MEDICINE_SUMMARIES)
+
+    def count(self, text="", approximate=False, use_fts=None):
+        """(count, exact) of medicines matching the search text, see count_medicines"""
+        return count_medicines(self.conn.cursor(), text, approximate, use_fts)
+
+    def page(self, text="", limit=10, offset=0, seek=None, use_fts=None):
+        """One page of matching medicines, see fetch_medicines"""
+        rows = fetch_medicines(self.conn.cursor(), text, limit, offset, seek, use_fts)
+        return [Medicine._make(row) for row in rows]
+
+    def related_counts(self, med_id, user_id):
+        """(schedules, inventory records) of user_id that deleting the medicine would remove"""
+        schedules = self.conn.execute(COUNT_MEDICINE_SCHEDULES, (med_id, user_id)).fetchone()[0]
+        inventory = self.conn.execute(COUNT_MEDICINE_INVENTORY, (med_id, user_id)).fetchone()[0]
+        return schedules, inventory
+
+    def used_by_others(self, med_id, user_id):
+        """Whether users other than user_id have schedules or lots of the medicine"""
+        return self.conn.execute(MEDICINE_USED_BY_OTHERS, (med_id, user_id, med_id, user_id)).fetchone() is not None
+
+    def add(self, med_name, med_type=None, dosage_form=None, strength=None,
+            manufacturer=None, indication=None, classification=None):
+        """Insert a medicine; returns its med_id"""
+        cursor = run_write(self.conn, INSERT_MEDICINE, _medicine_values((
+            med_name, med_type, dosage_form, strength, manufacturer, indication, classification
+        )))
+        catalog_changed()
+        return cursor.lastrowid
+
+    def add_many(self, rows):
+        """Insert (med_name, ..., classification) tuples in one transaction"""
+        run_write_many(self.conn, INSERT_MEDICINE, [_medicine_values(row) for row in rows])
+        catalog_changed()
+
+    def update(self, med_id, **columns):
+        """Set the given med_info columns; returns whether the medicine existed"""
+        unknown = set(columns) - set(MED_INFO_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown med_info column(s): {', '.join(sorted(unknown))}")
+        if "strength" in columns:
+            strength = _split_strength(columns["strength"])
+            columns["strength"], columns["strength_value"], columns["strength_unit"] = strength
+        # Keep columns in schema order so each combination maps to one cached statement
+        names = [column for column in MED_INFO_COLUMNS + STRENGTH_COLUMNS if column in columns]
+        if not names:
+            return self.exists(med_id)  # Nothing to set
+        cursor = run_write(self.conn, f"""
+            UPDATE med_info SET {", ".join(f"{column} = ?" for column in names)}
+            WHERE med_id = ?
+        """, [columns[column] for column in names] + [med_id])
+        catalog_changed()
+        return cursor.rowcount > 0
+
+    def delete(self, med_id, user_id=None):
+        """Delete a medicine with user_id's schedules and inventory of it; see delete_many"""
+        return self.delete_many([med_id], user_id) > 0
+
+    def delete_many(self, med_ids, user_id=None):
+        """Delete medicines with user_id's schedules and inventory of them in one transaction
+
+        Raises MedicineInUse, deleting nothing, while another user's schedules
+        or lots use one of them. Returns how many medicines were deleted.
+        """
+        keys = [(med_id,) for med_id in med_ids]
+        deleted = 0
+
+        def work(cursor):
+            nonlocal deleted
+            for (med_id,) in keys:
+                if cursor.execute(MEDICINE_USED_BY_OTHERS, (med_id, user_id, med_id, user_id)).fetchone():
+                    raise MedicineInUse(f"Medicine {med_id} is still in use by other users")
+            for sql in DELETE_MEDICINE:
+                cursor.executemany(sql, keys)
+            deleted = cursor.rowcount
+
+        run_transaction(self.conn, work)
+        catalog_changed()
+        return deleted
+
+
+class ScheduleRepository(OwnedRepository):
+    """A user's consumption schedules, joined with the medicine name"""
+
+    def get(self, schedule_id):
+        return self._one(Schedule._make, SELECT_SCHEDULE, (schedule_id, self.user_id))
+
+    def exists(self, schedule_id):
+        return self._exists(SCHEDULE_EXISTS, schedule_id)
+
+    def list_all(self):
+        """Every schedule of the user ordered by start date"""
+        return self._all(Schedule._make, LIST_SCHEDULES, (self.user_id,))
+
+    def list_active(self, today):
+        """The user's schedules that have not ended by today, an ISO date"""
+        return self._all(Schedule._make, LIST_ACTIVE_SCHEDULES, (self.user_id, today))
+
+    def add(self, med_id, consumption_start, consumption_end, frequency):
+        """Insert a schedule; returns its schedule_id"""
+        values = _schedule_values(med_id, consumption_start, consumption_end, frequency)
+        return run_write(self.conn, INSERT_SCHEDULE, values + (self._owner(),)).lastrowid
+
+    def add_many(self, rows):
+        """Insert (med_id, start, end, frequency) tuples in one transaction"""
+        owner = self._owner()
+        run_write_many(self.conn, INSERT_SCHEDULE, [_schedule_values(*row) + (owner,) for row in rows])
+
+    def update(self, schedule_id, med_id, consumption_start, consumption_end, frequency):
+        """Replace a schedule's fields; returns whether the user has it"""
+        values = _schedule_values(med_id, consumption_start, consumption_end, frequency)
+        return run_write(self.conn, UPDATE_SCHEDULE, values + (schedule_id, self.user_id)).rowcount > 0
+
+    def delete(self, schedule_id):
+        return run_write(self.conn, DELETE_SCHEDULE, (schedule_id, self.user_id)).rowcount > 0
+
+    def delete_many(self, schedule_ids):
+        """Delete schedules in one transaction; returns how many were removed"""
+        return run_write_many(
+            self.conn, DELETE_SCHEDULE, [(key, self.user_id) for key in schedule_ids]
+        ).rowcount
+
+
+class InventoryRepository(OwnedRepository):
+    """A user's inventory records, joined with the medicine name"""
+
+    def get(self, inventory_id):
+        return self._one(InventoryItem._make, SELECT_INVENTORY_ITEM, (inventory_id, self.user_id))
+
+    def exists(self, inventory_id):
+        return self._exists(INVENTORY_EXISTS, inventory_id)
+
+    def list_all(self):
+        """Every inventory record of the user ordered by expiration"""
+        return self._all(InventoryItem._make, LIST_INVENTORY, (self.user_id,))
+
+    def add(self, med_id, quantity, expiration):
+        """Insert an inventory record; returns its inventory_id"""
+        values = _inventory_values(med_id, quantity, expiration)
+        return run_write(self.conn, INSERT_INVENTORY, values + (self._owner(),)).lastrowid
+
+    def add_many(self, rows):
+        """Insert (med_id, quantity, expiration) tuples in one transaction"""
+        owner = self._owner()
+        run_write_many(self.conn, INSERT_INVENTORY, [_inventory_values(*row) + (owner,) for row in rows])
+
+    def update(self, inventory_id, med_id, quantity, expiration):
+        """Replace a record's fields, recording a quantity change as an adjustment
+
+        Returns whether the user has the record.
+        """
+        med_id, quantity, expiration = _inventory_values(med_id, quantity, expiration)
+        key = (inventory_id, self.user_id)
+        return run_writes(self.conn, [
+            (ADJUST_QUANTITY, (quantity,) + key),
+            (UPDATE_INVENTORY, (med_id, expiration) + key),
+        ]).rowcount > 0
+
+    def delete(self, inventory_id):
+        return run_write(self.conn, DELETE_INVENTORY, (inventory_id, self.user_id)).rowcount > 0
+
+    def delete_many(self, inventory_ids):
+        """Delete inventory records in one transaction; returns how many were removed"""
+        return run_write_many(
+            self.conn, DELETE_INVENTORY, [(key, self.user_id) for key in inventory_ids]
+        ).rowcount
+
+
+class StockRepository(OwnedRepository):
+    """A user's stock on hand per medicine and the ledger of stock movements
+
+    Levels are read from stock_on_hand, which triggers keep up to date on
+    every lot change, so each lookup is a primary key read rather than an
+    aggregate over lots or movements.
+    """
+
+    def get(self, med_id):
+        """StockLevel of one medicine, or None when the user has no lots of it"""
+        return self._one(StockLevel._make, SELECT_STOCK_LEVEL, (self.user_id, med_id))
+
+    def list_all(self):
+        """StockLevel of every medicine the user has lots of, ordered by name"""
+        return self._all(StockLevel._make, LIST_STOCK, (self.user_id,))
+
+    def history(self, inventory_id):
+        """Every movement of one of the user's lots, oldest first"""
+        return self._all(StockMovement._make, LIST_LOT_MOVEMENTS, (inventory_id, self.user_id))
+
+    def record(self, inventory_id, kind, quantity):
+        """Take quantity units out of a lot as a dispense or discard; returns whether the user has it
+
+        Raises sqlite3.IntegrityError when the lot holds fewer units.
+        """
+        if kind not in OUTGOING_KINDS:
+            raise ValueError(f"Movement kind must be one of {list(OUTGOING_KINDS)}, not {kind!r}")
+        quantity = int(quantity)
+        if quantity <= 0:
+            raise ValueError("Quantity must be positive")
+        return run_write(
+            self.conn, RECORD_MOVEMENT, (kind, -quantity, inventory_id, self._owner())
+        ).rowcount > 0
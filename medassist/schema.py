@@ -0,0 +1,80 @@
+"""Table layout shared by the MedAssist data modules"""
+
+# Descriptive columns of med_info, in CSV order
+MED_INFO_COLUMNS = (
+    "med_name", "med_type", "dosage_form", "strength",
+    "manufacturer", "indication", "classification"
+)
+
+# Numeric form of med_info.strength, kept in step on every write
+STRENGTH_COLUMNS = ("strength_value", "strength_unit")
+
+# (label, CREATE statement) for every table, in foreign key order, in its current shape.
+# medassist.migrations brings tables created by older versions to the same shape,
+# and adds the indexes, triggers and tables that came later.
+TABLES = (
+    ("User", """
+        CREATE TABLE IF NOT EXISTS user (
+            user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT NOT NULL UNIQUE,
+            password TEXT NOT NULL
+        )"""),
+    # Medicine info table with additional fields
+    ("Medicine info", """
+        CREATE TABLE IF NOT EXISTS med_info (
+            med_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            med_name TEXT NOT NULL,
+            med_type TEXT,
+            dosage_form TEXT,
+            strength TEXT,
+            manufacturer TEXT,
+            indication TEXT,
+            classification TEXT,
+            strength_value REAL,
+            strength_unit TEXT
+        )"""),
+    # Tracks when each CSV file was last imported
+    ("CSV import status", """
+        CREATE TABLE IF NOT EXISTS csv_import_status (
+            filename TEXT PRIMARY KEY,
+            last_modified INTEGER,
+            content_hash TEXT
+        )"""),
+    # Maps each CSV row to the medicine it was synced into
+    ("Medicine source", """
+        CREATE TABLE IF NOT EXISTS med_info_source (
+            filename TEXT NOT NULL,
+            source_key TEXT NOT NULL,
+            med_id INTEGER NOT NULL,
+            fingerprint TEXT NOT NULL,
+            PRIMARY KEY (filename, source_key),
+            FOREIGN KEY (med_id) REFERENCES med_info(med_id) ON DELETE CASCADE
+        ) WITHOUT ROWID"""),
+    ("Schedule", """
+        CREATE TABLE IF NOT EXISTS schedule (
+            schedule_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            med_id INTEGER,
+            consumption_start TEXT,
+            consumption_end TEXT,
+            frequency TEXT,
+            user_id INTEGER REFERENCES user(user_id) ON DELETE CASCADE,
+            FOREIGN KEY (med_id) REFERENCES med_info(med_id) ON DELETE CASCADE
+        )"""),
+    # One row per lot. Migration 7 adds the stock_movement ledger that changes quantity
+    # and the stock_on_hand totals its triggers keep per user and medicine
+    ("Inventory", """
+        CREATE TABLE IF NOT EXISTS inventory (
+            inventory_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            med_id INTEGER,
+            quantity INTEGER,
+            expiration TEXT,
+            user_id INTEGER REFERENCES user(user_id) ON DELETE CASCADE,
+            FOREIGN KEY (med_id) REFERENCES med_info(med_id) ON DELETE CASCADE
+        )"""),
+)
+
+
+def create_tables(cursor):
+    """Create any missing tables; see medassist.migrations for bringing older ones up to date"""
+    for label, sql in TABLES:
+        cursor.execute(sql)
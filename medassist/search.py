@@ -0,0 +1,421 @@
+"""Medicine catalog search backed by an FTS5 index, with a LIKE fallback"""
+import re
+import sqlite3
+import sys
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from medassist.schema import MED_INFO_COLUMNS
+
+FTS_TABLE = "med_info_fts"
+
+# bm25 weights per column: name matches rank highest, then category/manufacturer
+BM25_WEIGHTS = (10.0, 4.0, 1.0, 1.0, 4.0, 2.0, 1.0)
+
+MEDICINE_SELECT_COLUMNS = "med_id, " + ", ".join(MED_INFO_COLUMNS)
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Substring scans stop counting here when an approximate count is acceptable
+APPROXIMATE_COUNT_CAP = 10000
+
+# Memory budget for cached result pages, see PageCache
+PAGE_CACHE_BYTES = 4 * 1024 * 1024
+
+# Bumped by every med_info mutation made through the app; see catalog_changed()
+_catalog_version = 0
+
+_COLUMN_LIST = ", ".join(MED_INFO_COLUMNS)
+_NEW_VALUES = ", ".join(f"new.{column}" for column in MED_INFO_COLUMNS)
+_OLD_VALUES = ", ".join(f"old.{column}" for column in MED_INFO_COLUMNS)
+
+FTS_TABLE_SQL = f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        {_COLUMN_LIST},
+        content='med_info',
+        content_rowid='med_id',
+        prefix='2 3'
+    )"""
+
+FTS_INSERT_TRIGGER_SQL = f"""
+    CREATE TRIGGER IF NOT EXISTS med_info_fts_ai AFTER INSERT ON med_info BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, {_COLUMN_LIST}) VALUES (new.med_id, {_NEW_VALUES});
+    END"""
+
+FTS_SCHEMA = [
+    FTS_TABLE_SQL,
+    FTS_INSERT_TRIGGER_SQL,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS med_info_fts_ad AFTER DELETE ON med_info BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_COLUMN_LIST})
+        VALUES ('delete', old.med_id, {_OLD_VALUES});
+    END""",
+    f"""
+    CREATE TRIGGER IF NOT EXISTS med_info_fts_au AFTER UPDATE ON med_info BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_COLUMN_LIST})
+        VALUES ('delete', old.med_id, {_OLD_VALUES});
+        INSERT INTO {FTS_TABLE}(rowid, {_COLUMN_LIST}) VALUES (new.med_id, {_NEW_VALUES});
+    END""",
+]
+
+FTS_COUNT_SQL = f"SELECT COUNT(*) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH ?"
+# Parameters: (match query, limit, offset)
+FTS_PAGE_SQL = f"""
+    SELECT {", ".join(f"m.{column}" for column in MEDICINE_SELECT_COLUMNS.split(", "))}
+    FROM {FTS_TABLE} JOIN med_info m ON m.med_id = {FTS_TABLE}.rowid
+    WHERE {FTS_TABLE} MATCH ?
+    ORDER BY bm25({FTS_TABLE}, {", ".join(str(weight) for weight in BM25_WEIGHTS)}), m.med_name
+    LIMIT ? OFFSET ?
+"""
+
+
+def ensure_fts_index(conn):
+    """Create the FTS5 index and its sync triggers, populating it on first creation
+
+    Returns False when this SQLite build has no FTS5 support, in which case
+    search falls back to LIKE scans.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (FTS_TABLE,))
+    created = cursor.fetchone() is None
+    try:
+        for statement in FTS_SCHEMA:
+            cursor.execute(statement)
+    except sqlite3.OperationalError as e:
+        print(f"Full-text search unavailable, using LIKE search: {e}")
+        return False
+    if created:
+        # Index medicines that were inserted before the triggers existed
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    conn.commit()
+    return True
+
+
+def fts_enabled(cursor):
+    """Whether the database has a usable FTS5 index"""
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (FTS_TABLE,))
+    return cursor.fetchone() is not None
+
+
+@contextmanager
+def bulk_fts_insert(cursor, first_med_id):
+    """Index medicines inserted inside the block with one statement instead of per-row triggers
+
+    Every row inserted in the block must have med_id >= first_med_id. Must be
+    used inside a transaction: if the block raises, rolling back restores the
+    dropped trigger.
+    """
+    if not fts_enabled(cursor):
+        yield
+        return
+    cursor.execute("DROP TRIGGER IF EXISTS med_info_fts_ai")
+    yield
+    cursor.execute(f"""
+        INSERT INTO {FTS_TABLE}(rowid, {_COLUMN_LIST})
+        SELECT med_id, {_COLUMN_LIST} FROM med_info WHERE med_id >= ?
+    """, (first_med_id,))
+    cursor.execute(FTS_INSERT_TRIGGER_SQL)
+
+
+def build_match_query(text):
+    """Turn free text into an FTS5 query matching every word as a prefix
+
+    'ibu 200' becomes '"ibu"* AND "200"*'. Returns None when the text holds
+    no searchable words.
+    """
+    tokens = _TOKEN_RE.findall(text)
+    if not tokens:
+        return None
+    return " AND ".join(f'"{token}"*' for token in tokens)
+
+
+def like_filter(text):
+    """WHERE clause and parameters for the substring search fallback"""
+    clause = " OR ".join(f"{column} LIKE ?" for column in MED_INFO_COLUMNS)
+    return clause, [f"%{text}%"] * len(MED_INFO_COLUMNS)
+
+
+def catalog_changed():
+    """Record that med_info was modified, invalidating every CountCache"""
+    global _catalog_version
+    _catalog_version += 1
+
+
+def normalize_query(text):
+    """Canonical form of search text, used as the count cache key"""
+    return " ".join(text.split()).lower()
+
+
+def count_medicines(cursor, text="", approximate=False, use_fts=None):
+    """Number of medicines matching the search text (all medicines when empty)
+
+    Returns (count, exact). With approximate=True the LIKE fallback stops
+    scanning after APPROXIMATE_COUNT_CAP matches and reports exact=False.
+    use_fts=None looks up whether the FTS index exists on every call;
+    long-lived callers can check fts_enabled() once and pass the result.
+    """
+    if not text:
+        cursor.execute("SELECT COUNT(*) FROM med_info")
+        return cursor.fetchone()[0], True
+
+    if use_fts is None:
+        use_fts = fts_enabled(cursor)
+    if use_fts:
+        match = build_match_query(text)
+        if match is None:
+            return 0, True
+        try:
+            cursor.execute(FTS_COUNT_SQL, (match,))
+            return cursor.fetchone()[0], True
+        except sqlite3.OperationalError:
+            pass  # FTS5 module missing from this build; fall back to LIKE
+
+    clause, params = like_filter(text)
+    if approximate:
+        cursor.execute(f"""
+            SELECT COUNT(*) FROM (SELECT 1 FROM med_info WHERE {clause} LIMIT ?)
+        """, params + [APPROXIMATE_COUNT_CAP])
+        count = cursor.fetchone()[0]
+        return count, count < APPROXIMATE_COUNT_CAP
+    cursor.execute(f"SELECT COUNT(*) FROM med_info WHERE {clause}", params)
+    return cursor.fetchone()[0], True
+
+
+def catalog_stamp(cursor):
+    """(in-process catalog version, PRAGMA data_version) as seen by this connection"""
+    # data_version only reads the database header, no table pages
+    cursor.execute("PRAGMA data_version")
+    return (_catalog_version, cursor.fetchone()[0])
+
+
+class CountCache:
+    """Remembers match counts per normalized query until the catalog changes
+
+    Entries are dropped when catalog_changed() is called in this process or
+    when PRAGMA data_version shows a commit from another connection, such as
+    another terminal. Use one cache per connection.
+    """
+
+    def __init__(self, max_entries=128, approximate=False, use_fts=None):
+        self.max_entries = max_entries
+        self.approximate = approximate
+        self.use_fts = use_fts
+        self._counts = OrderedDict()
+        self._version = None
+
+    def invalidate(self):
+        """Forget every cached count"""
+        self._counts.clear()
+        self._version = None
+
+    def count(self, cursor, text=""):
+        """Cached (count, exact) for the search text"""
+        version = catalog_stamp(cursor)
+        if version != self._version:
+            self._counts.clear()
+            self._version = version
+
+        key = normalize_query(text)
+        if key in self._counts:
+            self._counts.move_to_end(key)
+            return self._counts[key]
+
+        result = count_medicines(cursor, text, self.approximate, self.use_fts)
+        self._counts[key] = result
+        if len(self._counts) > self.max_entries:
+            self._counts.popitem(last=False)
+        return result
+
+
+def estimate_page_bytes(rows):
+    """Rough memory held by a page of rows, for the PageCache budget"""
+    size = sys.getsizeof(rows)
+    for row in rows:
+        if hasattr(row, "estimated_size"):
+            size += row.estimated_size()
+        else:
+            size += sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row)
+    return size
+
+
+class PageCache:
+    """LRU of fetched result pages keyed by (query, sort, page, page size), bounded by bytes
+
+    The UI thread reads it to flip pages without a query while the search
+    worker fills it and prefetches neighbouring pages, so every method takes
+    a lock. Entries are dropped when catalog_changed() is called in this
+    process, or when validate() sees a commit from another connection.
+    """
+
+    def __init__(self, max_bytes=PAGE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self._pages = OrderedDict()
+        self._catalog_version = _catalog_version
+        self._data_version = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(text, sort, page, page_size):
+        return (normalize_query(text), sort, page, page_size)
+
+    def invalidate(self):
+        """Forget every cached page"""
+        with self._lock:
+            self._clear()
+
+    def _clear(self):
+        self._pages.clear()
+        self.size_bytes = 0
+        self._catalog_version = _catalog_version
+
+    def _check_catalog(self):
+        if self._catalog_version != _catalog_version:
+            self._clear()
+
+    def validate(self, cursor):
+        """Drop every page if another connection committed since the last call"""
+        data_version = catalog_stamp(cursor)[1]
+        with self._lock:
+            if data_version != self._data_version:
+                self._clear()
+                self._data_version = data_version
+
+    def __contains__(self, key):
+        with self._lock:
+            self._check_catalog()
+            return key in self._pages
+
+    def get(self, key):
+        """Cached (total, exact, rows) for the key, or None"""
+        with self._lock:
+            self._check_catalog()
+            entry = self._pages.get(key)
+            if entry is None:
+                return None
+            self._pages.move_to_end(key)
+            return entry[:3]
+
+    def put(self, key, total, exact, rows):
+        """Remember a page, evicting the least recently used ones past the byte budget"""
+        size = estimate_page_bytes(rows)
+        with self._lock:
+            self._check_catalog()
+            if size > self.max_bytes:
+                return
+            old = self._pages.pop(key, None)
+            if old is not None:
+                self.size_bytes -= old[3]
+            self._pages[key] = (total, exact, rows, size)
+            self.size_bytes += size
+            while self.size_bytes > self.max_bytes:
+                evicted = self._pages.popitem(last=False)[1]
+                self.size_bytes -= evicted[3]
+
+
+def result_order(text, use_fts):
+    """Sort applied to a search: bm25 relevance for full-text matches, otherwise name"""
+    return "relevance" if text and use_fts else "name"
+
+
+def page_key(row):
+    """Keyset position (med_name, med_id) of a row returned by fetch_medicines"""
+    return (row[1], row[0])
+
+
+def name_ordered_page_sql(where="", direction=None):
+    """SQL for a page of medicines ordered by (med_name, med_id), see _name_ordered_page
+
+    Parameters: those of where, then the seek key (med_name, med_id) when
+    direction is "after", "from" or "before", then limit and offset.
+    """
+    conditions = [f"({where})"] if where else []
+    if direction is not None:
+        operator = {"after": ">", "from": ">=", "before": "<"}[direction]
+        conditions.append(f"(med_name, med_id) {operator} (?, ?)")
+    order = "DESC" if direction == "before" else "ASC"
+    where_sql = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    return f"""
+        SELECT {MEDICINE_SELECT_COLUMNS} FROM med_info
+        {where_sql}
+        ORDER BY med_name {order}, med_id {order} LIMIT ? OFFSET ?
+    """
+
+
+def _name_ordered_page(cursor, where, params, limit, offset, seek):
+    """Page of medicines ordered by (med_name, med_id)
+
+    With a seek of ("after", key), ("from", key) or ("before", key) the page
+    starts from that position in the idx_med_info_name index, so every page
+    costs the same no matter how deep it is. Without one, falls back to OFFSET.
+    """
+    params = list(params)
+    direction = None
+    if seek is not None:
+        direction, key = seek
+        params.extend(key)
+        offset = 0
+    cursor.execute(name_ordered_page_sql(where, direction), params + [limit, offset])
+    rows = cursor.fetchall()
+    if direction == "before":
+        rows.reverse()
+    return rows
+
+
+def fetch_medicines(cursor, text="", limit=10, offset=0, seek=None, use_fts=None):
+    """One page of medicines matching the search text
+
+    Full-text matches are ordered by bm25 relevance and paged by offset
+    within the match set. The unfiltered list and the LIKE fallback are
+    ordered by (med_name, med_id) and use keyset paging when a seek
+    position is given (see _name_ordered_page). use_fts works as in
+    count_medicines.
+    """
+    if not text:
+        return _name_ordered_page(cursor, "", [], limit, offset, seek)
+
+    if use_fts is None:
+        use_fts = fts_enabled(cursor)
+    if use_fts:
+        match = build_match_query(text)
+        if match is None:
+            return []
+        try:
+            cursor.execute(FTS_PAGE_SQL, (match, limit, offset))
+            return cursor.fetchall()
+        except sqlite3.OperationalError:
+            pass  # FTS5 module missing from this build; fall back to LIKE
+
+    clause, params = like_filter(text)
+    return _name_ordered_page(cursor, clause, params, limit, offset, seek)
+
+
+def select_matching(cursor, text="", use_fts=None):
+    """Run a query for every medicine matching the search text, ordered by (med_name, med_id)
+
+    Rows are left on the cursor for the caller to stream with fetchmany()
+    instead of being fetched into a list. Matches are the same as
+    fetch_medicines returns for the text; use_fts works as in count_medicines.
+    """
+    order = "ORDER BY med_name, med_id"
+    if not text:
+        return cursor.execute(f"SELECT {MEDICINE_SELECT_COLUMNS} FROM med_info {order}")
+
+    if use_fts is None:
+        use_fts = fts_enabled(cursor)
+    if use_fts:
+        match = build_match_query(text)
+        if match is None:
+            return cursor.execute(f"SELECT {MEDICINE_SELECT_COLUMNS} FROM med_info WHERE 0")
+        try:
+            return cursor.execute(f"""
+                SELECT {MEDICINE_SELECT_COLUMNS} FROM med_info
+                WHERE med_id IN (SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH ?)
+                {order}
+            """, (match,))
+        except sqlite3.OperationalError:
+            pass  # FTS5 module missing from this build; fall back to LIKE
+
+    clause, params = like_filter(text)
+    return cursor.execute(f"SELECT {MEDICINE_SELECT_COLUMNS} FROM med_info WHERE {clause} {order}", params)
@@ -0,0 +1,162 @@
+"""Cold start benchmark for the MedAssist app
+
+Every run starts a fresh interpreter that imports the app, builds it and
+stops at the first frame of the login screen, recording how long each
+step took and how much memory was resident at that point:
+
+    python -m medassist.startup_benchmark --runs 5 --out startup.json
+    python -m medassist.startup_benchmark --eager
+
+--eager also builds every screen up front, as the app did before screens
+were built on first navigation, so both can be compared on one checkout.
+Needs a display (or a headless window provider) for Kivy.
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from medassist.benchmark import environment, summarize
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(REPO_DIR, "MedAssist_System (Final Code).py")
+DEFAULT_RUNS = 5
+
+
+def resident_kib():
+    """Resident memory of this process in KiB, or None where it cannot be read"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None  # Windows
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak  # macOS reports bytes
+
+
+def probe(app_path, out_path, eager):
+    """Run in the child: start the app, write the measurements at the first frame, then stop"""
+    import importlib.util
+
+    start = time.perf_counter()
+    spec = importlib.util.spec_from_file_location("medassist_app", app_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    imported = time.perf_counter()
+
+    from kivy.clock import Clock
+
+    class ProbeApp(module.MedicineApp):
+        def build(self):
+            build_start = time.perf_counter()
+            root = super().build()
+            if eager:
+                # Older checkouts without lazy screens have already built everything
+                for name in list(getattr(self.screen_manager, "factories", ())):
+                    self.screen_manager.get_screen(name)
+            self.build_seconds = time.perf_counter() - build_start
+            return root
+
+        def on_start(self):
+            super().on_start()
+            Clock.schedule_once(self.first_frame)
+
+        def first_frame(self, dt):
+            result = {
+                "wall_time": time.time(),
+                "import_s": imported - start,
+                "build_s": self.build_seconds,
+                "first_frame_s": time.perf_counter() - start,
+                "rss_kib": resident_kib(),
+                "screens_built": len(self.screen_manager.screens),
+            }
+            with open(out_path, "w", encoding="utf-8") as f:
+                json.dump(result, f)
+            self.stop()
+
+    ProbeApp().run()
+
+
+def run_once(app_path, workdir, eager):
+    """Start the app in a new interpreter; returns its measurements"""
+    fd, out_path = tempfile.mkstemp(suffix=".json")
+    os.close(fd)
+    env = dict(os.environ, KIVY_NO_ARGS="1", PYTHONPATH=os.pathsep.join(
+        path for path in (REPO_DIR, os.environ.get("PYTHONPATH")) if path
+    ))
+    command = [sys.executable, "-m", "medassist.startup_benchmark", "--probe", out_path, "--app", app_path]
+    if eager:
+        command.append("--eager")
+    try:
+        spawned = time.time()
+        process = subprocess.run(command, cwd=workdir, env=env, capture_output=True, text=True, timeout=300)
+        with open(out_path, encoding="utf-8") as f:
+            text = f.read()
+        if not text:
+            raise RuntimeError(f"App did not reach its first frame:\n{process.stderr[-2000:]}")
+        result = json.loads(text)
+    finally:
+        os.remove(out_path)
+    # Interpreter start-up included, as a user launching the app would see it
+    result["launch_to_first_frame_s"] = result.pop("wall_time") - spawned
+    return result
+
+
+def run_mode(app_path, workdir, runs, eager):
+    """Summaries for one start-up mode over several runs"""
+    results = [run_once(app_path, workdir, eager) for _ in range(runs)]
+    summary = {
+        name: summarize([result[f"{name}_s"] for result in results])
+        for name in ("import", "build", "first_frame", "launch_to_first_frame")
+    }
+    rss = [result["rss_kib"] for result in results if result["rss_kib"] is not None]
+    summary["rss_kib"] = {"median": sorted(rss)[len(rss) // 2]} if rss else None
+    summary["screens_built"] = results[-1]["screens_built"]
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure MedAssist cold start time and memory")
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS)
+    parser.add_argument("--eager", action="store_true", help="also measure building every screen up front")
+    parser.add_argument("--workdir", help="directory with the database and medicine.csv (default: empty temp dir)")
+    parser.add_argument("--app", default=APP_PATH, help=argparse.SUPPRESS)
+    parser.add_argument("--probe", metavar="OUT", help=argparse.SUPPRESS)
+    parser.add_argument("--out", help="write JSON here instead of stdout")
+    args = parser.parse_args(argv)
+
+    if args.probe:
+        probe(args.app, args.probe, args.eager)
+        return 0
+
+    report = {"environment": environment(), "results": {}}
+    workdir = args.workdir or tempfile.mkdtemp()
+    try:
+        print(f"Measuring lazy start-up ({args.runs} runs)...", file=sys.stderr)
+        report["results"]["lazy"] = run_mode(args.app, workdir, args.runs, False)
+        if args.eager:
+            print(f"Measuring eager start-up ({args.runs} runs)...", file=sys.stderr)
+            report["results"]["eager"] = run_mode(args.app, workdir, args.runs, True)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,232 @@
+"""User accounts, salted password hashes and login sessions
+
+Passwords are stored as "scheme$parameters$salt$hash". The work factor is
+part of the stored value, so raising it (see medassist.login_benchmark)
+only affects new hashes; older ones are rehashed at their next login, as
+are passwords from before hashing, which migration 6 marked "plain$".
+"""
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+from medassist.db import run_write, run_writes
+
+SCHEMES = ("scrypt", "pbkdf2_sha256")
+
+# scrypt needs OpenSSL 1.1+; PBKDF2 is always available
+PASSWORD_SCHEME = os.environ.get(
+    "MEDASSIST_PASSWORD_SCHEME", "scrypt" if hasattr(hashlib, "scrypt") else "pbkdf2_sha256"
+).lower()
+
+# Work factors; pick them with python -m medassist.login_benchmark on the kiosk itself
+SCRYPT_N = int(os.environ.get("MEDASSIST_SCRYPT_N", "32768"))  # 32 MiB of memory per hash
+SCRYPT_R = 8
+SCRYPT_P = 1
+PBKDF2_ITERATIONS = int(os.environ.get("MEDASSIST_PBKDF2_ITERATIONS", "600000"))
+
+if PASSWORD_SCHEME not in SCHEMES:
+    raise ValueError(f"MEDASSIST_PASSWORD_SCHEME must be one of {list(SCHEMES)}, not {PASSWORD_SCHEME!r}")
+
+SALT_BYTES = 16
+HASH_BYTES = 32
+
+# Prefix of passwords stored before hashing; see migration 6
+LEGACY_SCHEME = "plain"
+
+# Seconds a session stays valid without being used
+SESSION_TTL = 8 * 60 * 60
+
+# Recent successful logins remembered by VerificationCache, and for how many seconds
+VERIFY_CACHE_SIZE = 64
+VERIFY_CACHE_TTL = 5 * 60
+
+FIND_USER = "SELECT user_id, password FROM user WHERE username = ?"
+INSERT_USER = "INSERT INTO user (username, password) VALUES (?, ?)"
+# Only replaces the hash that was verified, in case another terminal changed it meanwhile
+REHASH_USER = "UPDATE user SET password = ? WHERE user_id = ? AND password = ?"
+
+# Rows left without an owner by a database that had no accounts at migration 5
+CLAIM_UNOWNED = tuple(
+    f"UPDATE {table} SET user_id = (SELECT user_id FROM user WHERE username = ?) WHERE user_id IS NULL"
+    for table in ("schedule", "inventory")
+)
+
+RESOLVE_SESSION = "SELECT user_id, expires_at FROM session WHERE token_hash = ?"
+INSERT_SESSION = "INSERT INTO session (token_hash, user_id, expires_at) VALUES (?, ?, ?)"
+TOUCH_SESSION = "UPDATE session SET expires_at = ? WHERE token_hash = ?"
+DELETE_SESSION = "DELETE FROM session WHERE token_hash = ?"
+PURGE_SESSIONS = "DELETE FROM session WHERE expires_at < ?"
+
+
+def scheme_parameters(scheme=None):
+    """Current work factors of a scheme, as stored in its hashes"""
+    scheme = scheme or PASSWORD_SCHEME
+    if scheme == "scrypt":
+        return (SCRYPT_N, SCRYPT_R, SCRYPT_P)
+    return (PBKDF2_ITERATIONS,)
+
+
+def derive_key(scheme, parameters, password, salt):
+    """Raw hash of password under a scheme and its work factors"""
+    if scheme == "scrypt":
+        n, r, p = parameters
+        # OpenSSL refuses more than 32 MiB unless maxmem allows it
+        return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                              maxmem=128 * r * (n + p + 2) + 1024 * 1024, dklen=HASH_BYTES)
+    if scheme == "pbkdf2_sha256":
+        (iterations,) = parameters
+        return hashlib.pbkdf2_hmac("sha256", password.encode(), salt, iterations, HASH_BYTES)
+    raise ValueError(f"Unknown password scheme {scheme!r}")
+
+
+def hash_password(password, scheme=None, parameters=None):
+    """Salted hash of password to store in user.password"""
+    scheme = scheme or PASSWORD_SCHEME
+    parameters = parameters or scheme_parameters(scheme)
+    salt = os.urandom(SALT_BYTES)
+    key = derive_key(scheme, parameters, password, salt)
+    return "$".join([scheme] + [str(value) for value in parameters] + [salt.hex(), key.hex()])
+
+
+def verify_password(password, stored):
+    """(matches, needs_rehash) for a password against a stored value
+
+    needs_rehash is true for legacy plain text and for hashes made with
+    another scheme or work factor than the current ones. A stored value
+    that cannot be parsed never matches.
+    """
+    scheme, _, rest = stored.partition("$")
+    if scheme == LEGACY_SCHEME:
+        return hmac.compare_digest(rest.encode(), password.encode()), True
+    if scheme not in SCHEMES:
+        return False, True
+    try:
+        *parameters, salt, key = rest.split("$")
+        parameters = tuple(int(value) for value in parameters)
+        derived = derive_key(scheme, parameters, password, bytes.fromhex(salt))
+        key = bytes.fromhex(key)
+    except ValueError:
+        # Wrong field count, non-numeric work factor, bad hex or parameters hashlib refuses
+        return False, True
+    return hmac.compare_digest(derived, key), (scheme, parameters) != (PASSWORD_SCHEME, scheme_parameters())
+
+
+@lru_cache(maxsize=1)
+def _dummy_hash():
+    return hash_password(secrets.token_hex(16))
+
+
+class VerificationCache:
+    """Bounded, expiring memory of recent successful logins
+
+    Lets a user who logs out and straight back in at the kiosk skip the
+    deliberately slow hash. Entries hold an HMAC of the password under a
+    key that only lives in this process, never the password, and are
+    tied to the stored hash, so a password change invalidates them.
+    """
+
+    def __init__(self, maxsize=VERIFY_CACHE_SIZE, ttl=VERIFY_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._key = secrets.token_bytes(32)
+        self._entries = OrderedDict()  # username -> (stored hash, password digest, expires)
+        self._lock = threading.Lock()
+
+    def _digest(self, password):
+        return hmac.new(self._key, password.encode(), hashlib.sha256).digest()
+
+    def check(self, username, password, stored):
+        """Whether password was verified against stored within the last ttl seconds"""
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is None or entry[0] != stored or entry[2] < time.monotonic():
+                return False
+            self._entries.move_to_end(username)
+        return hmac.compare_digest(entry[1], self._digest(password))
+
+    def add(self, username, password, stored):
+        with self._lock:
+            self._entries[username] = (stored, self._digest(password), time.monotonic() + self.ttl)
+            self._entries.move_to_end(username)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
+def authenticate(conn, username, password, cache=None):
+    """user_id for matching credentials, or None
+
+    Rehashes the stored password when it is legacy plain text or uses an
+    outdated work factor. Unknown usernames and legacy rows still cost one
+    hash, so they cannot be told apart from wrong passwords by timing.
+    """
+    row = conn.execute(FIND_USER, (username,)).fetchone()
+    if row is None:
+        verify_password(password, _dummy_hash())
+        return None
+    user_id, stored = row
+    if cache is not None and cache.check(username, password, stored):
+        return user_id
+    matches, needs_rehash = verify_password(password, stored)
+    if not matches:
+        if stored.startswith(LEGACY_SCHEME + "$"):
+            verify_password(password, _dummy_hash())  # As slow as a hashed account
+        return None
+    if needs_rehash:
+        rehashed = hash_password(password)
+        if run_write(conn, REHASH_USER, (rehashed, user_id, stored)).rowcount:
+            stored = rehashed
+    if cache is not None:
+        cache.add(username, password, stored)
+    return user_id
+
+
+def register_user(conn, username, password):
+    """Create an account and give it any unowned rows; returns its user_id
+
+    Raises sqlite3.IntegrityError when the username is taken.
+    """
+    run_writes(conn, [(INSERT_USER, (username, hash_password(password)))] + [
+        (sql, (username,)) for sql in CLAIM_UNOWNED
+    ])
+    return conn.execute("SELECT user_id FROM user WHERE username = ?", (username,)).fetchone()[0]
+
+
+def _token_hash(token):
+    # Tokens are random, so a fast hash suffices; the table never holds a usable token
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def create_session(conn, user_id, ttl=SESSION_TTL):
+    """Start a session for user_id, clearing expired ones; returns its token"""
+    token = secrets.token_urlsafe(32)
+    now = time.time()
+    run_writes(conn, [(PURGE_SESSIONS, (now,)), (INSERT_SESSION, (_token_hash(token), user_id, now + ttl))])
+    return token
+
+
+def resolve_session(conn, token, ttl=SESSION_TTL):
+    """user_id of a live session, or None once it has expired or ended
+
+    Using a session extends it; the expiry is only written back once half
+    of ttl has passed, so most calls are a single primary key read.
+    """
+    if not token:
+        return None
+    key = _token_hash(token)
+    row = conn.execute(RESOLVE_SESSION, (key,)).fetchone()
+    now = time.time()
+    if row is None or row[1] < now:
+        return None
+    if row[1] - now < ttl / 2:
+        run_write(conn, TOUCH_SESSION, (now + ttl, key))
+    return row[0]
+
+
+def end_session(conn, token):
+    if token:
+        run_write(conn, DELETE_SESSION, (_token_hash(token),))
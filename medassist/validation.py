@@ -0,0 +1,111 @@
+"""Validation and normalization of rows coming from CSV files or the app"""
+import re
+from datetime import date, datetime
+
+# Canonical classification for each accepted spelling (matched case-insensitively)
+CLASSIFICATIONS = {
+    "prescription": "Prescription",
+    "rx": "Prescription",
+    "over-the-counter": "Over-the-Counter",
+    "over the counter": "Over-the-Counter",
+    "otc": "Over-the-Counter",
+}
+
+# Canonical unit for each accepted spelling (matched case-insensitively)
+STRENGTH_UNITS = {
+    "mg": "mg",
+    "g": "g",
+    "mcg": "mcg",
+    "µg": "mcg",
+    "ug": "mcg",
+    "ml": "mL",
+    "iu": "IU",
+    "units": "IU",
+    "%": "%",
+    "mg/ml": "mg/mL",
+    "mg/5ml": "mg/5mL",
+}
+
+_STRENGTH_RE = re.compile(r"(\d+(?:\.\d+)?)\s*(\S.*?)")
+
+
+class RowError(ValueError):
+    """A row that cannot be stored; the message says why"""
+
+
+def _clean(value):
+    """Strip whitespace and turn empty fields into None"""
+    if value is None:
+        return None
+    value = " ".join(value.split())
+    return value or None
+
+
+def parse_strength(text):
+    """(canonical text, numeric value, unit) for a strength such as "938 mg" or "5MG"
+
+    Free-text strengths that do not start with a number, such as "Varies",
+    are kept as they are with no value or unit. A number followed by an
+    unknown unit raises RowError.
+    """
+    text = _clean(text)
+    if text is None:
+        return None, None, None
+    match = _STRENGTH_RE.fullmatch(text)
+    if match is None:
+        if text[0].isdigit():
+            raise RowError(f"Strength {text!r} has no unit")
+        return text, None, None
+    number, unit = match.groups()
+    canonical_unit = STRENGTH_UNITS.get(unit.lower())
+    if canonical_unit is None:
+        raise RowError(f"Unknown strength unit {unit!r}")
+    value = float(number)
+    if canonical_unit == "%":
+        return f"{number}%", value, canonical_unit
+    return f"{number} {canonical_unit}", value, canonical_unit
+
+
+def normalize_classification(text):
+    """Canonical classification, None for an empty field; RowError for anything else"""
+    text = _clean(text)
+    if text is None:
+        return None
+    try:
+        return CLASSIFICATIONS[text.lower()]
+    except KeyError:
+        raise RowError(f"Unknown classification {text!r}") from None
+
+
+def normalize_date(value):
+    """Canonical 'YYYY-MM-DD' text for a date, None for an empty field; RowError otherwise
+
+    Dates are stored as zero-padded ISO text so they sort and compare as
+    strings, which lets range queries use an index. strptime alone would
+    also accept '2025-1-5'.
+    """
+    if isinstance(value, date):
+        return value.isoformat()
+    value = _clean(value)
+    if value is None:
+        return None
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date().isoformat()
+    except ValueError:
+        raise RowError(f"Invalid date {value!r} (use YYYY-MM-DD)") from None
+
+
+def validate_medicine_row(row):
+    """Normalized med_info values plus (strength_value, strength_unit) for a 7-column row
+
+    Raises RowError when the row cannot be stored.
+    """
+    name, med_type, dosage_form, strength, manufacturer, indication, classification = row
+    name = _clean(name)
+    if name is None:
+        raise RowError("Medicine name is required")
+    strength, strength_value, strength_unit = parse_strength(strength)
+    return (
+        name, _clean(med_type), _clean(dosage_form), strength, _clean(manufacturer),
+        _clean(indication), normalize_classification(classification), strength_value, strength_unit
+    )
@@ -0,0 +1,83 @@
+"""Syncing medicine.csv into a live catalog"""
+import os
+import tempfile
+import unittest
+
+from medassist.csv_import import apply_keyed_rows, key_rows, sync_medicine_csv, validate_chunk
+from medassist.db import connect
+from medassist.migrations import migrate
+from medassist.schema import create_tables
+
+HEADER = "Name,Category,Dosage Form,Strength,Manufacturer,Indication,Classification\n"
+
+
+class RekeyTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "medicine.csv")
+        self.conn = connect(":memory:")
+        create_tables(self.conn.cursor())
+        self.conn.commit()
+        migrate(self.conn)
+
+    def tearDown(self):
+        self.conn.close()
+        self.dir.cleanup()
+
+    def sync(self, *rows):
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write(HEADER + "".join(row + "\n" for row in rows))
+        return sync_medicine_csv(self.conn, self.path, force=True)
+
+    def med_ids(self):
+        return dict(self.conn.execute("SELECT med_name, med_id FROM med_info"))
+
+    def test_renamed(self):
+        self.sync("Amoxil,Antibiotic,Tablet,500 mg,Pfizer Inc.,Infection,Prescription")
+        before = self.med_ids()["Amoxil"]
+        stats = self.sync("Amoxicillin,Antibiotic,Tablet,500 mg,Pfizer Inc.,Infection,Prescription")
+        self.assertEqual((stats.inserted, stats.updated, stats.deleted), (0, 1, 0))
+        self.assertEqual(self.med_ids(), {"Amoxicillin": before})
+
+    def test_new_strength_is_new_medicine(self):
+        self.sync("Amoxil,Antibiotic,Tablet,500 mg,Pfizer Inc.,Infection,Prescription")
+        stats = self.sync("Amoxil,Antibiotic,Tablet,250 mg,Pfizer Inc.,Infection,Prescription")
+        self.assertEqual((stats.inserted, stats.updated, stats.deleted), (1, 0, 1))
+
+    def test_new_manufacturer_is_new_medicine(self):
+        self.sync("Amoxil,Antibiotic,Tablet,500 mg,Pfizer Inc.,Infection,Prescription")
+        stats = self.sync("Amoxil,Antibiotic,Tablet,500 mg,Roche Holding AG,Infection,Prescription")
+        self.assertEqual((stats.inserted, stats.updated, stats.deleted), (1, 0, 1))
+
+    def test_ambiguous_rename(self):
+        self.sync(
+            "Amoxil,Antibiotic,Tablet,500 mg,Pfizer Inc.,Infection,Prescription",
+            "Amoxyl,Antibiotic,Tablet,500 mg,Pfizer Inc.,Infection,Prescription",
+        )
+        before = set(self.med_ids().values())
+        stats = self.sync("Amoxicillin,Antibiotic,Tablet,500 mg,Pfizer Inc.,Infection,Prescription")
+        self.assertEqual((stats.inserted, stats.updated, stats.deleted), (1, 0, 2))
+        self.assertNotIn(self.med_ids()["Amoxicillin"], before)
+
+
+class SyncSettingsTest(unittest.TestCase):
+    def test_keeps_connection_pragmas(self):
+        conn = connect(":memory:")
+        self.addCleanup(conn.close)
+        create_tables(conn.cursor())
+        conn.commit()
+        migrate(conn)
+        synchronous = conn.execute("PRAGMA synchronous").fetchone()[0]
+        seen = []
+
+        def rows():
+            seen.append(conn.execute("PRAGMA synchronous").fetchone()[0])
+            row = ("Amoxil", "Antibiotic", "Tablet", "500 mg", "Pfizer Inc.", "Infection", "Prescription")
+            yield from key_rows(validate_chunk([(2, row)])[0])
+
+        self.assertEqual(apply_keyed_rows(conn, "medicine.csv", rows(), 0, ""), (1, 0, 0, 0, 0))
+        self.assertEqual(seen, [synchronous])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+"""Schedules and inventory export only the requesting user's rows"""
+import csv
+import os
+import tempfile
+import unittest
+
+from medassist.db import connect
+from medassist.export import export_dataset
+from medassist.migrations import migrate
+from medassist.repository import InventoryRepository, MedicineRepository, ScheduleRepository
+from medassist.schema import create_tables
+
+
+class ExportTest(unittest.TestCase):
+    def setUp(self):
+        self.conn = connect(":memory:")
+        create_tables(self.conn.cursor())
+        self.conn.commit()
+        migrate(self.conn)
+        self.conn.executemany("INSERT INTO user (username, password) VALUES (?, 'x')", [("amy",), ("bob",)])
+        self.conn.commit()
+        med_id = MedicineRepository(self.conn).add("Amoxil")
+        ScheduleRepository(self.conn, 1).add(med_id, "2025-01-01", None, "Daily")
+        ScheduleRepository(self.conn, 2).add(med_id, "2025-02-01", None, "Twice a day")
+        InventoryRepository(self.conn, 1).add(med_id, 5, "2030-01-01")
+        InventoryRepository(self.conn, 2).add(med_id, 7, "2030-06-01")
+        self.dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.conn.close()
+        self.dir.cleanup()
+
+    def export(self, dataset, user_id):
+        path = os.path.join(self.dir.name, f"{dataset}.csv")
+        progress = []
+        stats = export_dataset(self.conn, dataset, path, user_id=user_id,
+                               progress=lambda written, total: progress.append(total))
+        with open(path, newline="", encoding="utf-8") as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual(stats.rows, len(rows))
+        self.assertEqual(progress, [len(rows)])
+        return rows
+
+    def test_schedules(self):
+        self.assertEqual([row["frequency"] for row in self.export("schedules", 1)], ["Daily"])
+        self.assertEqual([row["frequency"] for row in self.export("schedules", 2)], ["Twice a day"])
+
+    def test_inventory(self):
+        self.assertEqual([row["quantity"] for row in self.export("inventory", 1)], ["5"])
+        self.assertEqual([row["quantity"] for row in self.export("inventory", 2)], ["7"])
+
+    def test_medicines_shared(self):
+        self.assertEqual([row["med_name"] for row in self.export("medicines", 2)], ["Amoxil"])
+
+    def test_user_required(self):
+        with self.assertRaises(ValueError):
+            export_dataset(self.conn, "inventory", os.path.join(self.dir.name, "inventory.csv"))
+
+
+if __name__ == "__main__":
+    unittest.main()
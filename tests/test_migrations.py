@@ -0,0 +1,80 @@
+"""Upgrading a database created by the original app to the current schema"""
+import unittest
+
+from medassist.db import connect
+from medassist.migrations import LATEST_VERSION, migrate, schema_version
+from medassist.repository import InventoryRepository, MedicineRepository, StockRepository
+from medassist.schema import create_tables
+
+# Tables as the original app created them, before any migration
+BASELINE_TABLES = """
+    CREATE TABLE user (username TEXT PRIMARY KEY, password TEXT NOT NULL);
+    CREATE TABLE med_info (
+        med_id INTEGER PRIMARY KEY AUTOINCREMENT, med_name TEXT NOT NULL, med_type TEXT, dosage_form TEXT,
+        strength TEXT, manufacturer TEXT, indication TEXT, classification TEXT
+    );
+    CREATE TABLE csv_import_status (filename TEXT PRIMARY KEY, last_modified INTEGER);
+    CREATE TABLE schedule (
+        schedule_id INTEGER PRIMARY KEY AUTOINCREMENT, med_id INTEGER, consumption_start TEXT,
+        consumption_end TEXT, frequency TEXT,
+        FOREIGN KEY (med_id) REFERENCES med_info(med_id) ON DELETE CASCADE
+    );
+    CREATE TABLE inventory (
+        inventory_id INTEGER PRIMARY KEY AUTOINCREMENT, med_id INTEGER, quantity INTEGER, expiration TEXT,
+        FOREIGN KEY (med_id) REFERENCES med_info(med_id) ON DELETE CASCADE
+    );
+"""
+
+
+class NullQuantityUpgradeTest(unittest.TestCase):
+    """The original inventory table allowed lots without a quantity"""
+
+    def setUp(self):
+        self.conn = connect(":memory:")
+        self.conn.executescript(BASELINE_TABLES + """
+            INSERT INTO user VALUES ('amy', 'secret');
+            INSERT INTO med_info (med_name) VALUES ('Amoxil'), ('Brufen');
+            INSERT INTO inventory (med_id, quantity, expiration) VALUES
+                (1, NULL, '2030-01-01'), (1, 3, '2030-06-01'), (2, NULL, '2030-01-01');
+        """)
+        create_tables(self.conn.cursor())
+        self.conn.commit()
+        migrate(self.conn)
+        self.inventory = InventoryRepository(self.conn, 1)
+        self.stock = StockRepository(self.conn, 1)
+
+    def tearDown(self):
+        self.conn.close()
+
+    def level(self, med_id):
+        """(lots, on_hand) of a medicine, or None"""
+        level = self.stock.get(med_id)
+        return None if level is None else (level.lots, level.on_hand)
+
+    def test_upgrade(self):
+        self.assertEqual(schema_version(self.conn.cursor()), LATEST_VERSION)
+        self.assertEqual(self.level(1), (2, 3))
+        self.assertEqual(self.level(2), (1, 0))
+
+    def test_adjust_null_lot(self):
+        self.assertTrue(self.inventory.update(1, 1, 5, "2030-01-01"))
+        self.assertEqual(self.conn.execute("SELECT quantity FROM inventory WHERE inventory_id = 1").fetchone(), (5,))
+        self.assertEqual([(m.kind, m.quantity) for m in self.stock.history(1)], [("adjust", 5)])
+        self.assertEqual(self.level(1), (2, 8))
+
+    def test_move_null_lot(self):
+        self.assertTrue(self.inventory.update(1, 2, None, "2031-01-01"))
+        self.assertEqual(self.level(1), (1, 3))
+        self.assertEqual(self.level(2), (2, 0))
+
+    def test_delete_null_lot(self):
+        self.assertTrue(self.inventory.delete(1))
+        self.assertEqual(self.level(1), (1, 3))
+
+    def test_delete_medicine_with_null_lot(self):
+        self.assertTrue(MedicineRepository(self.conn).delete(2, 1))
+        self.assertIsNone(self.level(2))
+
+
+if __name__ == "__main__":
+    unittest.main()
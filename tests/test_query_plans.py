@@ -0,0 +1,38 @@
+"""The app's hot queries stay on indexes in a freshly built database"""
+import unittest
+
+from medassist.db import connect
+from medassist.migrations import migrate
+from medassist.query_plans import SEARCH_QUERIES, check_query_plans, hot_queries
+from medassist.schema import create_tables
+from medassist.search import ensure_fts_index
+
+
+class QueryPlanTest(unittest.TestCase):
+    def setUp(self):
+        self.conn = connect(":memory:")
+        create_tables(self.conn.cursor())
+        self.conn.commit()
+        migrate(self.conn)
+        self.has_fts = ensure_fts_index(self.conn)
+
+    def tearDown(self):
+        self.conn.close()
+
+    def test_no_regressions(self):
+        self.assertEqual(check_query_plans(self.conn), [])
+
+    def test_search_queries_checked(self):
+        if not self.has_fts:
+            self.skipTest("SQLite built without FTS5")
+        self.assertLessEqual(SEARCH_QUERIES.keys(), hot_queries(self.conn.cursor()).keys())
+
+    def test_detects_full_scan(self):
+        self.conn.execute("DROP INDEX idx_med_info_name")
+        names = {name for name, problem, detail in check_query_plans(self.conn)}
+        self.assertIn("duplicate name", names)
+        self.assertIn("medicine page after", names)
+
+
+if __name__ == "__main__":
+    unittest.main()
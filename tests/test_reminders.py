@@ -0,0 +1,73 @@
+"""Table-driven checks of reminders.parse_frequency, and the doses a recurrence gives"""
+import unittest
+from datetime import date, datetime, time
+
+from medassist.reminders import Recurrence, dose_times, next_occurrence, parse_frequency
+
+# frequency text -> expected Recurrence, or None for no reminders
+CASES = {
+    "Daily": Recurrence(dose_times(1), 1),
+    "Twice daily": Recurrence(dose_times(2), 1),
+    "2x daily": Recurrence(dose_times(2), 1),
+    "500 mg daily": Recurrence(dose_times(1), 1),
+    "bid": Recurrence(dose_times(2), 1),
+    "qod": Recurrence(dose_times(1), 2),
+    "Every other day": Recurrence(dose_times(1), 2),
+    "Weekly": Recurrence(dose_times(1), 7),
+    "Twice a week": Recurrence(dose_times(1), 7, (0, 3)),
+    "3 times a week": Recurrence(dose_times(1), 7, (0, 2, 4)),
+    "Twice every 2 weeks": Recurrence(dose_times(1), 14, (0, 7)),
+    "Every 2 weeks": Recurrence(dose_times(1), 14),
+    "Fortnightly": Recurrence(dose_times(1), 14),
+    "08:00 and 20:00": Recurrence((time(8), time(20)), 1),
+    "Every 8 hours": Recurrence((time(0), time(8), time(16)), 1),
+    "Every 12 hrs": Recurrence((time(8), time(20)), 1),
+    "q6h": Recurrence((time(2), time(8), time(14), time(20)), 1),
+    "Every 48 hours": Recurrence(dose_times(1), 2),
+    "Every 5 hours": None,
+    "Hourly": None,
+    "Once a month": None,
+    "Monthly": None,
+    "Every 3 months": None,
+    "Yearly": None,
+    "As needed": None,
+    "PRN": None,
+    "": None,
+    "With food": None,
+}
+
+
+class ParseFrequencyTest(unittest.TestCase):
+    def test_cases(self):
+        for text, expected in CASES.items():
+            with self.subTest(text=text):
+                self.assertEqual(parse_frequency(text), expected)
+
+
+class NextOccurrenceTest(unittest.TestCase):
+    def doses(self, text, start, end, after):
+        recurrence = parse_frequency(text)
+        doses = []
+        due = next_occurrence(recurrence, start, end, after)
+        while due is not None:
+            doses.append(due)
+            due = next_occurrence(recurrence, start, end, due)
+        return doses
+
+    def test_twice_a_week(self):
+        # Wednesday 2025-01-01 for four weeks
+        doses = self.doses("Twice a week", date(2025, 1, 1), date(2025, 1, 28), datetime(2024, 12, 31))
+        self.assertEqual(len(doses), 8)
+        self.assertEqual({due.date().weekday() for due in doses}, {2, 5})
+
+    def test_resumes_mid_cycle(self):
+        doses = self.doses("Twice a week", date(2025, 1, 1), date(2025, 1, 14), datetime(2025, 1, 2, 12))
+        self.assertEqual([due.day for due in doses], [4, 8, 11])
+
+    def test_every_other_day(self):
+        doses = self.doses("Every other day", date(2025, 1, 1), date(2025, 1, 7), datetime(2025, 1, 1, 9))
+        self.assertEqual([due.day for due in doses], [3, 5, 7])
+
+
+if __name__ == "__main__":
+    unittest.main()
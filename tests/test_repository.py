@@ -0,0 +1,50 @@
+"""Deleting medicines from the catalog shared by every user"""
+import unittest
+
+from medassist.db import connect
+from medassist.migrations import migrate
+from medassist.repository import (
+    InventoryRepository, MedicineInUse, MedicineRepository, ScheduleRepository
+)
+from medassist.schema import create_tables
+
+
+class DeleteMedicineTest(unittest.TestCase):
+    def setUp(self):
+        self.conn = connect(":memory:")
+        create_tables(self.conn.cursor())
+        self.conn.commit()
+        migrate(self.conn)
+        self.conn.executemany("INSERT INTO user (username, password) VALUES (?, 'x')", [("amy",), ("bob",)])
+        self.conn.commit()
+        self.medicines = MedicineRepository(self.conn)
+        self.med_id = self.medicines.add("Amoxil")
+        ScheduleRepository(self.conn, 1).add(self.med_id, "2025-01-01", None, "Daily")
+        InventoryRepository(self.conn, 1).add(self.med_id, 5, "2030-01-01")
+
+    def tearDown(self):
+        self.conn.close()
+
+    def test_counts_only_own_rows(self):
+        InventoryRepository(self.conn, 2).add(self.med_id, 3, "2030-01-01")
+        self.assertEqual(self.medicines.related_counts(self.med_id, 1), (1, 1))
+        self.assertEqual(self.medicines.related_counts(self.med_id, 2), (0, 1))
+
+    def test_delete_own_rows(self):
+        self.assertFalse(self.medicines.used_by_others(self.med_id, 1))
+        self.assertTrue(self.medicines.delete(self.med_id, 1))
+        self.assertFalse(self.medicines.exists(self.med_id))
+        self.assertEqual(self.conn.execute("SELECT COUNT(*) FROM inventory").fetchone(), (0,))
+
+    def test_refused_while_other_user_has_rows(self):
+        InventoryRepository(self.conn, 2).add(self.med_id, 3, "2030-01-01")
+        self.assertTrue(self.medicines.used_by_others(self.med_id, 1))
+        with self.assertRaises(MedicineInUse):
+            self.medicines.delete(self.med_id, 1)
+        self.assertTrue(self.medicines.exists(self.med_id))
+        self.assertEqual(self.medicines.related_counts(self.med_id, 1), (1, 1))
+        self.assertEqual(self.medicines.related_counts(self.med_id, 2), (0, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()